@@ -1,99 +1,73 @@
 import numpy as np
-import pandas as pd
 import tensorflow as tf
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Conv1D, MaxPooling1D, Bidirectional, LSTM, Dense, Dropout, Normalization
-from sklearn.utils import class_weight
-from sklearn.metrics import confusion_matrix, classification_report
-import seaborn as sns
-import matplotlib.pyplot as plt
 import os
 
-import sys
+import argparse
+
+from training_controller import (DEFAULT_EPOCHS, DEFAULT_LR_FACTOR, DEFAULT_LR_PATIENCE, DEFAULT_MIN_LR,
+                                 DEFAULT_OUTPUT_DIR, DEFAULT_PATIENCE, evaluate, train, write_artifacts)
+from training_data import DEFAULT_BATCH_SIZE, DEFAULT_CACHE_DIR, load_training_data
 
 # Define the input file path from command line arguments
-if len(sys.argv) != 2:
-    print("Usage: python EEG_Classification_report.py <path_to_csv>")
-    sys.exit(1)
-file_path = sys.argv[1]
+parser = argparse.ArgumentParser(description="Train the CNN-LSTM and report its performance on a held-out split")
+parser.add_argument('file_path', help="CSV file or feature store")
+parser.add_argument('--subject-split', action='store_true',
+                    help="Split by subject (70/15/15), using the subject index of a feature store")
+parser.add_argument('--seed', type=int, default=0, help="Seed for the train/validation/test split")
+parser.add_argument('--cache-dir', default=None,
+                    help=f"Where CSV tables are converted to feature stores and splits are kept (default {DEFAULT_CACHE_DIR})")
+parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR,
+                    help="Where the checkpoint, model, metrics and plots are written; rerun with the same directory to resume")
+parser.add_argument('--epochs', type=int, default=DEFAULT_EPOCHS, help="Epoch budget; training usually stops early")
+parser.add_argument('--patience', type=int, default=DEFAULT_PATIENCE,
+                    help="Stop after this many epochs without a lower validation loss")
+parser.add_argument('--lr-patience', type=int, default=DEFAULT_LR_PATIENCE,
+                    help="Reduce the learning rate after this many epochs without a lower validation loss")
+parser.add_argument('--lr-factor', type=float, default=DEFAULT_LR_FACTOR, help="Learning rate reduction factor")
+parser.add_argument('--min-lr', type=float, default=DEFAULT_MIN_LR, help="Lowest learning rate")
+parser.add_argument('--learning-rate', type=float, default=0.0005, help="Initial learning rate")
+args = parser.parse_args()
+file_path = args.file_path
 
 # --- Efficient Data Loading ---
-# Define batch size and target column
-batch_size = 32  # Smaller batch size to ensure multiple batches for splitting
+# A CSV table is converted to a binary feature store once and reused by later runs; the split
+# indices are drawn once with the seed and saved, so every epoch and every run sees the same splits
+batch_size = DEFAULT_BATCH_SIZE
 
-# Get column names from the CSV header
 try:
-    column_names = pd.read_csv(file_path, nrows=0).columns.tolist()
-    label_name = column_names[-1]
+    data = load_training_data(file_path, args.seed, args.subject_split, args.cache_dir)
 except FileNotFoundError:
     print(f"Error: The file at {file_path} was not found.")
     exit()
-
-# Create a tf.data.Dataset that reads from the CSV file in batches
-dataset = tf.data.experimental.make_csv_dataset(
-    file_path,
-    batch_size=batch_size,
-    label_name=label_name,
-    num_epochs=1,  # We will handle epoch iteration manually
-    shuffle=True,
-    shuffle_buffer_size=10000,
-    header=True
-)
+except (OSError, ValueError) as e:
+    print(f"Error: Could not load training data from {file_path}: {e}")
+    exit()
 
 # --- Train/Validation/Test Split ---
-# Get the total number of rows in the CSV file
-with open(file_path, 'r') as f:
-    num_rows = sum(1 for row in f) - 1  # Subtract 1 for the header
-
-# Calculate the number of batches
-num_batches = -(-num_rows // batch_size)  # Ceiling division
-
-# Calculate the size of each dataset in terms of batches
-train_batch_size = int(0.7 * num_batches)
-val_batch_size = int(0.15 * num_batches)
-test_batch_size = num_batches - train_batch_size - val_batch_size
-
-# Create the datasets by taking and skipping the appropriate number of batches
-train_dataset = dataset.take(train_batch_size)
-validation_dataset = dataset.skip(train_batch_size).take(val_batch_size)
-test_dataset = dataset.skip(train_batch_size + val_batch_size).take(test_batch_size)
-
-# --- Preprocessing and Normalization ---
-def preprocess_and_reshape(features, label):
-    # Stack features and reshape for the model
-    features = tf.stack(list(features.values()), axis=1)
-    return tf.expand_dims(features, axis=1), label
-
-# Apply the preprocessing to each dataset
-train_dataset = train_dataset.map(preprocess_and_reshape).prefetch(tf.data.AUTOTUNE)
-if validation_dataset:
-    validation_dataset = validation_dataset.map(preprocess_and_reshape).prefetch(tf.data.AUTOTUNE)
-if test_dataset:
-    test_dataset = test_dataset.map(preprocess_and_reshape).prefetch(tf.data.AUTOTUNE)
-
-# --- In-Model Normalization ---
-# Get the input shape from the first batch of the training data
-for features, _ in train_dataset.take(1):
-    input_shape = features.shape[1:]
-    break
-
-normalizer = Normalization(axis=-1)
-normalizer.adapt(train_dataset.map(lambda x, y: x))
-
-# --- Class Imbalance Handling ---
-y_train_for_weights = np.concatenate([y for _, y in train_dataset], axis=0)
-class_weights = class_weight.compute_class_weight(
-    'balanced',
-    classes=np.unique(y_train_for_weights),
-    y=y_train_for_weights
-)
-class_weights = dict(enumerate(class_weights))
+if data.subjects:
+    # Whole subjects go to one split each, so no subject's windows are both trained and tested on
+    train_subjects, val_subjects, test_subjects = data.subjects
+    print(f"Train subjects: {train_subjects}\nValidation subjects: {val_subjects}\nTest subjects: {test_subjects}")
+
+# Splits are held in memory (or streamed from the memory-mapped store), cached and prefetched;
+# features arrive shaped (batch, 1, features) for the model
+train_dataset = data.dataset('train', batch_size, shuffle=True)
+validation_dataset = data.dataset('validation', batch_size)
+test_dataset = data.dataset('test', batch_size)
+input_shape = (1, data.num_features)
+
+# --- Normalization and Class Imbalance Handling ---
+# Feature mean/variance and class weights come from the same single pass over the training rows
+print(f"Training on {data.train_rows} of {data.rows} rows, {data.num_classes} classes")
+class_weights = data.class_weights
 
 # --- Model Definition ---
-num_classes = len(class_weights)
+num_classes = data.num_classes
 
 model = Sequential([
-    Normalization(axis=-1, input_shape=input_shape),
+    Normalization(axis=-1, input_shape=input_shape, mean=data.mean, variance=data.variance),
     Conv1D(filters=64, kernel_size=3, activation='relu', padding='same'),
     MaxPooling1D(pool_size=2, padding='same'),
     Conv1D(filters=128, kernel_size=3, activation='relu', padding='same'),
@@ -107,69 +81,39 @@ model = Sequential([
 ])
 
 # --- Model Compilation and Training ---
-learning_rate = 0.0005
+learning_rate = args.learning_rate
 model.compile(
     optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
     loss='sparse_categorical_crossentropy',
     metrics=['accuracy']
 )
 
-epochs = 1000
-history = model.fit(
+# Stops early on the validation loss with the best weights restored, lowers the learning rate on
+# plateaus and checkpoints every epoch, so an interrupted run resumes from its output directory
+run = train(
+    model,
     train_dataset,
-    epochs=epochs,
-    validation_data=validation_dataset,
-    class_weight=class_weights
+    validation_dataset=validation_dataset,
+    class_weights=class_weights,
+    output_dir=args.output_dir,
+    epochs=args.epochs,
+    patience=args.patience,
+    lr_patience=args.lr_patience,
+    lr_factor=args.lr_factor,
+    min_lr=args.min_lr
 )
+print(f"Trained {run['epochs_run']} epochs (best: epoch {run['best_epoch']}) in {run['train_seconds']:.0f}s")
 
 # --- Evaluation and Reporting ---
+metrics = {'run': run, 'data': data.describe(), 'args': vars(args)}
 if test_dataset:
-    loss, accuracy = model.evaluate(test_dataset)
-    print(f"Test Accuracy: {accuracy * 100:.2f}%")
-
-    # Save the model
-    # Note: Model saving is commented out as this script is for reporting.
-    # model_save_path = "cnn_lstm_model_efficient.h5"
-    # model.save(model_save_path)
-    # print(f"Model saved to {model_save_path}")
-
-    # --- Predictions and Confusion Matrix ---
-    y_true = np.concatenate([y for _, y in test_dataset], axis=0)
-    y_pred_probs = model.predict(test_dataset)
-    y_pred = np.argmax(y_pred_probs, axis=1)
-
-    # Classification Report
-    print("Classification Report:\n", classification_report(y_true, y_pred))
-
-    # Confusion Matrix
-    cm = confusion_matrix(y_true, y_pred)
-    plt.figure(figsize=(10, 8))
-    tick_labels = [str(int(l)) for l in np.unique(y_true)]
-    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', xticklabels=tick_labels, yticklabels=tick_labels)
-    plt.xlabel('Predicted Label')
-    plt.ylabel('True Label')
-    plt.title('Confusion Matrix')
-    plt.show()
-
-# --- Plot Training History ---
-plt.figure(figsize=(12, 5))
-plt.subplot(1, 2, 1)
-plt.plot(history.history['accuracy'], label='Train Accuracy')
-if validation_dataset:
-    plt.plot(history.history['val_accuracy'], label='Validation Accuracy')
-plt.title('Model Accuracy')
-plt.ylabel('Accuracy')
-plt.xlabel('Epoch')
-plt.legend(loc='upper left')
-
-plt.subplot(1, 2, 2)
-plt.plot(history.history['loss'], label='Train Loss')
-if validation_dataset:
-    plt.plot(history.history['val_loss'], label='Validation Loss')
-plt.title('Model Loss')
-plt.ylabel('Loss')
-plt.xlabel('Epoch')
-plt.legend(loc='upper left')
-
-plt.tight_layout()
-plt.show()
\ No newline at end of file
+    test_metrics, report = evaluate(model, test_dataset)
+    metrics.update(test_metrics)
+    print(f"Test Accuracy: {metrics['test_accuracy'] * 100:.2f}%")
+    print("Classification Report:\n", report)
+
+# --- Model, Metrics, Confusion Matrix and Training History ---
+# Written to the output directory; nothing is displayed, so runs can be left unattended. The training
+# rows' normalization parameters go next to the model, marked as applied by its Normalization layer
+for path in write_artifacts(args.output_dir, model, metrics, data.normalization):
+    print(f"Saved {path}")
@@ -0,0 +1,902 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for the EEG prediction and preprocessing pipeline
+
+Usage:
+    python benchmarks.py stats [--rows 1000000 10000000]
+    python benchmarks.py sharding [--rows 200000] [--workers 1 2 4 8]
+    python benchmarks.py backends [--rows 1 64 4096]
+    python benchmarks.py result-cache [--input normalized_eeg_data.csv]
+    python benchmarks.py cancel [--rows 200000]
+    python benchmarks.py batching [--requests 4] [--rows 2000] [--preprocess-threads 1 4]
+    python benchmarks.py features [--kaggle-dir Kaggle_Datasets] [--rows 38252]
+    python benchmarks.py subject-workers [--subjects 8] [--workers 1 2 4]
+    python benchmarks.py running-stats [--rows 200000] [--steps 256 51 8]
+    python benchmarks.py spectral [--minutes 1 10 60]
+    python benchmarks.py csv-read [--input normalized_eeg_data.csv] [--rows 100000 1000000]
+    python benchmarks.py feature-store [--rows 1368 100000 1000000]
+    python benchmarks.py subjects [--subjects 36] [--rows-per-subject 20000]
+    python benchmarks.py normalize [--rows 100000 500000] [--workers 1 2 4]
+    python benchmarks.py scaling [--rows 100000 1000000] [--chunk-rows 50000]
+    python benchmarks.py validate [--rows 100000 1000000] [--workers 1 2 4]
+    python benchmarks.py sidecar [--rows 100000 1000000]
+    python benchmarks.py training-input [--rows 10000 100000] [--epochs 3]
+"""
+
+import argparse
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+warnings.filterwarnings('ignore')
+
+def print_status(message):
+    """Print status message with timestamp"""
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] {message}")
+
+def best_of(repeats, func, *args):
+    """Return the fastest wall-clock time of several runs and the last result"""
+    best = float('inf')
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def synthetic_predictions(rows, num_classes=5, num_labels=36, seed=0):
+    """Model-like output: softmax probabilities, argmax classes and integer labels"""
+    rng = np.random.default_rng(seed)
+    logits = rng.normal(size=(rows, num_classes)).astype(np.float32)
+    proba = np.exp(logits)
+    proba /= proba.sum(axis=1, keepdims=True)
+    predictions = np.argmax(proba, axis=1)
+    confidence = np.max(proba, axis=1)
+    y_true = rng.integers(0, num_labels, rows).astype(np.float64)
+    return predictions, proba, confidence, y_true
+
+# --- Statistics ---
+
+def _reference_statistics(predictions, predictions_proba, confidence_scores, y_true):
+    """The multi-pass calculate_statistics/format_results summary the accumulator replaced"""
+    from sklearn.metrics import classification_report
+
+    stats = {
+        'total_samples': len(predictions),
+        'unique_predictions': len(np.unique(predictions)),
+        'avg_confidence': float(np.mean(confidence_scores)),
+        'min_confidence': float(np.min(confidence_scores)),
+        'max_confidence': float(np.max(confidence_scores)),
+        'std_confidence': float(np.std(confidence_scores))
+    }
+    unique, counts = np.unique(predictions, return_counts=True)
+    stats['class_distribution'] = {int(k): int(v) for k, v in zip(unique, counts)}
+    stats['confidence_distribution'] = (
+        int(np.sum(confidence_scores >= 0.8)),
+        int(np.sum((confidence_scores >= 0.6) & (confidence_scores < 0.8))),
+        int(np.sum(confidence_scores < 0.6))
+    )
+    stats['accuracy'] = float(np.mean(predictions == y_true))
+    stats['classification_report'] = classification_report(y_true, predictions, output_dict=True)
+
+    # format_results scans the predictions again
+    unique, counts = np.unique(predictions, return_counts=True)
+    stats['primary'] = int(unique[np.argmax(counts)])
+    stats['overall_confidence'] = float(np.mean(confidence_scores))
+    stats['abnormal_segments'] = int(np.sum(predictions != 0))
+    return stats
+
+def _accumulator_statistics(predictions, predictions_proba, confidence_scores, y_true):
+    from prediction_stats import PredictionAccumulator
+
+    accumulator = PredictionAccumulator().update(predictions, predictions_proba, confidence_scores, y_true)
+    return {
+        'classification_report': accumulator.classification_report(),
+        'accuracy': accumulator.accuracy(),
+        'primary': accumulator.most_common_class(),
+        'abnormal_segments': accumulator.abnormal_segments
+    }
+
+def benchmark_stats(args):
+    """Accumulator versus the original multi-pass statistics code"""
+    for rows in args.rows:
+        print_status(f"Generating {rows:,} synthetic predictions")
+        data = synthetic_predictions(rows)
+
+        reference_time, reference = best_of(args.repeats, _reference_statistics, *data)
+        accumulator_time, accumulated = best_of(args.repeats, _accumulator_statistics, *data)
+
+        matches = (reference['classification_report'] == accumulated['classification_report']
+                   and reference['primary'] == accumulated['primary']
+                   and reference['abnormal_segments'] == accumulated['abnormal_segments'])
+        print_status(f"{rows:>12,} rows | reference {reference_time:8.3f}s | accumulator "
+                     f"{accumulator_time:8.3f}s | speedup {reference_time / accumulator_time:5.1f}x | "
+                     f"report matches: {matches}")
+
+# --- Sharded inference ---
+
+def synthetic_features(rows, seed=0):
+    """Standardized 54-feature rows shaped for the CNN-LSTM input"""
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((rows, 1, 54))
+
+def benchmark_sharding(args):
+    """Inference throughput versus shard worker count"""
+    import predict_with_model as pwm
+
+    X = synthetic_features(args.rows)
+    warmup = X[:1024]
+
+    model = pwm.load_model()
+    pwm.make_predictions(model, warmup)
+    single_time, _ = best_of(args.repeats, pwm.make_predictions, model, X)
+    print_status(f"in-process  | {args.rows / single_time:12,.0f} rows/s | {single_time:7.3f}s")
+    del model
+
+    for workers in args.workers:
+        with pwm.ShardedPredictor(workers, args.threads_per_worker) as predictor:
+            predictor.predict(warmup)
+            elapsed, _ = best_of(args.repeats, predictor.predict, X)
+        print_status(f"{workers:2d} workers  | {args.rows / elapsed:12,.0f} rows/s | {elapsed:7.3f}s | "
+                     f"{single_time / elapsed:5.2f}x vs in-process | "
+                     f"{predictor.threads_per_worker} threads/worker")
+
+# --- Inference backends ---
+
+def benchmark_backends(args):
+    """Model load time and predict latency for each inference backend"""
+    import predict_with_model as pwm
+    from model_artifacts import BACKENDS
+
+    inputs = {rows: synthetic_features(rows).astype(np.float32) for rows in args.rows}
+    reference = None
+    for backend in BACKENDS:
+        start = time.perf_counter()
+        model = pwm.load_predictor(backend)
+        load_time = time.perf_counter() - start
+
+        model.predict(inputs[args.rows[0]], verbose=0)
+        latencies = []
+        for rows in args.rows:
+            elapsed, output = best_of(args.repeats, lambda X: model.predict(X, verbose=0), inputs[rows])
+            latencies.append(f"{rows} rows {elapsed * 1000:8.2f}ms")
+
+        if reference is None:
+            reference = output
+        max_abs_diff = float(np.max(np.abs(output - reference)))
+        print_status(f"{backend:10s} | load {load_time:6.2f}s | {' | '.join(latencies)} | "
+                     f"max diff vs keras {max_abs_diff:.1e}")
+
+# --- Result cache ---
+
+def benchmark_result_cache(args):
+    """Full prediction versus a result cache hit for the same input file"""
+    import tempfile
+    import predict_with_model as pwm
+    from result_cache import ResultCache
+
+    config = pwm.result_cache_config('keras')
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ResultCache(cache_dir)
+
+        start = time.perf_counter()
+        key, _ = pwm.cache_lookup(cache, args.input, config)
+        result = pwm.run_prediction(pwm.load_predictor(), args.input)
+        pwm.cache_store(cache, key, result)
+        miss_time = time.perf_counter() - start
+
+        hit_time, (_, cached) = best_of(args.repeats, pwm.cache_lookup, cache, args.input, config)
+        print_status(f"miss (load model + predict) {miss_time * 1000:9.1f}ms | hit {hit_time * 1000:7.2f}ms | "
+                     f"speedup {miss_time / hit_time:7.0f}x | identical: {cached == result}")
+
+# --- Cancellation ---
+
+def _write_feature_csv(path, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    header = ','.join(f"feature_{i}" for i in range(54)) + ',label'
+    np.savetxt(path, np.column_stack([rng.random((rows, 54)), rng.integers(0, 5, rows)]),
+               delimiter=',', fmt='%.5f', header=header, comments='')
+
+def _wait_for_progress(stream, predicate):
+    """Read JSON-lines until a progress event satisfies predicate; returns the event"""
+    import json
+
+    for line in stream:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        if message.get('event') == 'progress' and predicate(message['progress']):
+            return message
+    raise RuntimeError("prediction finished before the cancellation point")
+
+def benchmark_cancel(args):
+    """Time from cancel request to the prediction process releasing its CPU"""
+    import json
+    import os
+    import signal
+    import subprocess
+    import sys
+    import tempfile
+    import threading
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'predict_with_model.py')
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, 'features.csv')
+        _write_feature_csv(input_file, args.rows)
+
+        # One-shot: SIGTERM once inference is under way, measure until the process has exited
+        process = subprocess.Popen([sys.executable, script, '--no-cache', '--progress', input_file],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        _wait_for_progress(process.stderr, lambda event: event.get('rows_done', 0) > 0)
+        threading.Thread(target=process.stderr.read, daemon=True).start()
+        start = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        output = process.stdout.read()
+        process.wait()
+        exited = time.perf_counter() - start
+        print_status(f"one-shot SIGTERM -> exit             {exited * 1000:8.1f}ms | "
+                     f"partial timings {json.loads(output).get('timings')}")
+
+        # Worker: cancel a streaming request between chunks, measure until its cancelled result
+        worker = subprocess.Popen([sys.executable, script, '--worker', '--no-cache'],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        worker.stdout.readline()
+        worker.stdin.write(json.dumps({'id': 1, 'input_file': input_file, 'chunk_rows': args.chunk_rows,
+                                       'progress': True}) + "\n")
+        _wait_for_progress(worker.stdout, lambda event: event.get('rows_done', 0) > 0)
+        start = time.perf_counter()
+        worker.stdin.write(json.dumps({'id': 2, 'op': 'cancel', 'target': 1}) + "\n")
+        for line in worker.stdout:
+            message = json.loads(line)
+            if message.get('id') == 1 and 'result' in message:
+                break
+        answered = time.perf_counter() - start
+        worker.stdin.close()
+        worker.wait()
+        print_status(f"worker op=cancel -> cancelled result {answered * 1000:8.1f}ms | "
+                     f"partial timings {message['result'].get('timings')}")
+
+def benchmark_batching(args):
+    """How many simultaneous worker requests share a micro-batch, per preprocessing thread count"""
+    import json
+    import os
+    import subprocess
+    import sys
+    import tempfile
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'predict_with_model.py')
+    with tempfile.TemporaryDirectory() as tmp:
+        inputs = []
+        for i in range(args.requests):
+            inputs.append(os.path.join(tmp, f'features_{i}.csv'))
+            _write_feature_csv(inputs[-1], args.rows, seed=i)
+
+        for threads in args.preprocess_threads:
+            worker = subprocess.Popen([sys.executable, script, '--worker', '--no-cache',
+                                       '--preprocess-threads', str(threads)],
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      stderr=subprocess.DEVNULL, text=True, bufsize=1)
+            worker.stdout.readline()
+            start = time.perf_counter()
+            worker.stdin.write(''.join(json.dumps({'id': i + 1, 'input_file': path}) + "\n"
+                                       for i, path in enumerate(inputs)))
+            answered = 0
+            for line in worker.stdout:
+                if 'result' in json.loads(line):
+                    answered += 1
+                    if answered == len(inputs):
+                        break
+            elapsed = time.perf_counter() - start
+            worker.stdin.write(json.dumps({'id': 0, 'op': 'stats'}) + "\n")
+            stats = json.loads(worker.stdout.readline())['stats']
+            worker.stdin.close()
+            worker.wait()
+            print_status(f"{threads} preprocess thread{'s' if threads > 1 else ' '} | {len(inputs)} requests "
+                         f"in {stats['batches']} batch{'es' if stats['batches'] != 1 else ''} "
+                         f"(mean {stats['batch_requests']['mean']:.1f} per batch) | {elapsed:6.2f}s")
+
+# --- Feature extraction ---
+
+def _subject_files(args, tmp):
+    """(name, path) per subject: the Kaggle recordings if present, synthetic 14-channel ones in tmp otherwise"""
+    import os
+
+    if os.path.isdir(args.kaggle_dir):
+        names = sorted(f for f in os.listdir(args.kaggle_dir) if f.endswith('.csv') and f.startswith('s'))
+        for name in names[:args.subjects]:
+            yield name, os.path.join(args.kaggle_dir, name)
+        return
+
+    print_status(f"{args.kaggle_dir} not found, using synthetic subjects of {args.rows:,} rows")
+    rng = np.random.default_rng(0)
+    for subject in range(args.subjects):
+        path = os.path.join(tmp, f"s{subject:02d}.csv")
+        np.savetxt(path, rng.normal(size=(args.rows, 14)) * 30 + 4000, delimiter=',', fmt='%.6f')
+        yield f"synthetic s{subject:02d}", path
+
+def benchmark_features(args):
+    """Row-wise versus vectorized versus streaming window feature extraction on whole subjects"""
+    import contextlib
+    import io
+    import tempfile
+    import simple_preprocess as sp
+
+    def stream(path):
+        counts = {}
+        return list(sp.stream_window_features(path, 0, counts)), counts['samples']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, path in _subject_files(args, tmp):
+            data = sp.read_csv_file(path)
+            with contextlib.redirect_stdout(io.StringIO()):
+                reference_time, reference = best_of(1, sp.extract_simple_features, data, 0)
+                vectorized_time, vectorized = best_of(args.repeats, sp.extract_features, data, 0)
+                samples = sp.rows_to_samples(data)
+                engine_time, _ = best_of(args.repeats, sp.extract_window_features, samples, 0)
+            max_rel_diff = 0.0
+            if reference:
+                reference_array, vectorized_array = np.array(reference), np.array(vectorized)
+                max_rel_diff = float(np.max(np.abs(vectorized_array - reference_array)
+                                            / np.maximum(np.abs(reference_array), 1e-300)))
+            print_status(f"{name:14s} | {len(data):8,} rows | row-wise {reference_time:8.3f}s | vectorized "
+                         f"{vectorized_time:7.4f}s (engine {engine_time:7.4f}s) | "
+                         f"speedup {reference_time / vectorized_time:6.1f}x | "
+                         f"{len(vectorized)} windows | max rel diff {max_rel_diff:.1e}")
+
+            # Streaming includes reading and parsing the file, which the timings above do not
+            streaming_time, (streamed, sample_count) = best_of(args.repeats, stream, path)
+            print_status(f"{name:14s} | streaming from disk {streaming_time:7.3f}s | "
+                         f"{sample_count / streaming_time:10,.0f} samples/s | identical to vectorized: "
+                         f"{streamed == vectorized}")
+
+def benchmark_subject_workers(args):
+    """Measured speedup of processing subjects in parallel over a sequential run, with identical shards"""
+    import contextlib
+    import filecmp
+    import io
+    import os
+    import tempfile
+    import simple_preprocess as sp
+
+    with tempfile.TemporaryDirectory() as tmp:
+        subjects = list(_subject_files(args, tmp))
+        options = {'step_size': sp.STEP_SIZE, 'running_stats': False}
+
+        def run(workers):
+            out_dir = os.path.join(tmp, f"workers-{workers}")
+            os.makedirs(out_dir, exist_ok=True)
+            tasks = [(name, path, i, os.path.join(out_dir, f"{i}.csv"), False, options)
+                     for i, (name, path) in enumerate(subjects)]
+            with contextlib.redirect_stdout(io.StringIO()):
+                cpu_seconds = sum(stats['cpu_seconds'] for _, stats in sp.process_subjects(tasks, workers))
+            return cpu_seconds, [task[3] for task in tasks]
+
+        sequential_time, (_, sequential_shards) = best_of(1, run, 1)
+        print_status(f"{len(subjects)} subjects | sequential {sequential_time:7.2f}s | {os.cpu_count()} CPUs")
+        for workers in args.workers:
+            if workers <= 1:
+                continue
+            elapsed, (cpu_seconds, shards) = best_of(1, run, workers)
+            identical = all(filecmp.cmp(a, b, shallow=False) for a, b in zip(sequential_shards, shards))
+            print_status(f"{workers} workers | {elapsed:7.2f}s | measured speedup {sequential_time / elapsed:5.2f}x | "
+                         f"estimated from CPU time {cpu_seconds / elapsed:5.2f}x | identical: {identical}")
+
+def _assert_same_features(direct, running, rtol=1e-9, atol=1e-6):
+    """Fail unless two extractors' feature vectors agree: same windows, same unfilled features, values to rtol"""
+    assert len(running) == len(direct), f"{len(running)} windows, expected {len(direct)}"
+    for index, (expected, actual) in enumerate(zip(direct, running)):
+        unfilled = [type(value) is int for value in expected]
+        assert [type(value) is int for value in actual] == unfilled, f"window {index}: different channels left out"
+    np.testing.assert_allclose(np.array(running, dtype=np.float64), np.array(direct, dtype=np.float64),
+                               rtol=rtol, atol=atol)
+
+def benchmark_running_stats(args):
+    """Accuracy and speed of running window statistics against direct computation, per step size"""
+    import os
+    import tempfile
+    import simple_preprocess as sp
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 's00.csv')
+        # A large DC offset with slow drift is the hard case for running sums of x and x^2
+        rng = np.random.default_rng(0)
+        drift = np.linspace(0, 500, args.rows)[:, np.newaxis]
+        np.savetxt(path, 4000 + drift + rng.normal(size=(args.rows, 14)) * 30, delimiter=',', fmt='%.6f')
+
+        # The same recording with empty and non-numeric cells, which leave channels out of their windows
+        damaged = os.path.join(tmp, 's01.csv')
+        with open(path) as f:
+            lines = f.read().splitlines()
+        for row in rng.choice(len(lines), max(1, len(lines) // 1000), replace=False):
+            cells = lines[row].split(',')
+            cells[rng.integers(len(cells))] = rng.choice(['', 'n/a'])
+            lines[row] = ','.join(cells)
+        with open(damaged, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+        for step in args.steps:
+            direct_time, direct = best_of(1, lambda: list(sp.stream_window_features(path, 0, step_size=step)))
+            running_time, running = best_of(
+                1, lambda: list(sp.stream_window_features(path, 0, step_size=step, running_stats=True)))
+            _assert_same_features(direct, running)
+            _assert_same_features(list(sp.stream_window_features(damaged, 0, step_size=step)),
+                                  list(sp.stream_window_features(damaged, 0, step_size=step, running_stats=True)))
+            direct, running = np.array(direct), np.array(running)
+            max_rel_diff = float(np.max(np.abs(running - direct) / np.maximum(np.abs(direct), 1e-300)))
+            print_status(f"step {step:4d} | {len(direct):7,} windows | direct {direct_time:7.2f}s "
+                         f"({args.rows / direct_time:9,.0f} samples/s) | running {running_time:7.2f}s "
+                         f"({args.rows / running_time:9,.0f} samples/s) | speedup {direct_time / running_time:5.1f}x | "
+                         f"max rel diff {max_rel_diff:.1e}")
+        print_status("Running statistics match the direct computation (also with missing cells)")
+
+# --- Spectral features ---
+
+def benchmark_spectral(args):
+    """Band-power extraction time versus recording length; linear scaling keeps time per sample flat"""
+    from eeg_io import DEFAULT_CHUNK_ROWS
+    from spectral_features import SAMPLING_RATE, spectral_summary
+
+    def chunked(samples):
+        """The recording in the chunks the CSV reader would hand over"""
+        return (samples[start:start + DEFAULT_CHUNK_ROWS] for start in range(0, len(samples), DEFAULT_CHUNK_ROWS))
+
+    rng = np.random.default_rng(0)
+    for minutes in args.minutes:
+        samples = rng.normal(size=(int(minutes * 60 * SAMPLING_RATE), args.channels)) * 30 + 4000
+        elapsed, summary = best_of(args.repeats, lambda: spectral_summary(chunked(samples)))
+        print_status(f"{minutes:6.1f} min | {len(samples):10,} samples | {summary['windows']:7,} windows | "
+                     f"{len(summary['band_power_timeline']):5,} timeline points | "
+                     f"{elapsed:7.3f}s | {elapsed / len(samples) * 1e9:6.1f} ns/sample | "
+                     f"{len(samples) / elapsed:12,.0f} samples/s")
+
+# --- CSV reading ---
+
+def benchmark_csv_read(args):
+    """Parse throughput of the list-of-lists reader versus eeg_io's bulk NumPy parser"""
+    import contextlib
+    import io
+    import os
+    import tempfile
+    import eeg_io
+    import simple_preprocess as sp
+
+    def chunked(path):
+        return sum(len(chunk) for chunk in eeg_io.iter_numeric_csv(path))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        if os.path.exists(args.input):
+            files.append((os.path.basename(args.input), args.input))
+        for rows in args.rows:
+            path = os.path.join(tmp, f"features_{rows}.csv")
+            _write_feature_csv(path, rows)
+            files.append((f"synthetic {rows:,}", path))
+
+        for name, path in files:
+            megabytes = os.path.getsize(path) / 1e6
+            with contextlib.redirect_stdout(io.StringIO()):
+                lists_time, lists = best_of(1 if megabytes > 50 else args.repeats, sp.read_csv_file, path)
+            float64_time, (_, data) = best_of(args.repeats, eeg_io.read_numeric_csv, path)
+            float32_time, _ = best_of(args.repeats, eeg_io.read_numeric_csv, path, np.float32)
+            chunked_time, _ = best_of(args.repeats, chunked, path)
+            identical = np.array_equal(np.array(lists[1:]), data)
+            del lists
+            print_status(f"{name:18s} | {megabytes:7.1f} MB | read_csv_file {megabytes / lists_time:6.1f} MB/s | "
+                         f"float64 {megabytes / float64_time:6.1f} MB/s | float32 {megabytes / float32_time:6.1f} MB/s | "
+                         f"chunked {megabytes / chunked_time:6.1f} MB/s | speedup {lists_time / float64_time:5.1f}x | "
+                         f"identical: {identical}")
+
+def benchmark_feature_store(args):
+    """Time to get a feature table into memory: pandas and eeg_io parsing CSV versus opening a feature store"""
+    import os
+    import tempfile
+    import pandas as pd
+    import eeg_io
+    import feature_store
+
+    def open_store(path):
+        store = feature_store.load_feature_store(path)
+        return store.features, store.labels
+
+    def touch_store(path):
+        # Memory maps are lazy; summing reads every page, the cost of first use
+        features, labels = open_store(path)
+        return float(features.sum()) + float(labels.sum())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            csv_path = os.path.join(tmp, f"features_{rows}.csv")
+            _write_feature_csv(csv_path, rows)
+            store_path = feature_store.import_csv(csv_path, label_column='label')
+
+            pandas_time, _ = best_of(args.repeats, pd.read_csv, csv_path)
+            eeg_io_time, (_, table) = best_of(args.repeats, eeg_io.read_numeric_csv, csv_path)
+            open_time, (features, labels) = best_of(args.repeats, open_store, store_path)
+            touch_time, _ = best_of(args.repeats, touch_store, store_path)
+            identical = np.array_equal(features, table[:, :-1]) and np.array_equal(labels, table[:, -1])
+            print_status(f"{rows:9,} rows | pd.read_csv {pandas_time * 1000:9.1f}ms | eeg_io {eeg_io_time * 1000:9.1f}ms | "
+                         f"store open {open_time * 1000:6.2f}ms | open + read all {touch_time * 1000:8.1f}ms | "
+                         f"identical: {identical}")
+
+def benchmark_subjects(args):
+    """Loading one subject's rows through the subject index versus filtering the whole table by label"""
+    import os
+    import tempfile
+    import feature_store
+
+    rng = np.random.default_rng(0)
+    columns = [f"feature_{i}" for i in range(54)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'subjects.features')
+        with feature_store.FeatureStoreWriter(path, columns, feature_store.LABEL_COLUMN) as writer:
+            for subject in range(args.subjects):
+                writer.begin_subject(f"s{subject:02d}", subject)
+                writer.append(rng.random((args.rows_per_subject, 54)), np.full(args.rows_per_subject, float(subject)))
+
+        subject = f"s{args.subjects // 2:02d}"
+        subject_id = float(args.subjects // 2)
+
+        def indexed():
+            return np.array(feature_store.load_subjects(path, [subject]).features)
+
+        def scanned():
+            store = feature_store.load_feature_store(path)
+            return np.array(store.features[np.asarray(store.labels) == subject_id])
+
+        indexed_time, rows = best_of(args.repeats, indexed)
+        scanned_time, expected = best_of(args.repeats, scanned)
+        split_time, _ = best_of(args.repeats, lambda: feature_store.subject_split(
+            feature_store.load_feature_store(path).subject_names(), (0.7, 0.15, 0.15)))
+        print_status(f"{args.subjects} subjects x {args.rows_per_subject:,} rows | one subject via index "
+                     f"{indexed_time * 1000:7.2f}ms | via label scan {scanned_time * 1000:8.2f}ms | "
+                     f"subject split {split_time * 1000:6.2f}ms | identical: {np.array_equal(rows, expected)}")
+
+# --- Normalization ---
+
+def _reference_normalize(input_file, output_file):
+    """The list-of-lists min-max normalizer that normalize_data.py used to be, for comparison"""
+    import csv
+    import eeg_io
+
+    header, data = eeg_io.read_numeric_csv(input_file)
+    num_features = data.shape[1] - 1
+    columns = data[:, :num_features].T.tolist()
+    targets = data[:, -1].tolist()
+    normalized_columns = []
+    for column in columns:
+        min_val, max_val = min(column), max(column)
+        if max_val == min_val:
+            normalized_columns.append([0.5] * len(column))
+        else:
+            normalized_columns.append([(x - min_val) / (max_val - min_val) for x in column])
+    rows = [[normalized_columns[col][row] for col in range(num_features)] + [targets[row]]
+            for row in range(len(targets))]
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+def _peak_traced(func, *args):
+    """(seconds, peak Python heap bytes) of one call"""
+    import tracemalloc
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+def benchmark_normalize(args):
+    """List-based versus two-pass streaming min-max normalization: time, peak memory, identical output"""
+    import contextlib
+    import filecmp
+    import io
+    import os
+    import tempfile
+    import normalize_data as nd
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            input_file = os.path.join(tmp, f"features_{rows}.csv")
+            _write_feature_csv(input_file, rows)
+            reference_file = os.path.join(tmp, 'reference.csv')
+            reference_time, reference_peak = _peak_traced(_reference_normalize, input_file, reference_file)
+            print_status(f"{rows:9,} rows | list-based        {reference_time:7.2f}s | peak {reference_peak / 1e6:8.1f} MB")
+            for workers in args.workers:
+                output_file = os.path.join(tmp, 'streamed.csv')
+                with contextlib.redirect_stdout(io.StringIO()):
+                    streamed_time, streamed_peak = _peak_traced(
+                        nd.normalize_data, input_file, output_file, None, None, args.chunk_rows, workers)
+                identical = filecmp.cmp(reference_file, output_file, shallow=False)
+                print_status(f"{rows:9,} rows | streaming, {workers} worker{'s' if workers > 1 else ' '} "
+                             f"{streamed_time:7.2f}s | peak {streamed_peak / 1e6:8.1f} MB | "
+                             f"speedup {reference_time / streamed_time:5.1f}x | identical: {identical}")
+
+# --- Saved normalization parameters ---
+
+def benchmark_scaling(args):
+    """Chunked scaling for prediction: StandardScaler fitted per file (two passes) versus saved parameters (one)"""
+    import os
+    import tempfile
+    import normalization
+    import predict_with_model as pm
+
+    def two_pass(path):
+        scaler = pm.fit_scaler_streaming(path, args.chunk_rows)
+        return [scaler.transform(pm.split_features(chunk)[0]) for chunk in pm.read_input(path, args.chunk_rows)]
+
+    def one_pass(path, params):
+        return [params.standardize(pm.split_features(chunk)[0]) for chunk in pm.read_input(path, args.chunk_rows)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, f"features_{rows}.csv")
+            _write_feature_csv(path, rows)
+            fit_time, params = best_of(1, normalization.fit_table, path)
+            two_pass_time, expected = best_of(args.repeats, two_pass, path)
+            one_pass_time, scaled = best_of(args.repeats, one_pass, path, params)
+            error = max(float(np.abs(a - b).max()) for a, b in zip(expected, scaled))
+            del expected, scaled
+            print_status(f"{rows:9,} rows | fit once {fit_time:6.2f}s | per-file fit, two passes {two_pass_time:6.2f}s | "
+                         f"saved parameters, one pass {one_pass_time:6.2f}s | speedup "
+                         f"{two_pass_time / one_pass_time:4.1f}x | max abs diff {error:.1e}")
+
+# --- Upload validation ---
+
+def _reference_validate(path):
+    """Full-file version of the old row-by-row range check: rows with a feature outside [0, 1]"""
+    import eeg_io
+
+    _, data = eeg_io.read_numeric_csv(path, strict=False)
+    bad_rows = 0
+    for row in data.tolist():
+        for val in row[:-1]:  # Skip target column
+            if val < 0 or val > 1:
+                bad_rows += 1
+                break
+    return bad_rows
+
+def _validate_uncached(path, workers=None):
+    """validate_file with the file's sidecar removed first, so every call scans the file"""
+    import os
+    import verify_compatibility as vc
+    from dataset_sidecar import sidecar_path
+
+    if os.path.exists(sidecar_path(path)):
+        os.remove(sidecar_path(path))
+    return vc.validate_file(path, vc.REFERENCE_FILE, workers)
+
+def benchmark_validate(args):
+    """Throughput of the full-file validator per worker count, against a row-by-row check of every row"""
+    import os
+    import tempfile
+    import verify_compatibility as vc
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, f"features_{rows}.csv")
+            _write_feature_csv(path, rows)
+            megabytes = os.path.getsize(path) / 1e6
+            reference_time, _ = best_of(1, _reference_validate, path)
+            print_status(f"{rows:9,} rows | {megabytes:7.1f} MB | row-by-row     {megabytes / reference_time:7.1f} MB/s")
+            for workers in args.workers:
+                elapsed, summary = best_of(args.repeats, _validate_uncached, path, workers)
+                # The synthetic header differs from EE_PCA_1.csv, so the header check is expected to fail
+                failed = [name for name, check in summary['checks'].items() if not check['ok']]
+                used = summary['workers']
+                print_status(f"{rows:9,} rows | {megabytes:7.1f} MB | {used} worker{'s' if used > 1 else ' '}      "
+                             f"{megabytes / elapsed:7.1f} MB/s | speedup {reference_time / elapsed:5.1f}x | "
+                             f"failed checks: {', '.join(failed) or 'none'}")
+
+def benchmark_sidecar(args):
+    """Repeat validation of an unchanged file: full scan, sidecar hit, and sidecar hit after a touch (hash check)"""
+    import os
+    import tempfile
+    import verify_compatibility as vc
+
+    volatile = ('seconds', 'mb_per_s', 'cached')
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, f"features_{rows}.csv")
+            _write_feature_csv(path, rows)
+            megabytes = os.path.getsize(path) / 1e6
+            scan_time, scanned = best_of(args.repeats, _validate_uncached, path)
+            cached_time, cached = best_of(args.repeats, vc.validate_file, path)
+
+            def touched():
+                os.utime(path)
+                return vc.validate_file(path)
+            touched_time, rehashed = best_of(args.repeats, touched)
+            same = all({key: value for key, value in summary.items() if key not in volatile}
+                       == {key: value for key, value in scanned.items() if key not in volatile}
+                       for summary in (cached, rehashed))
+            print_status(f"{rows:9,} rows | {megabytes:7.1f} MB | scan {scan_time:7.3f}s | sidecar {cached_time * 1e3:7.2f}ms "
+                         f"({scan_time / cached_time:7.0f}x) | touched, rehashed {touched_time:6.3f}s | "
+                         f"same summary: {same}")
+
+# --- Training input pipeline ---
+
+def _csv_training_datasets(path, batch_size):
+    """The old input pipeline of EEG_Classification_report.py: CSV re-parsed every epoch, take/skip splits"""
+    import tensorflow as tf
+
+    with open(path) as f:
+        label_name = f.readline().strip().split(',')[-1]
+    dataset = tf.data.experimental.make_csv_dataset(path, batch_size=batch_size, label_name=label_name, num_epochs=1,
+                                                    shuffle=True, shuffle_buffer_size=10000, header=True)
+    with open(path) as f:
+        num_rows = sum(1 for row in f) - 1
+    num_batches = -(-num_rows // batch_size)
+    train_batches = int(0.7 * num_batches)
+    val_batches = int(0.15 * num_batches)
+
+    def reshape(features, label):
+        return tf.expand_dims(tf.stack(list(features.values()), axis=1), axis=1), label
+
+    train = dataset.take(train_batches).map(reshape).prefetch(tf.data.AUTOTUNE)
+    validation = dataset.skip(train_batches).take(val_batches).map(reshape).prefetch(tf.data.AUTOTUNE)
+    return train, validation
+
+def _epoch(train, validation):
+    """One epoch of input: every training batch, then every validation batch"""
+    rows = 0
+    for dataset in (train, validation):
+        for _, labels in dataset:
+            rows += int(labels.shape[0])
+    return rows
+
+def benchmark_training_input(args):
+    """Input pipeline time per training epoch: CSV parsed every epoch versus converted once and cached in memory"""
+    import os
+    import tempfile
+    import tensorflow  # imported before timing, so neither pipeline's setup includes it
+    from training_data import DEFAULT_BATCH_SIZE, load_training_data
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, f"features_{rows}.csv")
+            _write_feature_csv(path, rows)
+            cache_dir = os.path.join(tmp, "cache")
+
+            setup_started = time.perf_counter()
+            train, validation = _csv_training_datasets(path, DEFAULT_BATCH_SIZE)
+            csv_setup = time.perf_counter() - setup_started
+            csv_epochs = [best_of(1, _epoch, train, validation)[0] for _ in range(args.epochs)]
+
+            first_setup, _ = best_of(1, load_training_data, path, 0, False, cache_dir)
+            setup_started = time.perf_counter()
+            data = load_training_data(path, 0, False, cache_dir)
+            train = data.dataset('train', DEFAULT_BATCH_SIZE, shuffle=True)
+            validation = data.dataset('validation', DEFAULT_BATCH_SIZE)
+            cached_setup = time.perf_counter() - setup_started
+            cached_epochs = [best_of(1, _epoch, train, validation)[0] for _ in range(args.epochs)]
+
+            csv_epoch = min(csv_epochs)
+            cached_epoch = min(cached_epochs[1:] or cached_epochs)
+            print_status(f"{rows:9,} rows | CSV: setup {csv_setup:6.2f}s, epoch {csv_epoch:6.2f}s | "
+                         f"cached: first conversion {first_setup:6.2f}s, setup {cached_setup:6.2f}s, "
+                         f"first epoch {cached_epochs[0]:6.2f}s, epoch {cached_epoch:6.3f}s | "
+                         f"speedup per epoch {csv_epoch / cached_epoch:6.1f}x | "
+                         f"{args.epochs} epochs: {csv_setup + sum(csv_epochs):6.2f}s vs "
+                         f"{cached_setup + sum(cached_epochs):6.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="EEG pipeline benchmarks")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    stats_parser = subparsers.add_parser('stats', help="Prediction statistics accumulator")
+    stats_parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    stats_parser.add_argument('--repeats', type=int, default=3)
+    stats_parser.set_defaults(func=benchmark_stats)
+
+    sharding_parser = subparsers.add_parser('sharding', help="Multi-process sharded inference scaling")
+    sharding_parser.add_argument('--rows', type=int, default=200_000)
+    sharding_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    sharding_parser.add_argument('--threads-per-worker', type=int, default=None)
+    sharding_parser.add_argument('--repeats', type=int, default=3)
+    sharding_parser.set_defaults(func=benchmark_sharding)
+
+    backends_parser = subparsers.add_parser('backends', help="Load time and latency per inference backend")
+    backends_parser.add_argument('--rows', type=int, nargs='+', default=[1, 64, 4096])
+    backends_parser.add_argument('--repeats', type=int, default=5)
+    backends_parser.set_defaults(func=benchmark_backends)
+
+    cache_parser = subparsers.add_parser('result-cache', help="Result cache hit versus full prediction")
+    cache_parser.add_argument('--input', default='normalized_eeg_data.csv')
+    cache_parser.add_argument('--repeats', type=int, default=5)
+    cache_parser.set_defaults(func=benchmark_result_cache)
+
+    cancel_parser = subparsers.add_parser('cancel', help="Latency from cancel request to CPU release")
+    cancel_parser.add_argument('--rows', type=int, default=200_000)
+    cancel_parser.add_argument('--chunk-rows', type=int, default=20_000)
+    cancel_parser.set_defaults(func=benchmark_cancel)
+
+    batching_parser = subparsers.add_parser('batching', help="Coalescing of simultaneous worker requests")
+    batching_parser.add_argument('--requests', type=int, default=4)
+    batching_parser.add_argument('--rows', type=int, default=2_000, help="Rows per request")
+    batching_parser.add_argument('--preprocess-threads', type=int, nargs='+', default=[1, 4])
+    batching_parser.set_defaults(func=benchmark_batching)
+
+    features_parser = subparsers.add_parser('features', help="Vectorized window feature extraction")
+    features_parser.add_argument('--kaggle-dir', default='Kaggle_Datasets')
+    features_parser.add_argument('--subjects', type=int, default=4)
+    features_parser.add_argument('--rows', type=int, default=38_252, help="Rows per synthetic subject")
+    features_parser.add_argument('--repeats', type=int, default=3)
+    features_parser.set_defaults(func=benchmark_features)
+
+    subject_workers_parser = subparsers.add_parser('subject-workers',
+                                                   help="Parallel subject processing versus a sequential run")
+    subject_workers_parser.add_argument('--kaggle-dir', default='Kaggle_Datasets')
+    subject_workers_parser.add_argument('--subjects', type=int, default=8)
+    subject_workers_parser.add_argument('--rows', type=int, default=38_252, help="Rows per synthetic subject")
+    subject_workers_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    subject_workers_parser.set_defaults(func=benchmark_subject_workers)
+
+    running_parser = subparsers.add_parser('running-stats', help="Incremental versus direct window statistics")
+    running_parser.add_argument('--rows', type=int, default=200_000)
+    running_parser.add_argument('--steps', type=int, nargs='+', default=[256, 51, 8])
+    running_parser.set_defaults(func=benchmark_running_stats)
+
+    spectral_parser = subparsers.add_parser('spectral', help="Batched FFT band powers versus recording length")
+    spectral_parser.add_argument('--minutes', type=float, nargs='+', default=[1, 10, 60])
+    spectral_parser.add_argument('--channels', type=int, default=14)
+    spectral_parser.add_argument('--repeats', type=int, default=3)
+    spectral_parser.set_defaults(func=benchmark_spectral)
+
+    csv_parser = subparsers.add_parser('csv-read', help="CSV parse throughput, list-of-lists versus NumPy blocks")
+    csv_parser.add_argument('--input', default='normalized_eeg_data.csv')
+    csv_parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    csv_parser.add_argument('--repeats', type=int, default=3)
+    csv_parser.set_defaults(func=benchmark_csv_read)
+
+    store_parser = subparsers.add_parser('feature-store', help="CSV parsing versus memory-mapped feature store")
+    store_parser.add_argument('--rows', type=int, nargs='+', default=[1_368, 100_000, 1_000_000])
+    store_parser.add_argument('--repeats', type=int, default=3)
+    store_parser.set_defaults(func=benchmark_feature_store)
+
+    subjects_parser = subparsers.add_parser('subjects', help="Per-subject loading through the subject index")
+    subjects_parser.add_argument('--subjects', type=int, default=36)
+    subjects_parser.add_argument('--rows-per-subject', type=int, default=20_000)
+    subjects_parser.add_argument('--repeats', type=int, default=5)
+    subjects_parser.set_defaults(func=benchmark_subjects)
+
+    normalize_parser = subparsers.add_parser('normalize', help="Streaming versus list-based min-max normalization")
+    normalize_parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 500_000])
+    normalize_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    normalize_parser.add_argument('--chunk-rows', type=int, default=16_384)
+    normalize_parser.set_defaults(func=benchmark_normalize)
+
+    scaling_parser = subparsers.add_parser('scaling', help="Per-file scaler fit versus saved normalization parameters")
+    scaling_parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    scaling_parser.add_argument('--chunk-rows', type=int, default=50_000)
+    scaling_parser.add_argument('--repeats', type=int, default=3)
+    scaling_parser.set_defaults(func=benchmark_scaling)
+
+    validate_parser = subparsers.add_parser('validate', help="Full-file upload validation throughput")
+    validate_parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    validate_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    validate_parser.add_argument('--repeats', type=int, default=3)
+    validate_parser.set_defaults(func=benchmark_validate)
+
+    sidecar_parser = subparsers.add_parser('sidecar', help="Repeat validation: full scan versus sidecar")
+    sidecar_parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    sidecar_parser.add_argument('--repeats', type=int, default=3)
+    sidecar_parser.set_defaults(func=benchmark_sidecar)
+
+    training_parser = subparsers.add_parser('training-input', help="Training input pipeline time per epoch")
+    training_parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    training_parser.add_argument('--epochs', type=int, default=3)
+    training_parser.set_defaults(func=benchmark_training_input)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
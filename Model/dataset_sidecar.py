@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Schema and statistics sidecar of a dataset file
+Next to every table the pipeline writes or validates (CSV file or feature
+store) a small <file>.meta.json records its content hash, schema, row count,
+per-column count/min/max/mean/std with NaN and infinite counts, label
+histogram and recording shape, and the last validation summary. A feature
+table written by simple_preprocess.py also records the band powers and
+spectrum of the recordings it was extracted from (see
+spectral_features.SpectralAccumulator), which the backend returns with
+analysis results; the normalized table keeps them.
+verify_compatibility.py and predict_with_model.py read it instead of
+rescanning a file that has not changed, and the backend reads channel count,
+row count and duration from it.
+
+A sidecar is trusted while the file's size and modification time are the
+ones it recorded; if only the modification time changed the file is hashed
+and the sidecar kept when the content is the same.
+
+Usage:
+    python dataset_sidecar.py <table.csv | table.features> [--force]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+
+from eeg_io import DEFAULT_CHUNK_ROWS
+from feature_store import LABEL_COLUMN, is_feature_store, iter_table, load_feature_store, table_header
+from file_hashing import input_hash
+from normalization import ColumnStatistics, NormalizationParams
+from spectral_features import SAMPLING_RATE, STEP_SIZE, WINDOW_SIZE
+
+SIDECAR_SUFFIX = ".meta.json"
+SIDECAR_FORMAT_VERSION = 1
+
+# Tables of 54 features (+ target) hold one feature row per window of the 14-channel recordings
+FEATURE_COLUMNS = 54
+FEATURE_CHANNELS = 14
+
+def sidecar_path(path):
+    """Where the sidecar of a CSV file or feature store is kept"""
+    return path.rstrip(os.sep) + SIDECAR_SUFFIX
+
+def file_identity(path):
+    """(size, mtime_ns) of a file, or total size and latest mtime of a store directory's files"""
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    size = mtime_ns = 0
+    for entry in os.scandir(path):
+        if entry.is_file():
+            stat = entry.stat()
+            size += stat.st_size
+            mtime_ns = max(mtime_ns, stat.st_mtime_ns)
+    return size, mtime_ns
+
+def same_content(entry, path):
+    """
+    True if path still holds the content entry ({'size', 'mtime_ns', 'sha256'}) was recorded from
+    Size and modification time are checked first; the file is only hashed
+    when they have changed, so a touched but unmodified file still matches.
+    Refreshes entry's mtime_ns after a matching hash.
+    """
+    size, mtime_ns = file_identity(path)
+    if entry.get('size') == size and entry.get('mtime_ns') == mtime_ns:
+        return True
+    if entry.get('size') != size or entry.get('sha256') != input_hash(path):
+        return False
+    entry['mtime_ns'] = mtime_ns
+    return True
+
+def load_sidecar(path):
+    """The sidecar of path if it still describes the file's content, else None"""
+    try:
+        with open(sidecar_path(path)) as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if sidecar.get('format_version') != SIDECAR_FORMAT_VERSION:
+        return None
+    try:
+        mtime_ns = sidecar.get('mtime_ns')
+        if not same_content(sidecar, path):
+            return None
+    except OSError:
+        return None
+    if sidecar['mtime_ns'] != mtime_ns:
+        # Content unchanged; remember the new modification time so the next lookup is not hashed
+        try:
+            write_sidecar(path, sidecar)
+        except OSError:
+            pass
+    return sidecar
+
+def content_hash(path):
+    """SHA-256 of a file or store, taken from a matching sidecar when there is one"""
+    sidecar = load_sidecar(path)
+    return sidecar['sha256'] if sidecar else input_hash(path)
+
+def write_sidecar(path, sidecar):
+    """Write a sidecar document atomically next to path"""
+    target = sidecar_path(path)
+    # Per process and thread, so concurrent writers never share a half-written staging file
+    staging = target + f".tmp{os.getpid()}.{threading.get_ident()}"
+    with open(staging, 'w') as f:
+        json.dump(sidecar, f, indent=2)
+    os.replace(staging, target)
+    return target
+
+def recording_info(column_count, rows, numeric_columns=None, step_size=STEP_SIZE, segments=None):
+    """
+    Shape of the recording a table describes
+    A feature table (54 features, with or without the target) has one row per
+    window of a 14-channel recording; segments lists the row counts of the
+    separate recordings (subjects) it concatenates, if known. Any other table
+    is taken to hold one sample per row and one channel per numeric column.
+    """
+    if column_count in (FEATURE_COLUMNS, FEATURE_COLUMNS + 1):
+        segments = [count for count in (segments or [rows]) if count]
+        samples = sum((count - 1) * step_size + WINDOW_SIZE for count in segments)
+        return {
+            'kind': 'features',
+            'channels': FEATURE_CHANNELS,
+            'windows': rows,
+            'recordings': len(segments),
+            'window_size': WINDOW_SIZE,
+            'step_size': step_size,
+            'sampling_rate': SAMPLING_RATE,
+            'samples': samples,
+            'duration_s': samples / SAMPLING_RATE
+        }
+    channels = column_count if numeric_columns is None else numeric_columns
+    return {
+        'kind': 'samples',
+        'channels': channels,
+        'sampling_rate': SAMPLING_RATE,
+        'samples': rows,
+        'duration_s': rows / SAMPLING_RATE
+    }
+
+def _finite_or_none(values):
+    """JSON-safe list: NaN and infinite values (e.g. of all-NaN columns) become null"""
+    return [value if np.isfinite(value) else None for value in np.asarray(values, dtype=np.float64).tolist()]
+
+def build_sidecar(path, statistics, label_counts=None, columns=None, column_count=None, label_column=None,
+                  rows=None, sha256=None, identity=None, step_size=STEP_SIZE, segments=None, validation=None,
+                  spectral=None):
+    """
+    Sidecar document of path from the ColumnStatistics of all its columns
+    label_counts is the histogram of the label column; rows defaults to the
+    rows folded into statistics (a validator leaves malformed rows out).
+    sha256 and identity (see file_identity) should be taken before the file
+    was read; they are taken now when not given. segments is as for
+    recording_info; a store's subject index supplies it when not given.
+    spectral is the SpectralAccumulator summary of the source recordings.
+    """
+    size, mtime_ns = identity or file_identity(path)
+    rows = statistics.rows if rows is None else rows
+    if column_count is None:
+        column_count = len(columns) if columns else (len(statistics.mean) if statistics.rows else 0)
+    if statistics.rows:
+        column_stats = {
+            'count': statistics.count.tolist(),
+            'non_finite': statistics.non_finite.tolist(),
+            'min': _finite_or_none(statistics.minimum),
+            'max': _finite_or_none(statistics.maximum),
+            'mean': _finite_or_none(statistics.mean),
+            'std': _finite_or_none(statistics.std())
+        }
+        numeric_columns = int(np.count_nonzero(statistics.count))
+    else:
+        column_stats = None
+        numeric_columns = 0
+    if label_column is not None:
+        numeric_columns -= 1
+    if segments is None and is_feature_store(path):
+        segments = [entry['rows'] for entry in load_feature_store(path).subjects()] or None
+    sidecar = {
+        'format_version': SIDECAR_FORMAT_VERSION,
+        'file': os.path.basename(path.rstrip(os.sep)),
+        'size': size,
+        'mtime_ns': mtime_ns,
+        'sha256': sha256 or input_hash(path),
+        'format': 'store' if is_feature_store(path) else 'csv',
+        'columns': columns,
+        'column_count': column_count,
+        'rows': rows,
+        'label_column': label_column,
+        'column_stats': column_stats,
+        'label_counts': dict(sorted((label_counts or {}).items(), key=lambda item: int(item[0]))),
+        'recording': recording_info(column_count, rows, max(numeric_columns, 0), step_size, segments)
+    }
+    if spectral is not None:
+        sidecar['spectral'] = spectral
+    if validation is not None:
+        sidecar['validation'] = validation
+    return sidecar
+
+def label_column_of(path, columns):
+    """Name of path's label column, or None if it has none that can be told from its header"""
+    if is_feature_store(path):
+        store = load_feature_store(path)
+        return store.label_column if store.labels is not None else None
+    if columns and columns[-1] == LABEL_COLUMN:
+        return LABEL_COLUMN
+    return None
+
+def count_labels(label_counts, labels):
+    """Add the non-negative integer values of a label array to a {'value': count} histogram"""
+    labels = labels[np.isfinite(labels)]
+    labels = labels[(labels >= 0) & (labels == np.floor(labels))]
+    values, counts = np.unique(labels, return_counts=True)
+    for value, n in zip(values.tolist(), counts.tolist()):
+        key = str(int(value))
+        label_counts[key] = label_counts.get(key, 0) + n
+    return label_counts
+
+def describe_table(path, chunk_rows=DEFAULT_CHUNK_ROWS, step_size=STEP_SIZE, segments=None, spectral=None):
+    """Scan a CSV file or feature store once and write its sidecar; returns the sidecar"""
+    identity = file_identity(path)
+    sha256 = input_hash(path)
+    columns = table_header(path)
+    label_column = label_column_of(path, columns)
+    statistics = ColumnStatistics()
+    label_counts = {}
+    for chunk in iter_table(path, chunk_rows, strict=False):
+        statistics.update(chunk)
+        if label_column is not None:
+            count_labels(label_counts, chunk[:, -1])
+    sidecar = build_sidecar(path, statistics, label_counts, columns, label_column=label_column,
+                            sha256=sha256, identity=identity, step_size=step_size, segments=segments,
+                            spectral=spectral)
+    write_sidecar(path, sidecar)
+    return sidecar
+
+def write_table_sidecar(path, statistics, label_counts, columns, label_column, step_size=None, segments=None,
+                        spectral=None):
+    """
+    Sidecar of a table just written, from the statistics gathered while writing it
+    Returns the sidecar path, or None if it could not be written: a sidecar is
+    an optimization and its absence only means the next reader scans the file.
+    """
+    try:
+        sidecar = build_sidecar(path, statistics, label_counts, columns, label_column=label_column,
+                                step_size=step_size or STEP_SIZE, segments=segments, spectral=spectral)
+        return write_sidecar(path, sidecar)
+    except OSError:
+        return None
+
+def ensure_sidecar(path, chunk_rows=DEFAULT_CHUNK_ROWS, step_size=STEP_SIZE):
+    """The sidecar of path, scanning the file only if there is no matching one"""
+    return load_sidecar(path) or describe_table(path, chunk_rows, step_size)
+
+def scaling_params(sidecar, width):
+    """
+    NormalizationParams of the first width columns of a sidecar's table
+    None when the table has fewer columns, or when a row of it was malformed
+    or holds a missing or non-finite value in them: the statistics leave
+    such values out, the predictor reads them as 0.
+    """
+    stats = sidecar.get('column_stats')
+    if not stats or sidecar.get('column_count', 0) < width or not sidecar['rows']:
+        return None
+    if any(count != sidecar['rows'] for count in stats['count'][:width]):
+        return None
+    columns = (sidecar.get('columns') or [str(i) for i in range(width)])[:width]
+    return NormalizationParams(columns, sidecar['rows'], stats['min'][:width], stats['max'][:width],
+                               stats['mean'][:width], stats['std'][:width], {'file': sidecar['file']})
+
+def main():
+    parser = argparse.ArgumentParser(description="Write or show the schema and statistics sidecar of a table")
+    parser.add_argument('table', help="CSV file or feature store")
+    parser.add_argument('--force', action='store_true', help="Rescan even if the sidecar matches the file")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    try:
+        if args.force:
+            sidecar = describe_table(args.table, args.chunk_rows)
+        else:
+            sidecar = ensure_sidecar(args.table, args.chunk_rows)
+        print(json.dumps({'success': True, 'sidecar': sidecar_path(args.table), 'rows': sidecar['rows'],
+                          'columns': sidecar['column_count'], 'recording': sidecar['recording']}))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
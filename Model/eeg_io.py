@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Shared numeric CSV reader for the EEG scripts
+A header row is detected from the first line (any cell that is not a number)
+and the rest of the file is bulk-parsed by NumPy's C tokenizer straight into
+C-contiguous float64 or float32 arrays, optionally in fixed-size chunks, so
+large recordings never pass through Python lists of floats.
+"""
+
+import csv
+import itertools
+
+import numpy as np
+
+# Rows parsed per block; ~7 MB of float64 for a 54-column table
+DEFAULT_CHUNK_ROWS = 16384
+
+def _is_number(cell):
+    try:
+        float(cell)
+    except ValueError:
+        return False
+    return True
+
+def _first_line(f):
+    """First non-blank line of f split into cells, or None for an empty file"""
+    for line in f:
+        if line.strip():
+            return next(csv.reader([line]))
+    return None
+
+def read_header(file_path):
+    """Column names of file_path, or None if its first line is data"""
+    with open(file_path, 'r', newline='') as f:
+        cells = _first_line(f)
+    if cells is None or all(_is_number(cell) for cell in cells):
+        return None
+    return cells
+
+def _parse_lines(lines, columns, dtype, strict, first_line_number):
+    """
+    Parse a list of data lines into a (rows, columns) array
+    NumPy's tokenizer handles the block in one call; if it rejects the block,
+    the lines are parsed one by one, either to report the first bad line
+    (strict) or to fill missing and non-numeric cells with NaN.
+    """
+    try:
+        block = np.loadtxt(lines, delimiter=',', dtype=dtype, ndmin=2, comments=None)
+        if block.shape[1] == columns:
+            return block
+    except ValueError:
+        pass
+
+    rows = []
+    for offset, line in enumerate(lines):
+        if not line.strip():
+            continue
+        cells = line.rstrip('\r\n').split(',')
+        if strict:
+            if len(cells) != columns:
+                raise ValueError(f"line {first_line_number + offset}: expected {columns} columns, found {len(cells)}")
+            bad = next((cell for cell in cells if not _is_number(cell)), None)
+            if bad is not None:
+                raise ValueError(f"line {first_line_number + offset}: non-numeric value {bad.strip()!r}")
+        row = [float(cell) if _is_number(cell) else np.nan for cell in cells[:columns]]
+        row.extend([np.nan] * (columns - len(row)))
+        rows.append(row)
+    return np.array(rows, dtype=dtype).reshape(-1, columns)
+
+def iter_numeric_csv(file_path, chunk_rows=DEFAULT_CHUNK_ROWS, dtype=np.float64, strict=True):
+    """
+    Yield the data rows of file_path as (rows, columns) arrays of up to chunk_rows rows
+    The header row, if any, is skipped and the column count is taken from the
+    first data row. With strict, a ragged row or a non-numeric cell raises
+    ValueError naming the line; otherwise missing and non-numeric cells are NaN
+    and extra cells are dropped. Blank lines are ignored.
+    """
+    with open(file_path, 'r', newline='') as f:
+        first = _first_line(f)
+        if first is None:
+            return
+        line_number = 2
+        if all(_is_number(cell) for cell in first):
+            # No header: the first line is data
+            pending = [','.join(first)]
+            line_number = 1
+        else:
+            pending = []
+        columns = None
+
+        while True:
+            lines = pending + list(itertools.islice(f, chunk_rows - len(pending)))
+            pending = []
+            if not lines:
+                return
+            if columns is None:
+                data_line = next((line for line in lines if line.strip()), None)
+                if data_line is None:
+                    line_number += len(lines)
+                    continue
+                columns = len(data_line.split(','))
+            block = _parse_lines(lines, columns, dtype, strict, line_number)
+            line_number += len(lines)
+            if len(block):
+                yield np.ascontiguousarray(block)
+
+def read_numeric_csv(file_path, dtype=np.float64, max_rows=None, strict=True):
+    """
+    Read file_path into (header, data)
+    header is the list of column names or None; data is a C-contiguous
+    (rows, columns) array of at most max_rows rows. See iter_numeric_csv for
+    how malformed rows are handled.
+    """
+    header = read_header(file_path)
+    chunk_rows = min(max_rows, DEFAULT_CHUNK_ROWS) if max_rows else DEFAULT_CHUNK_ROWS
+    chunks = []
+    rows = 0
+    for chunk in iter_numeric_csv(file_path, chunk_rows, dtype, strict):
+        chunks.append(chunk)
+        rows += len(chunk)
+        if max_rows and rows >= max_rows:
+            break
+
+    if not chunks:
+        columns = len(header) if header else 0
+        return header, np.empty((0, columns), dtype=dtype)
+    data = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+    if max_rows:
+        data = data[:max_rows]
+    return header, data
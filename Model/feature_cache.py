@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Per-subject feature shard cache for simple_preprocess.py
+A manifest records, for every subject file, its size, modification time and
+content hash together with the preprocessing parameters that produced its
+cached feature shard. A rerun reuses the shards of unchanged subjects, so
+only new or modified recordings are processed before the shards are merged.
+Shards whose source file has disappeared are evicted.
+Uses only the standard library, like simple_preprocess.py.
+"""
+
+import json
+import os
+
+from file_hashing import file_hash
+
+MANIFEST_NAME = "manifest.json"
+SHARD_SUFFIX = ".csv"
+
+# Bump when the shard layout or the feature computation changes
+FEATURE_FORMAT_VERSION = 1
+
+class FeatureCache:
+    """Manifest-tracked directory of per-subject feature shards"""
+
+    def __init__(self, cache_dir, params):
+        self.cache_dir = cache_dir
+        self.params = dict(params, format=FEATURE_FORMAT_VERSION)
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+        self.subjects = {}
+
+        manifest = self._load_manifest()
+        # Shards made with other preprocessing parameters are all stale
+        if manifest.get('params') == self.params:
+            self.subjects = manifest.get('subjects', {})
+
+    def shard_path(self, csv_file):
+        return os.path.join(self.cache_dir, os.path.splitext(csv_file)[0] + SHARD_SUFFIX)
+
+    def lookup(self, csv_file, file_path):
+        """
+        Return the manifest entry for csv_file if its cached shard is still valid, else None
+        Size and modification time are checked first; the file is only hashed
+        when they have changed, so a touched but unmodified file stays cached.
+        """
+        entry = self.subjects.get(csv_file)
+        if entry is None or not os.path.exists(self.shard_path(csv_file)):
+            return None
+
+        stat = os.stat(file_path)
+        if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry
+        if entry['size'] != stat.st_size or entry['sha256'] != file_hash(file_path):
+            return None
+
+        entry['mtime_ns'] = stat.st_mtime_ns
+        return entry
+
+    def record(self, csv_file, file_path, sha256, stats):
+        """Record that shard_path(csv_file) holds the features of file_path as hashed before processing"""
+        stat = os.stat(file_path)
+        self.subjects[csv_file] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': sha256,
+            'features': stats['features'],
+            'samples': stats['samples'],
+            'spectral': stats.get('spectral')
+        }
+
+    def forget(self, csv_file):
+        """Drop csv_file's entry, e.g. after it failed to process"""
+        self.subjects.pop(csv_file, None)
+
+    def evict(self, present_files):
+        """Remove entries and shards for subject files that no longer exist, and unreferenced shards"""
+        evicted = [csv_file for csv_file in self.subjects if csv_file not in present_files]
+        for csv_file in evicted:
+            del self.subjects[csv_file]
+
+        referenced = {os.path.basename(self.shard_path(csv_file)) for csv_file in self.subjects}
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            # Staging files (<shard>.tmp<pid>) are only left behind by an interrupted run
+            if (name.endswith(SHARD_SUFFIX) and name not in referenced) or SHARD_SUFFIX + ".tmp" in name:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+        return evicted
+
+    def save(self):
+        """Write the manifest atomically"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        staging_path = self.manifest_path + f".tmp{os.getpid()}"
+        with open(staging_path, 'w') as f:
+            json.dump({'params': self.params, 'subjects': self.subjects}, f, indent=2, sort_keys=True)
+        os.replace(staging_path, self.manifest_path)
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
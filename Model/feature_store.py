@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Binary feature store: the interchange format between the pipeline's stages
+A store is a directory holding the feature matrix as features.npy, the label
+column (if any) as labels.npy and a small header.json with the column names.
+Loading memory-maps the .npy files, so opening a store costs the same for any
+number of rows and the arrays go to NumPy, scikit-learn or TensorFlow without
+being parsed or copied. CSV stays the import/export format.
+
+Stores written by the preprocessing scripts also carry a subject index: each
+subject's contiguous row range with its row and class counts, so one subject
+or a list of subjects is loaded in time proportional to the rows requested,
+and subject-wise splits need no scan of the labels.
+
+Usage:
+    python feature_store.py import <table.csv> [<table.features>] [--label-column main.disorder]
+    python feature_store.py export <table.features> [<table.csv>]
+    python feature_store.py info <table.features>
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import sys
+
+import numpy as np
+import numpy.lib.format as npy_format
+
+from eeg_io import DEFAULT_CHUNK_ROWS, iter_numeric_csv, read_header, read_numeric_csv
+
+STORE_SUFFIX = ".features"
+HEADER_NAME = "header.json"
+FEATURES_NAME = "features.npy"
+LABELS_NAME = "labels.npy"
+STORE_FORMAT_VERSION = 1
+
+# Name of the target column in EE_PCA_1.csv and the preprocessing outputs
+LABEL_COLUMN = "main.disorder"
+
+# Fixed .npy header size, so a streamed file's header can be rewritten with
+# the final row count once everything has been appended
+NPY_HEADER_BYTES = 128
+
+def is_feature_store(path):
+    """True if path is a feature store directory"""
+    return os.path.isfile(os.path.join(path, HEADER_NAME))
+
+def store_path_for(table_path):
+    """The feature store path that goes with a CSV path (table.csv -> table.features)"""
+    return os.path.splitext(table_path)[0] + STORE_SUFFIX
+
+class FeatureStore:
+    """Feature matrix, optional labels and column names of one store, or a row range of it"""
+
+    def __init__(self, features, labels, columns, label_column=None, header=None):
+        self.features = features
+        self.labels = labels
+        self.columns = list(columns)
+        self.label_column = label_column
+        self.header = header or {}
+
+    @property
+    def shape(self):
+        """(rows, columns) of the equivalent CSV table, label column included"""
+        return (len(self.features), self.features.shape[1] + (self.labels is not None))
+
+    def __len__(self):
+        return len(self.features)
+
+    def __getitem__(self, rows):
+        """The rows in a slice, as a store view; nothing is copied"""
+        if not isinstance(rows, slice):
+            raise TypeError("feature stores are indexed by row slices")
+        labels = self.labels[rows] if self.labels is not None else None
+        # The subject index describes the whole store's rows, not the view's
+        header = {key: value for key, value in self.header.items() if key != 'subjects'}
+        return FeatureStore(self.features[rows], labels, self.columns, self.label_column, header)
+
+    def subjects(self):
+        """Subject index entries in row order: subject, id, start, stop, rows, class_counts"""
+        return list(self.header.get('subjects', []))
+
+    def subject_names(self):
+        return [entry['subject'] for entry in self.subjects()]
+
+    def select_subjects(self, subjects):
+        """
+        The rows of the given subjects, in the order given
+        A single subject, or subjects whose rows are adjacent, is a view;
+        otherwise only the requested rows are copied.
+        """
+        index = {entry['subject']: entry for entry in self.subjects()}
+        ranges = []
+        for subject in subjects:
+            if subject not in index:
+                raise KeyError(f"unknown subject {subject!r}")
+            start, stop = index[subject]['start'], index[subject]['stop']
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], stop)
+            else:
+                ranges.append((start, stop))
+        if len(ranges) == 1:
+            return self[ranges[0][0]:ranges[0][1]]
+
+        parts = [self[start:stop] for start, stop in ranges]
+        features = np.concatenate([part.features for part in parts]) if parts else self.features[:0]
+        labels = None
+        if self.labels is not None:
+            labels = np.concatenate([part.labels for part in parts]) if parts else self.labels[:0]
+        return FeatureStore(features, labels, self.columns, self.label_column, parts[0].header if parts else {})
+
+    def table_columns(self):
+        """Column names of the equivalent CSV table"""
+        return self.columns + ([self.label_column] if self.labels is not None else [])
+
+    def table(self):
+        """The equivalent CSV table as one array, label column last (a copy)"""
+        if self.labels is None:
+            return np.array(self.features)
+        return np.column_stack((self.features, self.labels))
+
+    def iter_chunks(self, chunk_rows):
+        """Yield consecutive views of at most chunk_rows rows"""
+        for start in range(0, len(self), chunk_rows):
+            yield self[start:start + chunk_rows]
+
+def load_feature_store(path, mmap=True):
+    """Open a store; with mmap the arrays are read-only memory maps of the .npy files"""
+    try:
+        with open(os.path.join(path, HEADER_NAME)) as f:
+            header = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"{path} is not a feature store: {e}")
+    if header.get('format') != STORE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported feature store format in {path}: {header.get('format')}")
+
+    mmap_mode = 'r' if mmap else None
+    features = np.load(os.path.join(path, FEATURES_NAME), mmap_mode=mmap_mode)
+    labels = None
+    if header.get('label_column') is not None:
+        labels = np.load(os.path.join(path, LABELS_NAME), mmap_mode=mmap_mode)
+    if len(features) != header['rows'] or (labels is not None and len(labels) != header['rows']):
+        raise ValueError(f"Feature store {path} is truncated")
+    return FeatureStore(features, labels, header['columns'], header.get('label_column'), header)
+
+def load_subjects(path, subjects):
+    """Open a store and return the rows of the given subjects (see FeatureStore.select_subjects)"""
+    return load_feature_store(path).select_subjects(subjects)
+
+def subject_split(subjects, fractions=(0.7, 0.15, 0.15), seed=0):
+    """
+    Shuffle subject names with a fixed seed and cut them into groups by fraction
+    Every subject's rows end up in exactly one group, so no subject is seen in
+    both training and evaluation. Each non-zero fraction gets at least one
+    subject while there are enough; the first group takes the remainder.
+    """
+    names = list(subjects)
+    random.Random(seed).shuffle(names)
+    sizes = [int(round(fraction * len(names))) for fraction in fractions[1:]]
+    for i, fraction in enumerate(fractions[1:]):
+        if fraction > 0 and sizes[i] == 0 and len(names) - sum(sizes) > 1:
+            sizes[i] = 1
+    groups = []
+    stop = len(names)
+    for size in reversed(sizes):
+        groups.insert(0, names[stop - size:stop])
+        stop -= size
+    return [names[:stop]] + groups
+
+def leave_one_subject_out(subjects):
+    """Yield (training subjects, held-out subject) for every subject"""
+    names = list(subjects)
+    for i, held_out in enumerate(names):
+        yield names[:i] + names[i + 1:], held_out
+
+class _NpyAppender:
+    """An .npy file written a block of rows at a time; the header is completed on close"""
+
+    def __init__(self, path, dtype, width=None):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        self.rows = 0
+        self.file = open(path, 'wb')
+        self._write_header()
+
+    def append(self, block):
+        block = np.ascontiguousarray(block, dtype=self.dtype)
+        self.file.write(block.data)
+        self.rows += len(block)
+
+    def close(self):
+        self.file.seek(0)
+        self._write_header()
+        self.file.close()
+
+    def _write_header(self):
+        shape = (self.rows,) if self.width is None else (self.rows, self.width)
+        header = {'descr': npy_format.dtype_to_descr(self.dtype), 'fortran_order': False, 'shape': shape}
+        text = repr(header).encode('latin1')
+        padding = NPY_HEADER_BYTES - len(npy_format.MAGIC_PREFIX) - 4 - len(text)
+        if padding < 1:
+            raise ValueError(f"shape {shape} does not fit the .npy header")
+        self.file.write(npy_format.magic(1, 0) + (len(text) + padding).to_bytes(2, 'little')
+                        + text + b' ' * (padding - 1) + b'\n')
+
+class FeatureStoreWriter:
+    """
+    Write a store block by block
+    The store is built in a staging directory and moved into place by close(),
+    so readers never see a partial store; leaving the context manager with an
+    exception discards it.
+    """
+
+    def __init__(self, path, columns, label_column=None, dtype=np.float64):
+        self.path = path
+        self.columns = list(columns)
+        self.label_column = label_column
+        self.dtype = np.dtype(dtype)
+        self.extra = {}
+        self.subjects = []
+
+        self.staging_path = f"{os.path.abspath(path).rstrip(os.sep)}.tmp{os.getpid()}"
+        shutil.rmtree(self.staging_path, ignore_errors=True)
+        os.makedirs(self.staging_path)
+        self._features = _NpyAppender(os.path.join(self.staging_path, FEATURES_NAME), self.dtype, len(self.columns))
+        self._labels = None
+        if label_column is not None:
+            self._labels = _NpyAppender(os.path.join(self.staging_path, LABELS_NAME), self.dtype)
+
+    @property
+    def rows(self):
+        return self._features.rows
+
+    def begin_subject(self, subject, subject_id=None):
+        """Rows appended from now on belong to `subject` in the subject index"""
+        self.subjects.append({'subject': subject, 'id': subject_id, 'start': self.rows, 'stop': self.rows,
+                              'rows': 0, 'class_counts': {}})
+
+    def append(self, features, labels=None):
+        """Append a (rows, features) block and, for stores with a label column, its labels"""
+        features = np.asarray(features)
+        if features.ndim != 2 or features.shape[1] != len(self.columns):
+            raise ValueError(f"expected {len(self.columns)} feature columns, got shape {features.shape}")
+        if (labels is None) != (self._labels is None):
+            raise ValueError("labels must be given exactly when the store has a label column")
+        if labels is not None and len(labels) != len(features):
+            raise ValueError(f"{len(labels)} labels for {len(features)} rows")
+        self._features.append(features)
+        if labels is not None:
+            self._labels.append(labels)
+
+        if self.subjects:
+            entry = self.subjects[-1]
+            entry['stop'] = self.rows
+            entry['rows'] = entry['stop'] - entry['start']
+            if labels is not None:
+                values, counts = np.unique(np.asarray(labels), return_counts=True)
+                for value, count in zip(values.tolist(), counts.tolist()):
+                    key = _label_key(value)
+                    entry['class_counts'][key] = entry['class_counts'].get(key, 0) + count
+
+    def append_table(self, block):
+        """Append rows laid out as in the CSV table, label column last"""
+        if self._labels is None:
+            self.append(block)
+        else:
+            self.append(block[:, :-1], block[:, -1])
+
+    def close(self):
+        self._features.close()
+        if self._labels is not None:
+            self._labels.close()
+        header = dict(self.extra)
+        if self.subjects:
+            header['subjects'] = self.subjects
+        header.update({
+            'format': STORE_FORMAT_VERSION,
+            'rows': self.rows,
+            'columns': self.columns,
+            'label_column': self.label_column,
+            'dtype': self.dtype.name
+        })
+        with open(os.path.join(self.staging_path, HEADER_NAME), 'w') as f:
+            json.dump(header, f, indent=2)
+
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+        os.replace(self.staging_path, self.path)
+
+    def discard(self):
+        for appender in (self._features, self._labels):
+            if appender is not None and not appender.file.closed:
+                appender.file.close()
+        shutil.rmtree(self.staging_path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+def split_table_columns(columns, label_column=LABEL_COLUMN):
+    """(feature columns, label column or None) of a CSV table's column names"""
+    if label_column is not None and columns and columns[-1] == label_column:
+        return columns[:-1], label_column
+    return columns, None
+
+def save_feature_store(path, table, columns, label_column=LABEL_COLUMN, dtype=np.float64, subjects=None):
+    """
+    Write a whole table (label column last, if columns ends with label_column) as a store
+    subjects is a subject index to carry over, for a table with the same rows in the same order.
+    """
+    feature_columns, label_column = split_table_columns(columns, label_column)
+    with FeatureStoreWriter(path, feature_columns, label_column, dtype) as writer:
+        writer.append_table(np.asarray(table))
+        if subjects:
+            writer.extra['subjects'] = subjects
+    return path
+
+def _label_key(value):
+    # Class counts are keyed like the labels read back from JSON: "3" for 3.0
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+def read_table(path, max_rows=None, strict=True):
+    """
+    (column names or None, array) of a CSV file or feature store, label column last
+    For a store this is a copy; use load_feature_store to avoid one.
+    """
+    if is_feature_store(path):
+        store = load_feature_store(path)
+        if max_rows is not None:
+            store = store[:max_rows]
+        return store.table_columns(), store.table()
+    return read_numeric_csv(path, max_rows=max_rows, strict=strict)
+
+def iter_table(path, chunk_rows=DEFAULT_CHUNK_ROWS, strict=True):
+    """Yield the rows of a CSV file or feature store in chunks, label column last (see iter_numeric_csv for strict)"""
+    if is_feature_store(path):
+        for part in load_feature_store(path).iter_chunks(chunk_rows):
+            yield part.table()
+    else:
+        yield from iter_numeric_csv(path, chunk_rows, strict=strict)
+
+def table_header(path):
+    """Column names of a CSV file or feature store, or None"""
+    if is_feature_store(path):
+        return load_feature_store(path).table_columns()
+    return read_header(path)
+
+def write_table(path, table, columns):
+    """Write a table to a feature store (path is a store or ends in .features) or to CSV"""
+    if is_feature_store(path) or path.endswith(STORE_SUFFIX):
+        return save_feature_store(path, table, columns)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        if columns:
+            writer.writerow(columns)
+        writer.writerows(np.asarray(table).tolist())
+    return path
+
+def import_csv(csv_path, store_path=None, label_column=LABEL_COLUMN, dtype=np.float64,
+               chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Convert a CSV table to a store in chunks; the label column is used if the header names it"""
+    store_path = store_path or store_path_for(csv_path)
+    header = read_header(csv_path)
+    chunks = iter_numeric_csv(csv_path, chunk_rows, dtype)
+    first = next(chunks, None)
+    width = first.shape[1] if first is not None else len(header or [])
+    columns = header or [str(i) for i in range(width)]
+    if len(columns) != width:
+        raise ValueError(f"{csv_path}: header has {len(columns)} columns, data has {width}")
+
+    feature_columns, label_column = split_table_columns(columns, label_column)
+    with FeatureStoreWriter(store_path, feature_columns, label_column, dtype) as writer:
+        if first is not None:
+            writer.append_table(first)
+        for chunk in chunks:
+            writer.append_table(chunk)
+    return store_path
+
+def export_csv(store_path, csv_path=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Write a store out as CSV, header first, label column last"""
+    csv_path = csv_path or os.path.splitext(store_path.rstrip(os.sep))[0] + ".csv"
+    store = load_feature_store(store_path)
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(store.table_columns())
+        for chunk in store.iter_chunks(chunk_rows):
+            writer.writerows(chunk.table().tolist())
+    return csv_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between CSV tables and binary feature stores")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help="CSV -> feature store")
+    import_parser.add_argument('csv_path')
+    import_parser.add_argument('store_path', nargs='?')
+    import_parser.add_argument('--label-column', default=LABEL_COLUMN,
+                               help=f"Header name of the label column (default {LABEL_COLUMN})")
+    import_parser.add_argument('--float32', action='store_true', help="Store float32 instead of float64")
+
+    export_parser = subparsers.add_parser('export', help="Feature store -> CSV")
+    export_parser.add_argument('store_path')
+    export_parser.add_argument('csv_path', nargs='?')
+
+    info_parser = subparsers.add_parser('info', help="Print a store's header")
+    info_parser.add_argument('store_path')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'import':
+            path = import_csv(args.csv_path, args.store_path, args.label_column,
+                              np.float32 if args.float32 else np.float64)
+            print(json.dumps({'success': True, 'store': path, 'rows': load_feature_store(path).header['rows']}))
+        elif args.command == 'export':
+            print(json.dumps({'success': True, 'csv': export_csv(args.store_path, args.csv_path)}))
+        else:
+            print(json.dumps(load_feature_store(args.store_path).header, indent=2))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+SHA-256 content hashes of input files, models and feature stores
+Shared by the result cache, the feature shard cache, the dataset sidecars and
+the model artifact cache. Uses only the standard library, so the feature
+cache of simple_preprocess.py can use it without NumPy.
+"""
+
+import hashlib
+import os
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def input_hash(input_path):
+    """SHA-256 of an input file, or over every file of a feature store directory"""
+    if not os.path.isdir(input_path):
+        return file_hash(input_path)
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(input_path)):
+        digest.update(f"{name}:{file_hash(os.path.join(input_path, name))}\n".encode())
+    return digest.hexdigest()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Cached, optimized inference forms of the CNN-LSTM model
+The Keras .h5 model is exported once per model file into a cache directory
+keyed by the file's hash, checked against the original model, and reused by
+later runs instead of rebuilding the Keras graph.
+"""
+
+import contextlib
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+from file_hashing import file_hash
+
+# TensorFlow is imported where it is used so that importing this module stays cheap
+
+BACKENDS = ('keras', 'function', 'savedmodel', 'tflite')
+INPUT_SIGNATURE = (None, 1, 54)
+RECURRENT_LAYERS = ('LSTM', 'GRU', 'SimpleRNN')
+
+# Largest per-call batch for the graph and TFLite backends
+PREDICT_BATCH_ROWS = 4096
+
+# Exported artifacts must reproduce the Keras probabilities within this tolerance
+VERIFY_ATOL = 1e-4
+VERIFY_ROWS = 256
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.environ.get('EEG_MODEL_CACHE', os.path.join(script_dir, ".model_cache"))
+
+class GraphPredictor:
+    """Keras-style predict() over a concrete function with a fixed input signature"""
+
+    def __init__(self, function):
+        self.function = function
+
+    def predict(self, X, verbose=0):
+        import tensorflow as tf
+        X = np.asarray(X, dtype=np.float32)
+        outputs = [
+            self.function(tf.constant(X[start:start + PREDICT_BATCH_ROWS])).numpy()
+            for start in range(0, len(X), PREDICT_BATCH_ROWS)
+        ]
+        return np.concatenate(outputs) if outputs else np.zeros((0, 0), dtype=np.float32)
+
+class TFLitePredictor:
+    """Keras-style predict() over a TFLite interpreter"""
+
+    def __init__(self, model_path):
+        import tensorflow as tf
+        self.interpreter = tf.lite.Interpreter(model_path=model_path)
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        self.batch_rows = None
+
+    def predict(self, X, verbose=0):
+        X = np.asarray(X, dtype=np.float32)
+        outputs = []
+        for start in range(0, len(X), PREDICT_BATCH_ROWS):
+            batch = X[start:start + PREDICT_BATCH_ROWS]
+            if len(batch) != self.batch_rows:
+                self.interpreter.resize_tensor_input(self.input_index, batch.shape)
+                self.interpreter.allocate_tensors()
+                self.batch_rows = len(batch)
+            self.interpreter.set_tensor(self.input_index, batch)
+            self.interpreter.invoke()
+            outputs.append(self.interpreter.get_tensor(self.output_index).copy())
+        return np.concatenate(outputs) if outputs else np.zeros((0, 0), dtype=np.float32)
+
+def _frozen_function(keras_model):
+    """tf.function over the model's forward pass with a fixed (None, 1, 54) signature"""
+    import tensorflow as tf
+    return tf.function(lambda x: keras_model(x, training=False),
+                       input_signature=[tf.TensorSpec(INPUT_SIGNATURE, tf.float32)])
+
+def _export_savedmodel(keras_model, path):
+    import tensorflow as tf
+    module = tf.Module()
+    module.model = keras_model
+    module.serve = _frozen_function(keras_model)
+    tf.saved_model.save(module, path, signatures={'serving_default': module.serve})
+
+def _unrolled_clone(keras_model):
+    """Copy of the model with its recurrent layers unrolled
+
+    The input has a single timestep, so unrolling changes nothing numerically but
+    removes the TensorList loop that TFLite builtins cannot run.
+    """
+    def unroll(config):
+        if isinstance(config, dict):
+            if config.get('class_name') in RECURRENT_LAYERS and 'config' in config:
+                config['config']['unroll'] = True
+            for value in config.values():
+                unroll(value)
+        elif isinstance(config, list):
+            for value in config:
+                unroll(value)
+        return config
+
+    clone = keras_model.__class__.from_config(unroll(keras_model.get_config()))
+    clone.set_weights(keras_model.get_weights())
+    return clone
+
+def _export_tflite(keras_model, path):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(_unrolled_clone(keras_model))
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def _open_artifact(backend, path):
+    import tensorflow as tf
+    if backend == 'savedmodel':
+        loaded = tf.saved_model.load(path)
+        predictor = GraphPredictor(loaded.serve)
+        predictor.loaded = loaded  # keep the restored variables alive
+        return predictor
+    return TFLitePredictor(path)
+
+def _verify(keras_model, predictor):
+    """Largest absolute probability difference against the Keras model on a fixed probe batch"""
+    probe = np.random.default_rng(0).standard_normal((VERIFY_ROWS,) + INPUT_SIGNATURE[1:]).astype(np.float32)
+    expected = keras_model.predict(probe, verbose=0)
+    return float(np.max(np.abs(predictor.predict(probe) - expected)))
+
+def load_inference_model(backend, model_path, load_keras_model, cache_dir=None):
+    """
+    Return an object with a Keras-style predict(X, verbose=0) for the chosen backend
+
+    'keras' is the original model; 'function' wraps it in a tf.function with a
+    fixed input signature; 'savedmodel' and 'tflite' are exported on first use
+    into cache_dir/<model sha256>/ and reused afterwards.
+    """
+    import tensorflow as tf
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {', '.join(BACKENDS)}")
+
+    if backend == 'keras':
+        return load_keras_model()
+    if backend == 'function':
+        return GraphPredictor(_frozen_function(load_keras_model()))
+
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    model_sha256 = file_hash(model_path)
+    artifact_root = os.path.join(cache_dir, model_sha256[:16])
+    artifact_path = os.path.join(artifact_root, 'savedmodel' if backend == 'savedmodel' else 'model.tflite')
+    manifest_path = os.path.join(artifact_root, f"{backend}.json")
+
+    if os.path.exists(manifest_path) and os.path.exists(artifact_path):
+        return _open_artifact(backend, artifact_path)
+
+    # First use: export, verify against the original model, then publish the manifest
+    keras_model = load_keras_model()
+    os.makedirs(artifact_root, exist_ok=True)
+    staging_path = artifact_path + f".tmp{os.getpid()}"
+    try:
+        # Exporters print progress; stdout carries the prediction JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            if backend == 'savedmodel':
+                _export_savedmodel(keras_model, staging_path)
+            else:
+                _export_tflite(keras_model, staging_path)
+        max_abs_diff = _verify(keras_model, _open_artifact(backend, staging_path))
+    except Exception:
+        _remove(staging_path)
+        raise
+
+    if max_abs_diff > VERIFY_ATOL:
+        _remove(staging_path)
+        raise ValueError(f"{backend} export differs from the Keras model by {max_abs_diff:.2e} "
+                         f"(tolerance {VERIFY_ATOL:.0e})")
+
+    if os.path.exists(artifact_path):
+        # Another process finished the same export first
+        _remove(staging_path)
+    else:
+        os.replace(staging_path, artifact_path)
+    with open(manifest_path, 'w') as f:
+        json.dump({
+            'backend': backend,
+            'model_path': os.path.abspath(model_path),
+            'model_sha256': model_sha256,
+            'tensorflow_version': tf.__version__,
+            'input_signature': list(INPUT_SIGNATURE),
+            'max_abs_diff': max_abs_diff
+        }, f, indent=2)
+
+    return _open_artifact(backend, artifact_path)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Normalization parameters fitted once and applied to any number of inputs
+A parameter file holds every feature column's row count, minimum, maximum,
+mean and standard deviation, fitted in one streaming pass over a training
+table. normalize_data.py applies its minimum and maximum (min-max scaling),
+predict_with_model.py its mean and standard deviation (standard scaling), so
+scaling no longer depends on the batch being scaled and an input can be
+scaled chunk by chunk, or row by row, as it is read.
+
+The parameters used by the predictor are stored next to the model file as
+<model>.normalization.json. A training run (training_controller.py) writes
+them, fitted on its training rows, next to the model.keras it saves. Such a
+model standardizes its inputs itself, with a Normalization layer holding the
+same mean and variance, so the file marks them in_model and the predictor
+passes the features to the model unscaled instead of normalizing them twice.
+
+Usage:
+    python normalization.py fit <normalized_eeg_data.csv> [--output params.json]
+    python normalization.py info <params.json>
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+from eeg_io import DEFAULT_CHUNK_ROWS
+from feature_store import iter_table, table_header
+
+PARAMS_SUFFIX = ".normalization.json"
+PARAMS_FORMAT_VERSION = 1
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(script_dir, "cnn_lstm_model_efficient.h5")
+
+def params_path_for(model_path):
+    """Where the normalization parameters of a model file are kept"""
+    return os.path.splitext(model_path)[0] + PARAMS_SUFFIX
+
+class ColumnStatistics:
+    """
+    Running count, minimum, maximum, mean and variance of each column, updated a chunk at a time
+    NaN and infinite values are counted in non_finite and left out of the
+    other statistics, so count can differ between columns.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.count = self.non_finite = self.minimum = self.maximum = self.mean = self.m2 = None
+
+    def update(self, chunk):
+        """Fold a (rows, columns) chunk into the statistics"""
+        chunk = np.asarray(chunk, dtype=np.float64)
+        rows = len(chunk)
+        if not rows:
+            return self
+        finite = np.isfinite(chunk)
+        if finite.all():
+            count = np.full(chunk.shape[1], rows, dtype=np.int64)
+            minimum, maximum = chunk.min(axis=0), chunk.max(axis=0)
+            mean = chunk.mean(axis=0)
+            m2 = ((chunk - mean) ** 2).sum(axis=0)
+        else:
+            count = finite.sum(axis=0)
+            values = np.where(finite, chunk, np.nan)
+            minimum = np.where(count > 0, np.where(finite, chunk, np.inf).min(axis=0), np.nan)
+            maximum = np.where(count > 0, np.where(finite, chunk, -np.inf).max(axis=0), np.nan)
+            mean = np.where(finite, chunk, 0.0).sum(axis=0) / np.maximum(count, 1)
+            m2 = np.where(finite, (values - mean) ** 2, 0.0).sum(axis=0)
+        self._combine(rows, count, rows - count, minimum, maximum, mean, m2)
+        return self
+
+    def merge(self, other):
+        """Fold in the statistics of another ColumnStatistics, e.g. of a later part of the same table"""
+        if other.rows:
+            self._combine(other.rows, other.count, other.non_finite, other.minimum, other.maximum,
+                          other.mean, other.m2)
+        return self
+
+    def _combine(self, rows, count, non_finite, minimum, maximum, mean, m2):
+        if self.rows == 0:
+            self.count, self.non_finite = count.copy(), non_finite.copy()
+            self.minimum, self.maximum = minimum.copy(), maximum.copy()
+            self.mean, self.m2 = mean.copy(), m2.copy()
+        else:
+            # fmin/fmax skip the NaN of columns with no finite values yet
+            np.fmin(self.minimum, minimum, out=self.minimum)
+            np.fmax(self.maximum, maximum, out=self.maximum)
+            # Chan et al.: combine the two (count, mean, M2) triples, column by column
+            total = self.count + count
+            delta = mean - self.mean
+            safe_total = np.maximum(total, 1)
+            self.mean = self.mean + delta * (count / safe_total)
+            self.m2 = self.m2 + m2 + delta ** 2 * (self.count * count / safe_total)
+            self.count = total
+            self.non_finite = self.non_finite + non_finite
+        self.rows += rows
+
+    def std(self):
+        """Population standard deviation of each column (NaN for columns with no finite values)"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.sqrt(self.m2 / self.count)
+
+    def params(self, columns=None, source=None):
+        """NormalizationParams of everything folded in so far"""
+        if self.rows == 0:
+            raise ValueError("no rows to fit normalization parameters on")
+        columns = columns or [str(i) for i in range(len(self.mean))]
+        return NormalizationParams(columns, self.rows, self.minimum, self.maximum, self.mean, self.std(), source)
+
+class NormalizationParams:
+    """
+    Per-column minimum, maximum, mean and standard deviation of a training table
+    in_model means the model applies the standardization itself (see model_input).
+    """
+
+    def __init__(self, columns, rows, minimum, maximum, mean, std, source=None, in_model=False):
+        self.columns = list(columns)
+        self.rows = int(rows)
+        self.minimum = np.asarray(minimum, dtype=np.float64)
+        self.maximum = np.asarray(maximum, dtype=np.float64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.std = np.asarray(std, dtype=np.float64)
+        self.source = source or {}
+        self.in_model = bool(in_model)
+        span = self.maximum - self.minimum
+        self._constant = span == 0
+        # Avoid division by zero: constant columns are filled in after scaling
+        self._span = np.where(self._constant, 1.0, span)
+        # Columns with no spread keep their centred value, as in StandardScaler
+        self._scale = np.where(self.std == 0, 1.0, self.std)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def check_width(self, width):
+        if width != len(self):
+            raise ValueError(f"normalization parameters cover {len(self)} columns, the input has {width}")
+
+    def min_max(self, X):
+        """(X - min) / (max - min) per column, 0.5 for constant columns"""
+        self.check_width(X.shape[1])
+        scaled = (X - self.minimum) / self._span
+        scaled[:, self._constant] = 0.5
+        return scaled
+
+    def standardize(self, X):
+        """(X - mean) / std per column"""
+        self.check_width(X.shape[1])
+        return (X - self.mean) / self._scale
+
+    def model_input(self, X):
+        """X as the model takes it: standardized, or unchanged when the model standardizes it itself"""
+        if self.in_model:
+            self.check_width(X.shape[1])
+            return X
+        return self.standardize(X)
+
+    def to_dict(self):
+        return {
+            'format_version': PARAMS_FORMAT_VERSION,
+            'columns': self.columns,
+            'rows': self.rows,
+            'minimum': self.minimum.tolist(),
+            'maximum': self.maximum.tolist(),
+            'mean': self.mean.tolist(),
+            'std': self.std.tolist(),
+            'source': self.source,
+            'in_model': self.in_model
+        }
+
+    def fingerprint(self):
+        """Short hash of the parameter values, for cache keys"""
+        return hashlib.sha256(json.dumps(self.to_dict(), sort_keys=True).encode()).hexdigest()[:16]
+
+    def save(self, path):
+        """Write the parameters as JSON; floats are written exactly (shortest repr)"""
+        staging = path + ".tmp"
+        with open(staging, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(staging, path)
+        return path
+
+def load_params(path):
+    """Read a parameter file written by NormalizationParams.save"""
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('format_version') != PARAMS_FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported normalization parameter format {data.get('format_version')!r}")
+    return NormalizationParams(data['columns'], data['rows'], data['minimum'], data['maximum'],
+                               data['mean'], data['std'], data.get('source'), data.get('in_model', False))
+
+def fit_table(path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Fit parameters on the feature columns (all but the last) of a CSV file or feature store
+    One streaming pass; memory is one chunk plus a few values per column.
+    """
+    statistics = ColumnStatistics()
+    for chunk in iter_table(path, chunk_rows):
+        statistics.update(chunk[:, :-1])
+    header = table_header(path)
+    return statistics.params(header[:-1] if header else None, {'file': os.path.basename(path.rstrip(os.sep))})
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit or inspect normalization parameters")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fit_parser = subparsers.add_parser('fit', help="Fit parameters on a training table (label column last)")
+    fit_parser.add_argument('table', help="CSV file or feature store")
+    fit_parser.add_argument('--output', default=None,
+                            help=f"Parameter file (default {os.path.basename(params_path_for(DEFAULT_MODEL_PATH))} "
+                                 "next to the model)")
+    fit_parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+
+    info_parser = subparsers.add_parser('info', help="Print a parameter file's summary")
+    info_parser.add_argument('params')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'fit':
+            params = fit_table(args.table, args.chunk_rows)
+            path = params.save(args.output or params_path_for(DEFAULT_MODEL_PATH))
+            print(json.dumps({'success': True, 'params': path, 'rows': params.rows, 'columns': len(params)}))
+        else:
+            params = load_params(args.params)
+            print(json.dumps({'rows': params.rows, 'columns': len(params), 'source': params.source,
+                              'in_model': params.in_model,
+                              'constant_columns': int(np.count_nonzero(params.maximum == params.minimum)),
+                              'fingerprint': params.fingerprint()}, indent=2))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,141 +1,214 @@
 #!/usr/bin/env python3
 """
 Normalize the preprocessed EEG data to match the format of EE_PCA_1.csv
+Reads the binary feature store written by simple_preprocess.py when there is
+one (CSV otherwise) and writes the normalized table both as CSV and as a store.
+
+The input is streamed twice, a chunk of rows at a time: the first pass finds
+every feature column's minimum and maximum, the second scales each chunk and
+writes it out. Memory stays proportional to the number of columns plus one
+chunk, whatever the number of rows.
+
+The ranges can be saved with --fit-params and applied to other inputs with
+--params (see normalization.py); the input is then read once and scaled
+exactly as the table the parameters were fitted on.
+
+Every output gets a schema and statistics sidecar (see dataset_sidecar.py),
+from statistics gathered while it is written.
 """
 
 import os
 import csv
+import io
+import argparse
+import multiprocessing
 from datetime import datetime
 
+import numpy as np
+
+from dataset_sidecar import count_labels, label_column_of, load_sidecar, write_table_sidecar
+from eeg_io import DEFAULT_CHUNK_ROWS, read_header
+from feature_store import (STORE_SUFFIX, FeatureStoreWriter, is_feature_store, iter_table, load_feature_store,
+                           split_table_columns, store_path_for, table_header)
+from normalization import ColumnStatistics, fit_table, load_params
+
 def print_status(message):
     """Print status message with timestamp"""
     timestamp = datetime.now().strftime("%H:%M:%S")
     print(f"[{timestamp}] {message}")
 
-def read_csv_file(file_path):
-    """Read CSV file and return data as list of lists"""
-    data = []
-    try:
-        with open(file_path, 'r') as f:
-            csv_reader = csv.reader(f)
-            for row in csv_reader:
-                # Convert string values to float where possible
-                processed_row = []
-                for val in row:
-                    try:
-                        processed_row.append(float(val))
-                    except (ValueError, TypeError):
-                        processed_row.append(val)
-                data.append(processed_row)
-        return data
-    except Exception as e:
-        print(f"Error reading {file_path}: {e}")
-        return []
-
-def write_csv_file(file_path, data):
-    """Write data to CSV file"""
-    try:
-        with open(file_path, 'w', newline='') as f:
-            csv_writer = csv.writer(f)
-            csv_writer.writerows(data)
-        return True
-    except Exception as e:
-        print(f"Error writing {file_path}: {e}")
-        return False
+def normalize_chunk(chunk, params):
+    """Min-max normalize the feature columns of a chunk to [0, 1]; the target column is kept"""
+    normalized = np.empty_like(chunk)
+    normalized[:, :-1] = params.min_max(chunk[:, :-1])
+    normalized[:, -1] = chunk[:, -1]
+    return normalized
+
+def format_csv_rows(chunk):
+    """CSV text of a chunk's rows, as csv.writer writes Python floats"""
+    text = io.StringIO()
+    csv.writer(text).writerows(chunk.tolist())
+    return text.getvalue()
+
+def format_in_pool(chunks, pool, workers):
+    """Yield (chunk, CSV text) with the text formatted by the pool, keeping chunk order"""
+    pending = []
+    for chunk in chunks:
+        pending.append((chunk, pool.apply_async(format_csv_rows, (chunk,))))
+        # Bound the chunks in flight so memory stays O(workers x chunk)
+        if len(pending) > 2 * workers:
+            chunk, result = pending.pop(0)
+            yield chunk, result.get()
+    for chunk, result in pending:
+        yield chunk, result.get()
 
-def normalize_column(values):
-    """Min-max normalize a list of values to range [0, 1]"""
-    if not values:
-        return []
-    
-    min_val = min(values)
-    max_val = max(values)
-    
-    # Avoid division by zero
-    if max_val == min_val:
-        return [0.5] * len(values)
-    
-    return [(x - min_val) / (max_val - min_val) for x in values]
-
-def normalize_data(input_file, output_file, reference_file=None):
-    """Normalize data to match EE_PCA_1.csv format"""
+def normalize_data(input_file, output_file, reference_file=None, store_file=None,
+                   chunk_rows=DEFAULT_CHUNK_ROWS, workers=1, params_file=None, fit_params_file=None):
+    """
+    Normalize data to match EE_PCA_1.csv format
+    input_file and output_file may each be a CSV file or a feature store;
+    store_file, if given, receives a feature store copy of the output. With
+    more than one worker, chunks are formatted as CSV text in a process pool.
+    params_file applies saved normalization parameters instead of fitting
+    them on the input; fit_params_file saves the ones fitted on the input.
+    """
     print_status(f"Reading input file: {input_file}")
-    data = read_csv_file(input_file)
-    
-    if not data:
-        print_status("No data found in input file")
-        return False
-    
-    # Extract header and data rows
-    header = data[0]
-    rows = data[1:]
-    
-    if not rows:
-        print_status("No data rows found")
+    try:
+        header = table_header(input_file)
+        # Rows keep their order, so the input store's subject index still applies
+        subjects = load_feature_store(input_file).subjects() if is_feature_store(input_file) else None
+        if params_file:
+            params = load_params(params_file)
+            print_status(f"Using normalization parameters from {params_file} (fitted on {params.rows} rows)")
+        else:
+            # First pass: every feature column's range
+            params = fit_table(input_file, chunk_rows)
+            print_status(f"Found {params.rows} data rows")
+            if fit_params_file:
+                params.save(fit_params_file)
+                print_status(f"Saved normalization parameters to {fit_params_file}")
+    except (OSError, ValueError) as e:
+        print(f"Error reading {input_file}: {e}")
         return False
-    
-    print_status(f"Found {len(rows)} data rows")
-    
+
     # Check if we have a reference file to match the format
     if reference_file and os.path.exists(reference_file):
         print_status(f"Reading reference file: {reference_file}")
-        ref_data = read_csv_file(reference_file)
-        if ref_data and len(ref_data) > 1:
-            ref_header = ref_data[0]
+        ref_header = read_header(reference_file)
+        if ref_header:
             print_status(f"Using header format from reference file: {ref_header}")
             header = ref_header
-    
-    # Normalize each feature column
-    normalized_rows = []
-    num_features = len(rows[0]) - 1  # Exclude the target column
-    
-    print_status(f"Normalizing {num_features} feature columns...")
-    
-    # Extract columns for normalization
-    columns = []
-    for col_idx in range(num_features):
-        column = [row[col_idx] for row in rows]
-        columns.append(column)
-    
-    # Normalize each column
-    normalized_columns = []
-    for col_idx, column in enumerate(columns):
-        print_status(f"Normalizing column {col_idx+1}/{num_features}")
-        normalized_column = normalize_column(column)
-        normalized_columns.append(normalized_column)
-    
-    # Reconstruct rows from normalized columns
-    for row_idx in range(len(rows)):
-        normalized_row = [normalized_columns[col_idx][row_idx] for col_idx in range(num_features)]
-        # Add the target column (disorder class)
-        normalized_row.append(rows[row_idx][-1])
-        normalized_rows.append(normalized_row)
-    
-    # Create output data with header
-    output_data = [header] + normalized_rows
-    
-    # Write normalized data to output file
-    print_status(f"Writing normalized data to {output_file}")
-    if write_csv_file(output_file, output_data):
-        print_status(f"Successfully created {output_file}")
-        return True
-    else:
-        print_status(f"Failed to write {output_file}")
+
+    num_features = len(params)
+    constant = int(np.count_nonzero(params.maximum == params.minimum))
+    print_status(f"Normalizing {num_features} feature columns" + (f" ({constant} constant)" if constant else "") + "...")
+
+    csv_path, store_path = None, None
+    for path in (output_file, store_file):
+        if path is not None and (path.endswith(STORE_SUFFIX) or is_feature_store(path)):
+            store_path = path
+        elif path is not None:
+            csv_path = path
+
+    store_writer = None
+    pool = None
+    try:
+        if store_path is not None:
+            columns = header or [str(i) for i in range(num_features + 1)]
+            store_writer = FeatureStoreWriter(store_path, *split_table_columns(columns))
+            if subjects:
+                store_writer.extra['subjects'] = subjects
+
+        # Second pass: scale each chunk and write it to every output
+        csv_out = open(csv_path, 'w', newline='') if csv_path is not None else None
+        try:
+            if csv_out is not None and header:
+                csv.writer(csv_out).writerow(header)
+            print_status("Writing normalized data to " + " and ".join(p for p in (csv_path, store_path) if p))
+
+            normalized_chunks = (normalize_chunk(chunk, params) for chunk in iter_table(input_file, chunk_rows))
+            if csv_out is not None and workers > 1:
+                pool = multiprocessing.Pool(workers)
+                chunks = format_in_pool(normalized_chunks, pool, workers)
+            else:
+                chunks = ((chunk, format_csv_rows(chunk) if csv_out is not None else None)
+                          for chunk in normalized_chunks)
+
+            statistics = ColumnStatistics()
+            label_counts = {}
+            for chunk, text in chunks:
+                statistics.update(chunk)
+                count_labels(label_counts, chunk[:, -1])
+                if csv_out is not None:
+                    csv_out.write(text)
+                if store_writer is not None:
+                    store_writer.append_table(chunk)
+        finally:
+            if csv_out is not None:
+                csv_out.close()
+
+        if store_writer is not None:
+            store_writer.close()
+            store_writer = None
+    except (OSError, ValueError) as e:
+        print(f"Error writing normalized data: {e}")
+        if store_writer is not None:
+            store_writer.discard()
         return False
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    # Windows keep their spacing and recordings their spectrum; take them from the input's sidecar if it has one
+    input_sidecar = load_sidecar(input_file) or {}
+    recording = input_sidecar.get('recording', {})
+    for path in (csv_path, store_path):
+        if path is not None:
+            columns = table_header(path)
+            write_table_sidecar(path, statistics, label_counts, columns, label_column_of(path, columns),
+                                recording.get('step_size'), [entry['rows'] for entry in subjects or []] or None,
+                                input_sidecar.get('spectral'))
+            print_status(f"Successfully created {path}")
+    return True
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Min-max normalize the preprocessed features")
+    parser.add_argument('--input', default=None,
+                        help="CSV file or feature store (default simple_preprocessed_eeg.features if present, "
+                             "else simple_preprocessed_eeg.csv)")
+    parser.add_argument('--output', default="normalized_eeg_data.csv")
+    parser.add_argument('--reference', default="EE_PCA_1.csv")
+    parser.add_argument('--format', choices=('csv', 'store', 'both'), default='both',
+                        help="Write --output as CSV, as a feature store next to it, or both (default)")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS,
+                        help=f"Rows per chunk in both passes (default {DEFAULT_CHUNK_ROWS})")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Processes formatting CSV output (0 = one per CPU core; default 1)")
+    parser.add_argument('--params', default=None,
+                        help="Apply saved normalization parameters instead of fitting them on the input (one pass)")
+    parser.add_argument('--fit-params', default=None,
+                        help="Save the parameters fitted on the input to this file")
+    args = parser.parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+
     print_status("Starting data normalization")
-    
-    input_file = "simple_preprocessed_eeg.csv"
-    output_file = "normalized_eeg_data.csv"
-    reference_file = "EE_PCA_1.csv"
-    
+
+    input_file = args.input
+    if input_file is None:
+        input_file = "simple_preprocessed_eeg.csv"
+        if os.path.isdir(store_path_for(input_file)):
+            input_file = store_path_for(input_file)
+    output_file = args.output if args.format != 'store' else None
+    store_file = store_path_for(args.output) if args.format != 'csv' else None
+
     if not os.path.exists(input_file):
         print_status(f"Error: Input file '{input_file}' not found!")
         return
-    
-    normalize_data(input_file, output_file, reference_file)
+
+    normalize_data(input_file, output_file or store_file, args.reference,
+                   store_file if output_file else None, args.chunk_rows, workers, args.params, args.fit_params)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -2,24 +2,84 @@
 """
 EEG Prediction Script using Pre-trained CNN-LSTM Model
 This script loads the existing cnn_lstm_model_efficient.h5 model and makes predictions
+
+Usage:
+    python predict_with_model.py <input_file_path>
+    python predict_with_model.py --chunk-rows 50000 <input_file_path>
+    python predict_with_model.py --shards 4 <input_file_path>
+    python predict_with_model.py --backend tflite <input_file_path>
+    python predict_with_model.py --model training_output/model.keras <input_file_path>
+    python predict_with_model.py --worker
+
+In worker mode the model is loaded once and kept warm. Jobs are read from stdin
+as JSON lines ({"id": ..., "input_file": ...}) and each result document is
+written to stdout as a single JSON line ({"id": ..., "result": {...}}).
+Requests arriving within --batch-window-ms of each other are predicted in one
+batch; {"id": ..., "op": "stats"} returns the batch-size and queue-wait counters.
+
+With --progress, one-shot runs write {"event": "progress", "progress": {...}}
+lines to stderr; worker requests with "progress": true receive the same events
+as {"id": ..., "event": "progress", ...} lines ahead of their result.
+
+Runs are cancelled cooperatively between batches and chunks: SIGTERM for a
+one-shot run, {"id": ..., "op": "cancel", "target": <request id>} in worker
+mode. A cancelled run answers {"success": false, "cancelled": true, ...} with
+the time spent in each stage it reached.
+
+Result documents are cached on disk keyed by the input file's content, the
+model file and the preprocessing settings; --no-cache always reruns the model.
+
+--model (or EEG_MODEL_PATH) selects another model file than
+cnn_lstm_model_efficient.h5, e.g. the model.keras of a training run.
+
+Features are standardized with the training set's mean and standard deviation,
+saved next to the model as <model>.normalization.json (see normalization.py),
+so every chunk is scaled as it is read. A model saved by a training run comes
+with that file; it standardizes its inputs itself and the file says so, so its
+features are passed on unscaled. Without the file each input is standardized
+on its own statistics, which with --chunk-rows takes an extra pass over the file.
+
+Every result carries a "timings" block with the seconds spent in each stage
+(import, cache_lookup, model_load, csv_parse, scaling, predict, statistics,
+json_encode), the total and the peak resident memory. --profile REPORT also
+writes a cProfile/tracemalloc report of the run.
 """
 
+import time
+PROCESS_STARTED = time.perf_counter()  # start of the 'import' timing
+
 import sys
 import json
+import queue
+import signal
+import argparse
+import contextlib
+import threading
+import multiprocessing
 import numpy as np
-import pandas as pd
-import tensorflow as tf
 import os
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import classification_report
+from prediction_batcher import MicroBatcher
+from prediction_progress import PROGRESS_BATCH_ROWS, CancelToken, PredictionCancelled, ProgressReporter
+from prediction_profiling import peak_rss_bytes, profiled
+from prediction_stats import PredictionAccumulator
+from dataset_sidecar import content_hash, load_sidecar, scaling_params
+from feature_store import FeatureStore, is_feature_store, load_feature_store
+from model_artifacts import BACKENDS, load_inference_model
+from normalization import load_params, params_path_for
+from result_cache import DEFAULT_MAX_AGE_SECONDS, DEFAULT_MAX_BYTES, ResultCache
+# pandas, scikit-learn and TensorFlow are imported where they are used so a
+# result cache hit returns without paying for them
 import warnings
 warnings.filterwarnings('ignore')
 
 # Configuration
 # Get the absolute path to the directory where this script is located
 script_dir = os.path.dirname(os.path.abspath(__file__))
-# Construct the absolute path to the model file
-MODEL_PATH = os.path.join(script_dir, "cnn_lstm_model_efficient.h5")
+# Construct the absolute path to the model file; EEG_MODEL_PATH or --model selects another one,
+# e.g. the model.keras of a training run, whose normalization parameters are saved next to it
+DEFAULT_MODEL_PATH = os.path.join(script_dir, "cnn_lstm_model_efficient.h5")
+MODEL_PATH = os.environ.get('EEG_MODEL_PATH') or DEFAULT_MODEL_PATH
+NORMALIZATION_PATH = params_path_for(MODEL_PATH)
 DATA_COLUMNS = 54  # Expected number of feature columns
 
 # Disorder mapping (adjust based on your training data)
@@ -37,59 +97,196 @@ def load_model():
         if not os.path.exists(MODEL_PATH):
             raise FileNotFoundError(f"Model file {MODEL_PATH} not found")
         
+        import tensorflow as tf
         model = tf.keras.models.load_model(MODEL_PATH)
         return model
     except Exception as e:
         raise Exception(f"Failed to load model: {str(e)}")
 
-def preprocess_data(file_path):
+def load_predictor(backend='keras'):
+    """Load the model in the requested inference form (see model_artifacts.BACKENDS)"""
+    try:
+        if not os.path.exists(MODEL_PATH):
+            raise FileNotFoundError(f"Model file {MODEL_PATH} not found")
+        
+        return load_inference_model(backend, MODEL_PATH, load_model)
+    except Exception as e:
+        raise Exception(f"Failed to load {backend} model: {str(e)}")
+
+_normalization = {}
+
+def set_model_path(model_path):
+    """Use another model file, with the normalization parameters saved next to it"""
+    global MODEL_PATH, NORMALIZATION_PATH
+    MODEL_PATH = model_path
+    NORMALIZATION_PATH = params_path_for(model_path)
+    _normalization.clear()
+
+def load_normalization():
+    """The model's saved normalization parameters, or None; reloaded only when the file changes"""
+    try:
+        mtime = os.path.getmtime(NORMALIZATION_PATH)
+    except OSError:
+        return None
+    if _normalization.get('mtime') != mtime:
+        _normalization.update(mtime=mtime, params=load_params(NORMALIZATION_PATH))
+    return _normalization['params']
+
+def read_input(file_path, chunk_rows=None):
+    """
+    Read the input file as a DataFrame, or as an iterator of DataFrames when chunk_rows is set
+    A feature store (see feature_store.py) is memory-mapped instead of parsed
+    and returned as a FeatureStore, or an iterator of FeatureStore row ranges.
+    """
+    if is_feature_store(file_path):
+        store = load_feature_store(file_path)
+        return store if chunk_rows is None else store.iter_chunks(chunk_rows)
+    
+    import pandas as pd
+    # Try to read as CSV
+    if file_path.endswith('.csv'):
+        return pd.read_csv(file_path, chunksize=chunk_rows)
+    # For other formats, try to read as space-separated
+    return pd.read_csv(file_path, delimiter='\s+', header=None, chunksize=chunk_rows)
+
+def split_features(data):
+    """Split input rows into the feature matrix and the optional target column"""
+    if isinstance(data, FeatureStore):
+        return split_store_features(data)
+    
+    # Handle different data formats
+    if data.shape[1] == DATA_COLUMNS + 1:  # Has target column
+        X = data.iloc[:, :-1].values
+        y_true = data.iloc[:, -1].values if data.shape[0] > 0 else None
+    elif data.shape[1] == DATA_COLUMNS:  # No target column
+        X = data.values
+        y_true = None
+    else:
+        # If different number of columns, take first DATA_COLUMNS
+        X = data.iloc[:, :DATA_COLUMNS].values
+        y_true = None
+    
+    # Handle missing values
+    X = np.nan_to_num(X, nan=0.0, posinf=0.0, neginf=0.0)
+    
+    return X, y_true
+
+def split_store_features(store):
+    """split_features for a feature store: the label column is stored separately"""
+    if store.features.shape[1] == DATA_COLUMNS:
+        X = store.features
+        y_true = store.labels if store.labels is not None and len(store) > 0 else None
+    elif store.features.shape[1] == DATA_COLUMNS + 1 and store.labels is None:
+        # Imported without a named label column: the last column is the target, as for CSV
+        X = store.features[:, :-1]
+        y_true = store.features[:, -1] if len(store) > 0 else None
+    else:
+        # If different number of columns, take first DATA_COLUMNS
+        X = store.features[:, :DATA_COLUMNS]
+        y_true = None
+    
+    # Handle missing values
+    X = np.nan_to_num(X, nan=0.0, posinf=0.0, neginf=0.0)
+    
+    return X, y_true
+
+def reshape_for_model(X_scaled):
+    """Reshape for CNN-LSTM (samples, timesteps, features)"""
+    # If the model expects 3D input, reshape accordingly
+    if len(X_scaled.shape) == 2:
+        X_scaled = X_scaled.reshape(X_scaled.shape[0], 1, X_scaled.shape[1])
+    return X_scaled
+
+def preprocess_data(file_path, progress=None):
     """Preprocess the input EEG data"""
+    progress = progress or ProgressReporter()
     try:
         # Read the CSV file
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"Input file {file_path} not found")
         
-        # Try to read as CSV
-        if file_path.endswith('.csv'):
-            data = pd.read_csv(file_path)
-        else:
-            # For other formats, try to read as space-separated
-            data = pd.read_csv(file_path, delimiter='\s+', header=None)
+        progress.update('csv_parse')
+        data = read_input(file_path)
+        X, y_true = split_features(data)
+        progress.update('csv_parse', 1.0, rows_total=len(X))
         
-        # Handle different data formats
-        if data.shape[1] == DATA_COLUMNS + 1:  # Has target column
-            X = data.iloc[:, :-1].values
-            y_true = data.iloc[:, -1].values if data.shape[0] > 0 else None
-        elif data.shape[1] == DATA_COLUMNS:  # No target column
-            X = data.values
-            y_true = None
+        # Normalize the data
+        progress.update('scaling')
+        params = load_normalization()
+        if params is not None:
+            X_scaled = params.model_input(X)
         else:
-            # If different number of columns, take first DATA_COLUMNS
-            X = data.iloc[:, :DATA_COLUMNS].values
-            y_true = None
+            from sklearn.preprocessing import StandardScaler
+            scaler = StandardScaler()
+            X_scaled = scaler.fit_transform(X)
+        progress.update('scaling', 1.0, rows_total=len(X))
         
-        # Handle missing values
-        X = np.nan_to_num(X, nan=0.0, posinf=0.0, neginf=0.0)
+        return reshape_for_model(X_scaled), y_true, data.shape[0]
+    
+    except Exception as e:
+        raise Exception(f"Failed to preprocess data: {str(e)}")
+
+def sidecar_scaling(file_path):
+    """
+    (NormalizationParams, rows) of the feature columns from the input's sidecar, or (None, None)
+    Only for inputs read with their header row (CSV files with one, feature
+    stores), so the sidecar's rows are the rows read here.
+    """
+    sidecar = _input_sidecar(file_path)
+    if sidecar is None:
+        return None, None
+    params = scaling_params(sidecar, DATA_COLUMNS)
+    return (params, sidecar['rows']) if params is not None else (None, None)
+
+def sidecar_row_count(file_path):
+    """Row count of the input from its sidecar, or None when it has no matching one"""
+    sidecar = _input_sidecar(file_path)
+    return sidecar['rows'] if sidecar is not None else None
+
+def _input_sidecar(file_path):
+    """The input's sidecar, if its rows are the rows read here (see sidecar_scaling)"""
+    if not (is_feature_store(file_path) or file_path.endswith('.csv')):
+        return None
+    sidecar = load_sidecar(file_path)
+    if sidecar is None or not sidecar.get('columns'):
+        return None
+    return sidecar
+
+def fit_scaler_streaming(file_path, chunk_rows, progress=None):
+    """Fit the StandardScaler over the whole file one chunk at a time"""
+    progress = progress or ProgressReporter()
+    try:
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"Input file {file_path} not found")
         
-        # Normalize the data
+        from sklearn.preprocessing import StandardScaler
         scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-        
-        # Reshape for CNN-LSTM (samples, timesteps, features)
-        # If the model expects 3D input, reshape accordingly
-        if len(X_scaled.shape) == 2:
-            X_scaled = X_scaled.reshape(X_scaled.shape[0], 1, X_scaled.shape[1])
-        
-        return X_scaled, y_true, data.shape[0]
+        for chunk in read_input(file_path, chunk_rows):
+            progress.checkpoint()
+            X, _ = split_features(chunk)
+            if len(X) > 0:
+                scaler.partial_fit(X)
+        return scaler
     
     except Exception as e:
         raise Exception(f"Failed to preprocess data: {str(e)}")
 
-def make_predictions(model, X):
+def make_predictions(model, X, progress=None):
     """Make predictions using the loaded model"""
+    progress = progress or ProgressReporter()
     try:
-        # Get prediction probabilities
-        predictions_proba = model.predict(X, verbose=0)
+        # Get prediction probabilities, batch by batch when progress is reported or the run can be cancelled
+        progress.update('predict', 0.0, 0, len(X))
+        if progress.enabled and len(X) > PROGRESS_BATCH_ROWS:
+            batches = []
+            for start in range(0, len(X), PROGRESS_BATCH_ROWS):
+                batches.append(model.predict(X[start:start + PROGRESS_BATCH_ROWS], verbose=0))
+                rows_done = min(start + PROGRESS_BATCH_ROWS, len(X))
+                progress.update('predict', rows_done / len(X), rows_done, len(X))
+            predictions_proba = np.concatenate(batches)
+        else:
+            predictions_proba = model.predict(X, verbose=0)
+            progress.update('predict', 1.0, len(X), len(X))
         
         # Get predicted classes
         predictions = np.argmax(predictions_proba, axis=1)
@@ -105,118 +302,126 @@ def make_predictions(model, X):
 def calculate_statistics(predictions, predictions_proba, confidence_scores, y_true=None):
     """Calculate statistical analysis of predictions"""
     try:
-        stats = {}
-        
-        # Basic statistics
-        stats['total_samples'] = len(predictions)
-        stats['unique_predictions'] = len(np.unique(predictions))
+        accumulator = PredictionAccumulator().update(predictions, predictions_proba, confidence_scores, y_true)
+    except Exception as e:
+        return {'error': f"Failed to calculate statistics: {str(e)}"}
+    return calculate_aggregate_statistics(accumulator)
+
+def get_risk_level(overall_confidence):
+    """Determine risk level from the mean confidence"""
+    if overall_confidence >= 0.8:
+        return "High"
+    elif overall_confidence >= 0.6:
+        return "Medium"
+    return "Low"
+
+def describe_prediction(index, pred, conf, probabilities):
+    """Detailed entry for a single predicted sample"""
+    return {
+        'sample_index': index,
+        'predicted_disorder': DISORDER_MAPPING.get(int(pred), f"Unknown_{pred}"),
+        'confidence': float(conf),
+        'class_probabilities': {
+            DISORDER_MAPPING.get(j, f"Unknown_{j}"): float(probabilities[j])
+            for j in range(len(probabilities))
+        }
+    }
+
+def build_result_document(most_common_idx, overall_confidence, sample_count, abnormal_segments,
+                          stats, detailed_predictions):
+    """Assemble the result document returned to the backend"""
+    return {
+        'success': True,
+        'primary_diagnosis': DISORDER_MAPPING.get(int(most_common_idx), f"Unknown_{most_common_idx}"),
+        'confidence': overall_confidence * 100,  # Convert to percentage
+        'risk_level': get_risk_level(overall_confidence),
+        'total_samples': sample_count,
+        'abnormal_segments': abnormal_segments,
+        'statistics': stats,
+        'detailed_predictions': detailed_predictions,
+        'model_info': {
+            'model_path': MODEL_PATH,
+            'model_type': 'CNN-LSTM',
+            'version': '1.0'
+        }
+    }
+
+def format_results(predictions, predictions_proba, confidence_scores, stats, sample_count):
+    """Format results for JSON output"""
+    try:
+        accumulator = PredictionAccumulator().update(predictions, predictions_proba, confidence_scores)
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f"Failed to format results: {str(e)}"
+        }
+    return format_aggregate_results(accumulator, stats, sample_count)
+
+def calculate_aggregate_statistics(accumulator):
+    """Build the statistics block from a PredictionAccumulator"""
+    try:
+        if accumulator.label_error:
+            raise ValueError(accumulator.label_error)
         
-        # Confidence statistics
-        stats['avg_confidence'] = float(np.mean(confidence_scores))
-        stats['min_confidence'] = float(np.min(confidence_scores))
-        stats['max_confidence'] = float(np.max(confidence_scores))
-        stats['std_confidence'] = float(np.std(confidence_scores))
+        total = accumulator.count
+        stats = {
+            'total_samples': total,
+            'unique_predictions': len(accumulator.class_distribution()),
+            'avg_confidence': accumulator.confidence_mean,
+            'min_confidence': accumulator.confidence_min,
+            'max_confidence': accumulator.confidence_max,
+            'std_confidence': accumulator.confidence_std
+        }
         
         # Class distribution
-        unique, counts = np.unique(predictions, return_counts=True)
-        class_distribution = {}
-        for class_idx, count in zip(unique, counts):
-            disorder_name = DISORDER_MAPPING.get(int(class_idx), f"Unknown_{class_idx}")
-            class_distribution[disorder_name] = {
-                'count': int(count),
-                'percentage': float(count / len(predictions) * 100)
+        stats['class_distribution'] = {
+            DISORDER_MAPPING.get(class_idx, f"Unknown_{class_idx}"): {
+                'count': count,
+                'percentage': float(count / total * 100)
             }
-        stats['class_distribution'] = class_distribution
+            for class_idx, count in accumulator.class_distribution().items()
+        }
         
         # Risk assessment
-        high_confidence_threshold = 0.8
-        medium_confidence_threshold = 0.6
-        
-        high_conf_count = np.sum(confidence_scores >= high_confidence_threshold)
-        medium_conf_count = np.sum((confidence_scores >= medium_confidence_threshold) & 
-                                 (confidence_scores < high_confidence_threshold))
-        low_conf_count = np.sum(confidence_scores < medium_confidence_threshold)
-        
+        high_conf_count, medium_conf_count, low_conf_count = accumulator.confidence_buckets()
         stats['confidence_distribution'] = {
             'high_confidence': {
-                'count': int(high_conf_count),
-                'percentage': float(high_conf_count / len(predictions) * 100)
+                'count': high_conf_count,
+                'percentage': float(high_conf_count / total * 100)
             },
             'medium_confidence': {
-                'count': int(medium_conf_count),
-                'percentage': float(medium_conf_count / len(predictions) * 100)
+                'count': medium_conf_count,
+                'percentage': float(medium_conf_count / total * 100)
             },
             'low_confidence': {
-                'count': int(low_conf_count),
-                'percentage': float(low_conf_count / len(predictions) * 100)
+                'count': low_conf_count,
+                'percentage': float(low_conf_count / total * 100)
             }
         }
         
-        # If ground truth is available, calculate accuracy metrics
-        if y_true is not None and len(y_true) > 0:
-            accuracy = np.mean(predictions == y_true)
-            stats['accuracy'] = float(accuracy)
-            
-            # Generate classification report
-            report = classification_report(y_true, predictions, output_dict=True)
-            stats['classification_report'] = report
+        # If ground truth is available, derive accuracy metrics from the confusion matrix
+        if accumulator.has_labels:
+            stats['accuracy'] = float(accumulator.accuracy())
+            stats['classification_report'] = accumulator.classification_report()
         
         return stats
     
     except Exception as e:
         return {'error': f"Failed to calculate statistics: {str(e)}"}
 
-def format_results(predictions, predictions_proba, confidence_scores, stats, sample_count):
-    """Format results for JSON output"""
+def format_aggregate_results(accumulator, stats, sample_count):
+    """Format the result document from a PredictionAccumulator"""
     try:
-        # Get the most common prediction
-        unique, counts = np.unique(predictions, return_counts=True)
-        most_common_idx = unique[np.argmax(counts)]
-        primary_diagnosis = DISORDER_MAPPING.get(int(most_common_idx), f"Unknown_{most_common_idx}")
-        
-        # Calculate overall confidence
-        overall_confidence = float(np.mean(confidence_scores))
-        
-        # Determine risk level
-        if overall_confidence >= 0.8:
-            risk_level = "High"
-        elif overall_confidence >= 0.6:
-            risk_level = "Medium"
-        else:
-            risk_level = "Low"
-        
-        # Prepare detailed results
-        detailed_predictions = []
-        for i, (pred, conf) in enumerate(zip(predictions[:10], confidence_scores[:10])):  # Show first 10
-            disorder_name = DISORDER_MAPPING.get(int(pred), f"Unknown_{pred}")
-            detailed_predictions.append({
-                'sample_index': i,
-                'predicted_disorder': disorder_name,
-                'confidence': float(conf),
-                'class_probabilities': {
-                    DISORDER_MAPPING.get(j, f"Unknown_{j}"): float(predictions_proba[i][j])
-                    for j in range(len(predictions_proba[i]))
-                }
-            })
-        
-        # Format final result
-        result = {
-            'success': True,
-            'primary_diagnosis': primary_diagnosis,
-            'confidence': overall_confidence * 100,  # Convert to percentage
-            'risk_level': risk_level,
-            'total_samples': sample_count,
-            'abnormal_segments': int(np.sum(predictions != 0)),  # Assuming 0 is normal
-            'statistics': stats,
-            'detailed_predictions': detailed_predictions,
-            'model_info': {
-                'model_path': MODEL_PATH,
-                'model_type': 'CNN-LSTM',
-                'version': '1.0'
-            }
-        }
+        detailed_predictions = [
+            describe_prediction(i, pred, conf, probabilities)
+            for i, (pred, conf, probabilities) in enumerate(zip(accumulator.head_predictions,
+                                                                accumulator.head_confidence,
+                                                                accumulator.head_probabilities))
+        ]
         
-        return result
+        return build_result_document(accumulator.most_common_class(), accumulator.confidence_mean,
+                                     sample_count, accumulator.abnormal_segments,  # Assuming 0 is normal
+                                     stats, detailed_predictions)
     
     except Exception as e:
         return {
@@ -224,9 +429,435 @@ def format_results(predictions, predictions_proba, confidence_scores, stats, sam
             'error': f"Failed to format results: {str(e)}"
         }
 
+def result_cache_config(backend, chunk_rows=None):
+    """Settings that change the result document and therefore belong in the result cache key"""
+    params = load_normalization()
+    return {
+        'backend': backend,
+        'scaler': 'standard' if params is None else f"params:{params.fingerprint()}",
+        'data_columns': DATA_COLUMNS,
+        'chunk_rows': chunk_rows,
+        'disorder_mapping': DISORDER_MAPPING
+    }
+
+def cache_lookup(cache, input_file_path, config):
+    """Return (key, cached result) for an input file; key is None when the file cannot be cached"""
+    if cache is None or not os.path.exists(input_file_path):
+        return None, None
+    # A matching sidecar already holds the input's hash
+    key = cache.key(input_file_path, MODEL_PATH, config, content_hash(input_file_path))
+    return key, cache.get(key)
+
+def cache_store(cache, key, result):
+    """Keep successful results only, so a failed run is retried next time"""
+    if key is not None and result.get('success') and 'error' not in result.get('statistics', {}):
+        try:
+            cache.put(key, result)
+        except OSError:
+            pass  # the cache is an optimization; a full or read-only disk must not fail the job
+
+def collect_timings(progress):
+    """Seconds spent in each stage the run reached, the total, and peak resident memory"""
+    timings = progress.timings()
+    timings['peak_rss_bytes'] = peak_rss_bytes()
+    return timings
+
+def append_json_field(document, key, value):
+    """
+    Add key: value as the last field of an object encoded with json.dumps(indent=2)
+    Gives the same text as encoding the object with the field, without
+    encoding the rest of the document again.
+    """
+    field = f'"{key}": ' + json.dumps(value, indent=2).replace('\n', '\n  ')
+    if document == '{}':
+        return '{\n  ' + field + '\n}'
+    return document[:-2] + ',\n  ' + field + '\n}'
+
+def cancelled_result(progress):
+    """Result document for a cancelled run, with the time spent in each stage it reached"""
+    return {
+        'success': False,
+        'cancelled': True,
+        'error': 'Prediction cancelled',
+        'timings': collect_timings(progress)
+    }
+
+def run_prediction(model, input_file_path, progress=None):
+    """Run the full prediction pipeline for one input file and return the result document"""
+    progress = progress or ProgressReporter()
+    
+    # Preprocess the data
+    X, y_true, sample_count = preprocess_data(input_file_path, progress)
+    
+    # Make predictions
+    predictions, predictions_proba, confidence_scores = make_predictions(model, X, progress)
+    
+    # Calculate statistics and format results from a single pass over the predictions
+    progress.update('statistics')
+    accumulator = PredictionAccumulator().update(predictions, predictions_proba, confidence_scores, y_true)
+    stats = calculate_aggregate_statistics(accumulator)
+    result = format_aggregate_results(accumulator, stats, sample_count)
+    progress.update('statistics', 1.0)
+    return result
+
+def run_streaming_prediction(model, input_file_path, chunk_rows, progress=None):
+    """Predict in fixed-size row chunks so peak memory is O(chunk) rather than O(file)"""
+    progress = progress or ProgressReporter()
+    
+    params = load_normalization()
+    sidecar_params, sidecar_rows = sidecar_scaling(input_file_path) if params is None else (None, None)
+    if params is not None:
+        # Saved parameters: chunks are scaled as they are read, in a single pass
+        scale = params.model_input
+        if is_feature_store(input_file_path):
+            rows_total = len(load_feature_store(input_file_path))
+        else:
+            rows_total = sidecar_row_count(input_file_path)
+    elif sidecar_params is not None:
+        # The input's own statistics are already in its sidecar: no first pass either
+        scale = sidecar_params.standardize
+        rows_total = sidecar_rows
+    else:
+        # First pass: scaling statistics for the whole file
+        progress.update('csv_parse')
+        scaler = fit_scaler_streaming(input_file_path, chunk_rows, progress)
+        scale = scaler.transform
+        rows_total = int(np.max(scaler.n_samples_seen_)) if hasattr(scaler, 'n_samples_seen_') else 0
+    progress.update('scaling', 1.0, rows_total=rows_total)
+    
+    # Scale, predict and fold each chunk into the running aggregates
+    accumulator = PredictionAccumulator()
+    sample_count = 0
+    progress.update('predict', 0.0, 0, rows_total)
+    for chunk in read_input(input_file_path, chunk_rows):
+        X, y_true = split_features(chunk)
+        sample_count += chunk.shape[0]
+        if len(X) == 0:
+            continue
+        
+        X_scaled = reshape_for_model(scale(X))
+        predictions, predictions_proba, confidence_scores = make_predictions(model, X_scaled)
+        accumulator.update(predictions, predictions_proba, confidence_scores, y_true)
+        progress.update('predict', sample_count / rows_total if rows_total else 0.0, sample_count, rows_total)
+    
+    progress.update('statistics')
+    stats = calculate_aggregate_statistics(accumulator)
+    result = format_aggregate_results(accumulator, stats, sample_count)
+    progress.update('statistics', 1.0)
+    return result
+
+# --- Sharded inference ---
+
+_shard_model = None
+
+def _init_shard_worker(threads, backend, model_path):
+    """Pool initializer: pin TensorFlow thread counts, then load this worker's model"""
+    global _shard_model
+    set_model_path(model_path)
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    _shard_model = load_predictor(backend)
+
+def _predict_shard(X, y_true):
+    """Predict one shard and return its PredictionAccumulator"""
+    predictions, predictions_proba, confidence_scores = make_predictions(_shard_model, X)
+    return PredictionAccumulator().update(predictions, predictions_proba, confidence_scores, y_true)
+
+class ShardedPredictor:
+    """
+    Process pool in which every worker holds its own loaded model
+    Rows are split into contiguous shards, one per worker, and the per-shard
+    accumulators are merged back in row order.
+    """
+
+    def __init__(self, workers, threads_per_worker=None, backend='keras'):
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        self._pool = multiprocessing.get_context('spawn').Pool(
+            workers, initializer=_init_shard_worker, initargs=(self.threads_per_worker, backend, MODEL_PATH))
+
+    def predict(self, X, y_true=None, cancel=None):
+        """Predict every row of X across the pool and return the merged accumulator"""
+        bounds = np.linspace(0, len(X), self.workers + 1).astype(int)
+        shards = [
+            (X[start:end], y_true[start:end] if y_true is not None else None)
+            for start, end in zip(bounds[:-1], bounds[1:]) if end > start
+        ]
+        
+        pending = self._pool.starmap_async(_predict_shard, shards)
+        while not pending.ready():
+            pending.wait(0.1)
+            if cancel is not None and cancel.is_set():
+                # Stop the shard workers mid-batch instead of letting them finish
+                self._pool.terminate()
+                raise PredictionCancelled()
+        
+        accumulator = PredictionAccumulator()
+        for shard_accumulator in pending.get():
+            accumulator.merge(shard_accumulator)
+        return accumulator
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def run_sharded_prediction(input_file_path, workers, threads_per_worker=None, backend='keras', progress=None):
+    """Run the prediction pipeline with inference spread across a process pool"""
+    progress = progress or ProgressReporter()
+    X, y_true, sample_count = preprocess_data(input_file_path, progress)
+    
+    try:
+        # Shard workers load their models here; that time is reported as part of predict
+        with ShardedPredictor(workers, threads_per_worker, backend) as predictor:
+            progress.update('predict', 0.0, 0, len(X))
+            accumulator = predictor.predict(X, y_true, progress.cancel)
+            progress.update('predict', 1.0, len(X), len(X))
+    except Exception as e:
+        raise Exception(f"Failed to make predictions: {str(e)}")
+    
+    progress.update('statistics')
+    stats = calculate_aggregate_statistics(accumulator)
+    result = format_aggregate_results(accumulator, stats, sample_count)
+    progress.update('statistics', 1.0)
+    return result
+
+def run_worker(model, batch_window_ms=20, batch_max_rows=8192, cache=None, backend='keras', preprocess_threads=4,
+               batch_fill_wait_ms=250):
+    """
+    Serve prediction jobs from stdin as JSON lines until stdin is closed
+    Up to preprocess_threads requests are parsed and scaled at once, so
+    requests that arrive together reach the micro-batcher together.
+    """
+    # Keep stray prints from TensorFlow or the pipeline out of the protocol stream
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+    send_lock = threading.Lock()
+    
+    def send(message):
+        line = json.dumps(message) + "\n"
+        with send_lock:
+            protocol_out.write(line)
+            protocol_out.flush()
+    
+    # Cancel tokens of requests that have not been answered yet
+    tokens = {}
+    tokens_lock = threading.Lock()
+    
+    def respond(request_id, result):
+        with tokens_lock:
+            tokens.pop(request_id, None)
+        send({'id': request_id, 'result': result})
+    
+    # Requests that arrive within the batching window share one model.predict call
+    batcher = MicroBatcher(lambda X: make_predictions(model, X),
+                           max_wait_ms=batch_window_ms, max_rows=batch_max_rows,
+                           max_fill_wait_ms=batch_fill_wait_ms).start()
+    
+    def request_progress(request_id, enabled, cancel):
+        """Progress events for one request, tagged with its id on the protocol stream"""
+        if not enabled:
+            return ProgressReporter(cancel=cancel)
+        return ProgressReporter(lambda event: send({'id': request_id, 'event': 'progress', 'progress': event}),
+                                cancel)
+    
+    def finish(request_id, y_true, sample_count, cache_key, progress):
+        def callback(predictions, predictions_proba, confidence_scores, error):
+            try:
+                if error is not None:
+                    raise error
+                progress.update('predict', 1.0, len(predictions), len(predictions))
+                progress.update('statistics')
+                accumulator = PredictionAccumulator().update(predictions, predictions_proba, confidence_scores, y_true)
+                stats = calculate_aggregate_statistics(accumulator)
+                result = format_aggregate_results(accumulator, stats, sample_count)
+                progress.update('statistics', 1.0)
+                cache_store(cache, cache_key, result)
+                result['timings'] = collect_timings(progress)
+            except PredictionCancelled:
+                result = cancelled_result(progress)
+            except Exception as e:
+                result = {
+                    'success': False,
+                    'error': str(e)
+                }
+            respond(request_id, result)
+        return callback
+    
+    def handle(request, cancel, reservation=None):
+        """Run one prediction request; called on a job thread. reservation is its place in the batcher."""
+        request_id = request.get('id')
+        progress = request_progress(request_id, request.get('progress'), cancel)
+        try:
+            progress.checkpoint()
+            chunk_rows = int(request['chunk_rows']) if request.get('chunk_rows') else None
+            progress.mark('cache_lookup')
+            cache_key, result = cache_lookup(cache, request['input_file'], result_cache_config(backend, chunk_rows))
+            if result is not None:
+                result['timings'] = collect_timings(progress)
+                respond(request_id, result)
+                return
+            
+            if chunk_rows:
+                # Large files stream through the model on their own instead of joining a batch
+                result = run_streaming_prediction(model, request['input_file'], chunk_rows, progress)
+                cache_store(cache, cache_key, result)
+                result['timings'] = collect_timings(progress)
+                respond(request_id, result)
+                return
+            
+            X, y_true, sample_count = preprocess_data(request['input_file'], progress)
+            progress.update('predict', 0.0, 0, len(X))
+            batcher.fill(reservation, X, finish(request_id, y_true, sample_count, cache_key, progress))
+            reservation = None
+        except PredictionCancelled:
+            respond(request_id, cancelled_result(progress))
+        except Exception as e:
+            respond(request_id, {'success': False, 'error': str(e)})
+        finally:
+            if reservation is not None:
+                batcher.release(reservation)
+    
+    # Jobs run on their own threads so stats and cancel requests are answered while they are in progress.
+    # Several threads preprocess at once, and every request reserves its place in the batcher on
+    # arrival: requests that arrive together share a batch however long their preprocessing takes.
+    jobs = queue.Queue()
+    
+    def run_jobs():
+        while True:
+            item = jobs.get()
+            if item is None:
+                break
+            handle(*item)
+    
+    job_threads = [threading.Thread(target=run_jobs, name=f"prediction-jobs-{i}", daemon=True)
+                   for i in range(max(1, preprocess_threads))]
+    for thread in job_threads:
+        thread.start()
+    
+    send({'event': 'ready', 'model_path': MODEL_PATH, 'pid': os.getpid()})
+    
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            
+            if request.get('op') == 'stats':
+                stats = batcher.stats()
+                if cache is not None:
+                    stats['result_cache'] = cache.stats()
+                send({'id': request_id, 'stats': stats})
+                continue
+            
+            if request.get('op') == 'cancel':
+                with tokens_lock:
+                    token = tokens.get(request.get('target'))
+                if token is not None:
+                    token.cancel()
+                send({'id': request_id, 'cancelled': token is not None})
+                continue
+            
+            cancel = CancelToken()
+            with tokens_lock:
+                tokens[request_id] = cancel
+            # Streamed requests never join a batch
+            reservation = None if request.get('chunk_rows') else batcher.reserve(cancel)
+            jobs.put((request, cancel, reservation))
+        except Exception as e:
+            send({'id': request_id, 'result': {'success': False, 'error': str(e)}})
+    
+    for thread in job_threads:
+        jobs.put(None)
+    for thread in job_threads:
+        thread.join()
+    batcher.close()
+    print(json.dumps({'event': 'batch_stats', 'stats': batcher.stats()}), file=sys.stderr)
+
+def run_one_shot(args, cache, progress, loading_model):
+    """Produce the result document for a single input file; loading_model is set while the model loads"""
+    # Identical input, model and preprocessing: reuse the stored result without loading TensorFlow
+    progress.mark('cache_lookup')
+    cache_key, result = cache_lookup(cache, args.input_file, result_cache_config(args.backend, args.chunk_rows))
+    if result is not None:
+        return result
+    
+    if args.shards > 1:
+        # Each shard worker loads its own copy of the model
+        result = run_sharded_prediction(args.input_file, args.shards, args.threads_per_shard, args.backend,
+                                        progress)
+        cache_store(cache, cache_key, result)
+        return result
+    
+    # Load the model
+    progress.update('model_load')
+    loading_model.set()
+    try:
+        model = load_predictor(args.backend)
+    finally:
+        loading_model.clear()
+    progress.update('model_load', 1.0)
+    
+    if args.chunk_rows:
+        result = run_streaming_prediction(model, args.input_file, args.chunk_rows, progress)
+    else:
+        result = run_prediction(model, args.input_file, progress)
+    cache_store(cache, cache_key, result)
+    return result
+
 def main():
     """Main prediction function"""
-    if len(sys.argv) != 2:
+    parser = argparse.ArgumentParser(description="EEG prediction with the pre-trained CNN-LSTM model")
+    parser.add_argument('input_file', nargs='?', help="EEG feature file to classify")
+    parser.add_argument('--worker', action='store_true',
+                        help="Keep the model loaded and serve JSON-lines jobs on stdin/stdout")
+    parser.add_argument('--backend', choices=BACKENDS, default='keras',
+                        help="Inference form of the model; savedmodel/tflite are exported once and cached")
+    parser.add_argument('--model', default=None,
+                        help="Model file (default: EEG_MODEL_PATH or Model/cnn_lstm_model_efficient.h5); "
+                             "its <model>.normalization.json is used when present")
+    parser.add_argument('--chunk-rows', type=int, default=None,
+                        help="Stream the input in chunks of this many rows to bound memory on large files")
+    parser.add_argument('--shards', type=int, default=1,
+                        help="Split inference across this many worker processes, each with its own model")
+    parser.add_argument('--threads-per-shard', type=int, default=None,
+                        help="TensorFlow intra-op threads per shard worker (default: cores / shards)")
+    parser.add_argument('--batch-window-ms', type=float, default=20,
+                        help="Worker mode: how long to gather concurrent requests into one predict call")
+    parser.add_argument('--batch-max-rows', type=int, default=8192,
+                        help="Worker mode: close a batch early once it holds this many rows")
+    parser.add_argument('--batch-fill-wait-ms', type=float, default=250,
+                        help="Worker mode: how long a batch waits for requests still being preprocessed; "
+                             "later ones join the next batch")
+    parser.add_argument('--preprocess-threads', type=int, default=4,
+                        help="Worker mode: how many requests are parsed and scaled at once")
+    parser.add_argument('--progress', action='store_true',
+                        help="Write JSON-lines progress events to stderr while the job runs")
+    parser.add_argument('--profile', metavar='REPORT', default=None,
+                        help="Profile the run with cProfile and tracemalloc; writes REPORT and REPORT.pstats")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Always run the model instead of reusing stored results for identical inputs")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Result cache directory (default: EEG_RESULT_CACHE or Model/.result_cache)")
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="Evict least recently used results once the cache exceeds this size")
+    parser.add_argument('--cache-max-age-hours', type=float, default=DEFAULT_MAX_AGE_SECONDS / 3600,
+                        help="Results older than this are recomputed")
+    args = parser.parse_args()
+    if args.model:
+        set_model_path(os.path.abspath(args.model))
+    
+    if not args.worker and not args.input_file:
         result = {
             'success': False,
             'error': 'Usage: python predict_with_model.py <input_file_path>'
@@ -234,27 +865,59 @@ def main():
         print(json.dumps(result))
         return
     
-    input_file_path = sys.argv[1]
+    cache = None
+    if not args.no_cache:
+        cache = ResultCache(args.cache_dir, int(args.cache_max_mb * 1024 * 1024), args.cache_max_age_hours * 3600)
+    
+    if args.worker:
+        try:
+            model = load_predictor(args.backend)
+        except Exception as e:
+            print(json.dumps({'event': 'error', 'error': str(e)}))
+            sys.exit(1)
+        run_worker(model, args.batch_window_ms, args.batch_max_rows, cache, args.backend, args.preprocess_threads,
+                   args.batch_fill_wait_ms)
+        return
+    
+    # SIGTERM cancels the run at its next checkpoint; a second SIGTERM exits immediately.
+    # Model loading has no checkpoints, so a SIGTERM during it interrupts it directly.
+    cancel = CancelToken()
+    loading_model = threading.Event()
+    
+    def handle_sigterm(signum, frame):
+        if cancel.is_set():
+            sys.exit(128 + signum)
+        cancel.cancel()
+        if loading_model.is_set():
+            raise PredictionCancelled()
+    
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    
+    emit = None
+    if args.progress:
+        emit = lambda event: print(json.dumps({'event': 'progress', 'progress': event}), file=sys.stderr, flush=True)
+    progress = ProgressReporter(emit, cancel, started=PROCESS_STARTED)
+    progress.mark('import', PROCESS_STARTED)
+    
+    def print_result(result):
+        """Print the result document with its timings; json_encode times the encoding of the document"""
+        progress.mark('json_encode')
+        document = json.dumps(result, indent=2)
+        result['timings'] = collect_timings(progress)
+        print(append_json_field(document, 'timings', result['timings']))
     
     try:
-        # Load the model
-        model = load_model()
-        
-        # Preprocess the data
-        X, y_true, sample_count = preprocess_data(input_file_path)
-        
-        # Make predictions
-        predictions, predictions_proba, confidence_scores = make_predictions(model, X)
-        
-        # Calculate statistics
-        stats = calculate_statistics(predictions, predictions_proba, confidence_scores, y_true)
-        
-        # Format and return results
-        result = format_results(predictions, predictions_proba, confidence_scores, stats, sample_count)
-        
-        # Output as JSON
-        print(json.dumps(result, indent=2))
+        with profiled(args.profile) if args.profile else contextlib.nullcontext():
+            result = run_one_shot(args, cache, progress, loading_model)
+        print_result(result)
     
+    except PredictionCancelled:
+        print(json.dumps(cancelled_result(progress), indent=2))
+        # Skip interpreter teardown (a second or more once TensorFlow is loaded) so the
+        # cancelled job's CPU and memory are released right away
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(0)
     except Exception as e:
         result = {
             'success': False,
@@ -263,4 +926,4 @@ def main():
         print(json.dumps(result))
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
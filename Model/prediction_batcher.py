@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Dynamic micro-batching for concurrent prediction requests
+Rows from every request that arrives within a short latency window are run
+through the model as one large predict call and split back out per request
+"""
+
+import bisect
+import threading
+import time
+
+import numpy as np
+
+from prediction_progress import PredictionCancelled
+
+# Histogram bucket upper bounds
+BATCH_ROW_BOUNDS = [1, 16, 64, 256, 1024, 4096, 16384, 65536]
+BATCH_REQUEST_BOUNDS = [1, 2, 4, 8, 16, 32]
+QUEUE_WAIT_MS_BOUNDS = [1, 2, 5, 10, 20, 50, 100, 250, 500, 1000]
+
+class Histogram:
+    """Fixed-bucket histogram counter"""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        """Record one observation"""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def to_dict(self):
+        """Return bucket counts keyed by their upper bound"""
+        buckets = {f"<={bound}": count for bound, count in zip(self.bounds, self.counts)}
+        buckets[f">{self.bounds[-1]}"] = self.counts[-1]
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'buckets': buckets
+        }
+
+class _PendingRequest:
+    def __init__(self, cancel):
+        self.X = None
+        self.callback = None
+        self.cancel = cancel
+        self.enqueued = time.monotonic()
+        self.ready = False
+        self.late = False
+
+class MicroBatcher:
+    """
+    Gather pending requests into shared predict calls
+
+    A batch is closed once `max_wait_ms` has passed since its first request
+    arrived or once it holds at least `max_rows` rows, whichever comes first.
+    `predict_fn(X)` must return per-row arrays (predictions, probabilities,
+    confidence scores); `callback(predictions, predictions_proba,
+    confidence_scores, error)` is invoked once per request on the batching thread.
+    Requests whose cancel token is set before their batch runs are left out of
+    it and called back with PredictionCancelled.
+
+    A request can hold its place from the moment it arrives (reserve) while its
+    rows are still being prepared. The batch of its arrival waits for them for
+    at most `max_fill_wait_ms` past its closing; the requests that are ready by
+    then are predicted and the late ones join the next batch, so one slow
+    request does not hold up the others. The rows of a batch are predicted in
+    calls of at most `max_rows` rows, except for a single larger request.
+    Queue wait is measured from a request's arrival.
+    """
+
+    def __init__(self, predict_fn, max_wait_ms=20, max_rows=8192, max_fill_wait_ms=250):
+        self.predict_fn = predict_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_rows = max_rows
+        self.max_fill_wait = max_fill_wait_ms / 1000.0
+
+        # Requests not yet batched, in arrival order; the condition is notified on every change
+        self._pending = []
+        self._closed = False
+        self._changed = threading.Condition()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+
+        self.batch_rows = Histogram(BATCH_ROW_BOUNDS)
+        self.batch_requests = Histogram(BATCH_REQUEST_BOUNDS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_MS_BOUNDS)
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+        self.late_requests = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, X, callback, cancel=None):
+        """Queue one request's preprocessed rows for the next batch"""
+        self.fill(self.reserve(cancel), X, callback)
+
+    def reserve(self, cancel=None):
+        """
+        Hold a place in the next batch for a request whose rows are not ready yet
+        Complete it with fill(), or withdraw it with release() if the request
+        will not be predicted.
+        """
+        item = _PendingRequest(cancel)
+        with self._changed:
+            self._pending.append(item)
+            self._changed.notify()
+        return item
+
+    def fill(self, reservation, X, callback):
+        """Hand over the rows of a reserved request"""
+        with self._changed:
+            reservation.X = X
+            reservation.callback = callback
+            reservation.ready = True
+            self._changed.notify()
+
+    def release(self, reservation):
+        """Withdraw a reserved request without predicting it"""
+        with self._changed:
+            reservation.ready = True
+            self._changed.notify()
+
+    def close(self):
+        """Finish every queued request and stop the batching thread"""
+        with self._changed:
+            self._closed = True
+            self._changed.notify()
+        self._thread.join()
+
+    def stats(self):
+        """Return batch-size and queue-wait counters"""
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'requests': self.requests,
+                'rows': self.rows,
+                'late_requests': self.late_requests,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'max_rows': self.max_rows,
+                'max_fill_wait_ms': self.max_fill_wait * 1000.0,
+                'batch_rows': self.batch_rows.to_dict(),
+                'batch_requests': self.batch_requests.to_dict(),
+                'queue_wait_ms': self.queue_wait_ms.to_dict()
+            }
+
+    def _wait_until(self, done, deadline):
+        """Wait on the condition (held) until done() or the deadline; returns done()"""
+        while not done():
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                return False
+            self._changed.wait(timeout)
+        return True
+
+    def _collect(self):
+        """
+        Take the next batch off the pending list; the condition must be held
+        Returns the ready requests of the batch (released ones included), or
+        None once the batcher is closed and nothing is pending.
+        """
+        while True:
+            while not self._pending and not self._closed:
+                self._changed.wait()
+            if not self._pending:
+                return None
+
+            # Gather arrivals until the window of the oldest pending request ends or enough rows are ready
+            deadline = self._pending[0].enqueued + self.max_wait
+            self._wait_until(lambda: self._closed or self._ready_rows() >= self.max_rows, deadline)
+            batch = list(self._pending)
+
+            # Give requests still being prepared a bounded time to catch up
+            self._wait_until(lambda: all(item.ready for item in batch), deadline + self.max_fill_wait)
+            ready = [item for item in batch if item.ready]
+            if not ready:
+                # Nothing to run yet: sleep until a request is filled or released, then take a new batch
+                self._changed.wait()
+                continue
+
+            late = [item for item in batch if not item.ready and not item.late]
+            for item in late:
+                item.late = True
+            if late:
+                with self._lock:
+                    self.late_requests += len(late)
+            ready_ids = {id(item) for item in ready}
+            self._pending = [item for item in self._pending if id(item) not in ready_ids]
+            return ready
+
+    def _ready_rows(self):
+        return sum(len(item.X) for item in self._pending if item.ready and item.X is not None)
+
+    def _split(self, batch):
+        """Consecutive groups of requests of at most max_rows rows each (a larger request on its own)"""
+        groups, group, rows = [], [], 0
+        for item in batch:
+            if group and rows + len(item.X) > self.max_rows:
+                groups.append(group)
+                group, rows = [], 0
+            group.append(item)
+            rows += len(item.X)
+        if group:
+            groups.append(group)
+        return groups
+
+    def _run(self):
+        while True:
+            with self._changed:
+                batch = self._collect()
+            if batch is None:
+                break
+            for group in self._split([item for item in batch if item.X is not None]):
+                self._predict_batch(group)
+
+    def _predict_batch(self, batch):
+        cancelled = [item.cancel is not None and item.cancel.is_set() for item in batch]
+        for item, is_cancelled in zip(batch, cancelled):
+            if is_cancelled:
+                item.callback(None, None, None, PredictionCancelled())
+        batch = [item for item, is_cancelled in zip(batch, cancelled) if not is_cancelled]
+        if not batch:
+            return
+
+        started = time.monotonic()
+        sizes = [len(item.X) for item in batch]
+
+        with self._lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.rows += sum(sizes)
+            self.batch_rows.observe(sum(sizes))
+            self.batch_requests.observe(len(batch))
+            for item in batch:
+                self.queue_wait_ms.observe((started - item.enqueued) * 1000.0)
+
+        try:
+            X = batch[0].X if len(batch) == 1 else np.concatenate([item.X for item in batch], axis=0)
+            predictions, predictions_proba, confidence_scores = self.predict_fn(X)
+        except Exception as e:
+            for item in batch:
+                item.callback(None, None, None, e)
+            return
+
+        offset = 0
+        for item, size in zip(batch, sizes):
+            end = offset + size
+            item.callback(predictions[offset:end], predictions_proba[offset:end],
+                          confidence_scores[offset:end], None)
+            offset = end
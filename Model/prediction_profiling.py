@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Resource measurements and opt-in profiling for prediction runs
+peak_rss_bytes() reports the process's peak resident memory on Linux, macOS
+and Windows; profiled() wraps a run in cProfile and tracemalloc and writes a
+text report next to the raw profile.
+"""
+
+import contextlib
+import cProfile
+import io
+import pstats
+import sys
+import tracemalloc
+
+PROFILE_TOP_FUNCTIONS = 40
+PROFILE_TOP_ALLOCATIONS = 25
+
+def peak_rss_bytes():
+    """Peak resident set size of this process in bytes, or None where it cannot be read"""
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_rss_bytes()
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return int(peak if sys.platform == 'darwin' else peak * 1024)
+
+def _windows_peak_rss_bytes():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ('cb', wintypes.DWORD),
+                ('PageFaultCount', wintypes.DWORD),
+                ('PeakWorkingSetSize', ctypes.c_size_t),
+                ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t),
+                ('PeakPagefileUsage', ctypes.c_size_t)
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return int(counters.PeakWorkingSetSize)
+    except Exception:
+        return None
+
+@contextlib.contextmanager
+def profiled(report_path):
+    """
+    Profile the enclosed code with cProfile and tracemalloc
+    The raw profile goes to `<report_path>.pstats` (for snakeviz or pstats) and
+    a text report of the slowest functions and largest allocations to report_path.
+    """
+    tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        traced_current, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profiler.dump_stats(report_path + '.pstats')
+
+        functions = io.StringIO()
+        pstats.Stats(profiler, stream=functions).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+
+        with open(report_path, 'w') as f:
+            f.write(f"Peak RSS: {peak_rss_bytes()} bytes\n")
+            f.write(f"Python allocations: {traced_current} bytes live, {traced_peak} bytes peak\n\n")
+            f.write(f"=== Top {PROFILE_TOP_FUNCTIONS} functions by cumulative time ===\n")
+            f.write(functions.getvalue())
+            f.write(f"\n=== Top {PROFILE_TOP_ALLOCATIONS} allocation sites ===\n")
+            for stat in snapshot.statistics('lineno')[:PROFILE_TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
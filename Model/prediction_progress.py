@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Structured progress events and cooperative cancellation for a prediction run
+Each pipeline stage owns a slice of the 0-100 range; events carry the overall
+percentage, the current stage, row counts where known and, during inference, an ETA; they are
+handed to an emit callback (a stderr JSON line in one-shot mode, an id-tagged
+protocol message in worker mode). Every progress update is also a cancellation
+checkpoint: once the run's CancelToken is set, the next update raises
+PredictionCancelled.
+"""
+
+import threading
+import time
+
+# (stage, start %, end %) in pipeline order
+STAGES = [
+    ('model_load', 0.0, 10.0),
+    ('csv_parse', 10.0, 20.0),
+    ('scaling', 20.0, 30.0),
+    ('predict', 30.0, 90.0),
+    ('statistics', 90.0, 100.0)
+]
+STAGE_RANGES = {name: (start, end) for name, start, end in STAGES}
+
+# Rows per model.predict call when progress is reported or the run can be cancelled
+PROGRESS_BATCH_ROWS = 8192
+
+class PredictionCancelled(BaseException):
+    """
+    Raised at a checkpoint once the run has been cancelled
+    Like KeyboardInterrupt it is not an Exception, so the pipeline's
+    `except Exception` error wrapping lets it through.
+    """
+
+    def __init__(self):
+        super().__init__("Prediction cancelled")
+
+class CancelToken:
+    """Thread-safe cancellation flag shared between a run and whoever may cancel it"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise PredictionCancelled()
+
+class ProgressReporter:
+    """Turn stage updates into progress events and cancellation checkpoints"""
+
+    def __init__(self, emit=None, cancel=None, started=None):
+        self.emit = emit
+        self.cancel = cancel
+        self.started = started if started is not None else time.perf_counter()
+        self.stage_started = {}
+
+    @property
+    def enabled(self):
+        """True when updates should come often enough to be useful (reporting or cancellable)"""
+        return self.emit is not None or self.cancel is not None
+
+    def timings(self):
+        """Seconds spent in each stage reached so far, plus the total"""
+        now = time.perf_counter()
+        stages = sorted(self.stage_started.items(), key=lambda item: item[1])
+        timings = {}
+        for i, (stage, started) in enumerate(stages):
+            ended = stages[i + 1][1] if i + 1 < len(stages) else now
+            timings[stage] = round(ended - started, 6)
+        timings['total'] = round(now - self.started, 6)
+        return timings
+
+    def mark(self, stage, at=None):
+        """Start timing a stage that has no progress range (e.g. import, json_encode)"""
+        self.stage_started.setdefault(stage, at if at is not None else time.perf_counter())
+
+    def checkpoint(self):
+        """Raise PredictionCancelled if the run has been cancelled, without reporting progress"""
+        if self.cancel is not None:
+            self.cancel.check()
+
+    def update(self, stage, fraction=0.0, rows_done=None, rows_total=None):
+        """Report that `stage` is `fraction` complete; raises PredictionCancelled once cancelled"""
+        now = time.perf_counter()
+        stage_started = self.stage_started.setdefault(stage, now)
+
+        self.checkpoint()
+        if self.emit is None:
+            return
+        start, end = STAGE_RANGES[stage]
+        fraction = min(max(fraction, 0.0), 1.0)
+        percent = start + (end - start) * fraction
+
+        event = {
+            'stage': stage,
+            'percent': round(percent, 2),
+            'elapsed_s': round(now - self.started, 3)
+        }
+        if rows_done is not None:
+            event['rows_done'] = int(rows_done)
+        if rows_total is not None:
+            event['rows_total'] = int(rows_total)
+
+        if stage == 'predict' and fraction > 0:
+            # Inference dominates the remaining work; extrapolate from its own row rate.
+            # Earlier stages are too short or too uneven (model load) to extrapolate from.
+            event['eta_s'] = round((now - stage_started) * (1 - fraction) / fraction, 3)
+
+        self.emit(event)
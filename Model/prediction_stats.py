@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+One-pass, mergeable statistics for prediction results
+PredictionAccumulator folds model output chunk by chunk into class histograms,
+confidence buckets, confidence moments and a confusion matrix. Accumulators
+from chunked or sharded runs merge exactly, and the classification report is
+derived from the confusion matrix instead of rescanning labels.
+"""
+
+import numpy as np
+
+HIGH_CONFIDENCE_THRESHOLD = 0.8
+MEDIUM_CONFIDENCE_THRESHOLD = 0.6
+
+# Bucket index 0 = low, 1 = medium, 2 = high confidence
+CONFIDENCE_BUCKET_EDGES = np.array([MEDIUM_CONFIDENCE_THRESHOLD, HIGH_CONFIDENCE_THRESHOLD])
+
+# Above this label span the confusion pairs are counted with np.unique instead of np.bincount
+MAX_DENSE_LABEL_SPAN = 4096
+
+class PredictionAccumulator:
+    """Accumulate prediction results in one pass per chunk"""
+
+    def __init__(self, detail_limit=10):
+        self.detail_limit = detail_limit
+
+        self.count = 0
+        self.class_counts = np.zeros(0, dtype=np.int64)
+        self.bucket_counts = np.zeros(3, dtype=np.int64)
+
+        # Welford/Chan running moments of the confidence scores
+        self.confidence_mean = 0.0
+        self.confidence_m2 = 0.0
+        self.confidence_min = np.inf
+        self.confidence_max = -np.inf
+
+        # First rows kept verbatim for detailed_predictions
+        self.head_predictions = []
+        self.head_confidence = []
+        self.head_probabilities = []
+
+        # Sparse confusion matrix {(true_label, predicted_class): count}
+        self.has_labels = False
+        self.label_is_float = False
+        self.label_error = None
+        self.confusion = {}
+
+    def update(self, predictions, predictions_proba, confidence_scores, y_true=None):
+        """Fold one chunk of model output into the accumulator"""
+        n = len(predictions)
+        if n == 0:
+            return self
+
+        predictions = np.asarray(predictions)
+        self._add_class_counts(np.bincount(predictions))
+        self.bucket_counts += np.bincount(
+            np.searchsorted(CONFIDENCE_BUCKET_EDGES, confidence_scores, side='right'), minlength=3)
+
+        confidence = np.asarray(confidence_scores, dtype=np.float64)
+        chunk_mean = float(confidence.mean())
+        chunk_m2 = float(np.dot(confidence - chunk_mean, confidence - chunk_mean))
+        self._add_moments(n, chunk_mean, chunk_m2, float(confidence.min()), float(confidence.max()))
+
+        missing = self.detail_limit - len(self.head_predictions)
+        if missing > 0:
+            self.head_predictions.extend(predictions[:missing])
+            self.head_confidence.extend(confidence_scores[:missing])
+            self.head_probabilities.extend(predictions_proba[:missing])
+
+        if y_true is not None and len(y_true) > 0:
+            try:
+                self._add_confusion(np.asarray(y_true), predictions)
+            except ValueError as e:
+                # Only the accuracy metrics are lost; the rest of the summary stays valid
+                self.label_error = str(e)
+
+        return self
+
+    def merge(self, other):
+        """Fold another accumulator into this one; other's rows are taken to follow ours"""
+        if other.count == 0:
+            return self
+
+        self._add_class_counts(other.class_counts)
+        self.bucket_counts += other.bucket_counts
+        self._add_moments(other.count, other.confidence_mean, other.confidence_m2,
+                          other.confidence_min, other.confidence_max)
+
+        missing = self.detail_limit - len(self.head_predictions)
+        if missing > 0:
+            self.head_predictions.extend(other.head_predictions[:missing])
+            self.head_confidence.extend(other.head_confidence[:missing])
+            self.head_probabilities.extend(other.head_probabilities[:missing])
+
+        self.label_error = self.label_error or other.label_error
+        if other.has_labels:
+            self.has_labels = True
+            self.label_is_float = self.label_is_float or other.label_is_float
+            for key, count in other.confusion.items():
+                self.confusion[key] = self.confusion.get(key, 0) + count
+
+        return self
+
+    # --- Derived values ---
+
+    @property
+    def confidence_std(self):
+        return float(np.sqrt(self.confidence_m2 / self.count)) if self.count else 0.0
+
+    @property
+    def abnormal_segments(self):
+        """Rows predicted as anything other than class 0"""
+        return int(self.count - (self.class_counts[0] if len(self.class_counts) else 0))
+
+    def class_distribution(self):
+        """Return {class_index: count} for every predicted class, in class order"""
+        return {int(class_idx): int(count) for class_idx, count in enumerate(self.class_counts) if count}
+
+    def most_common_class(self):
+        """Most frequent predicted class; ties resolve to the lowest index"""
+        return int(np.argmax(self.class_counts))
+
+    def confidence_buckets(self):
+        """Return (high, medium, low) confidence counts"""
+        low, medium, high = (int(count) for count in self.bucket_counts)
+        return high, medium, low
+
+    def accuracy(self):
+        correct = sum(count for (label, pred), count in self.confusion.items() if label == pred)
+        return correct / sum(self.confusion.values())
+
+    def classification_report(self):
+        """Per-label and averaged metrics in the layout of sklearn's classification_report(output_dict=True)"""
+        labels = sorted({label for label, _ in self.confusion} | {pred for _, pred in self.confusion})
+        index = {label: i for i, label in enumerate(labels)}
+
+        matrix = np.zeros((len(labels), len(labels)), dtype=np.int64)
+        for (label, pred), count in self.confusion.items():
+            matrix[index[label], index[pred]] += count
+
+        tp_sum = np.diag(matrix).astype(np.float64)
+        pred_sum = matrix.sum(axis=0).astype(np.float64)
+        true_sum = matrix.sum(axis=1).astype(np.float64)
+
+        precision = _divide(tp_sum, pred_sum)
+        recall = _divide(tp_sum, true_sum)
+        f_score = _divide(2 * tp_sum, true_sum + pred_sum)
+
+        report = {}
+        for i, label in enumerate(labels):
+            name = str(float(label)) if self.label_is_float else str(label)
+            report[name] = {
+                'precision': float(precision[i]),
+                'recall': float(recall[i]),
+                'f1-score': float(f_score[i]),
+                'support': float(true_sum[i])
+            }
+
+        support = float(true_sum.sum())
+        report['accuracy'] = float(tp_sum.sum() / pred_sum.sum())
+        report['macro avg'] = {
+            'precision': float(np.average(precision)),
+            'recall': float(np.average(recall)),
+            'f1-score': float(np.average(f_score)),
+            'support': support
+        }
+        report['weighted avg'] = {
+            'precision': float(np.average(precision, weights=true_sum)),
+            'recall': float(np.average(recall, weights=true_sum)),
+            'f1-score': float(np.average(f_score, weights=true_sum)),
+            'support': support
+        }
+        return report
+
+    # --- Internal helpers ---
+
+    def _add_class_counts(self, counts):
+        if len(counts) > len(self.class_counts):
+            self.class_counts = np.pad(self.class_counts, (0, len(counts) - len(self.class_counts)))
+        self.class_counts[:len(counts)] += counts
+
+    def _add_moments(self, n, mean, m2, minimum, maximum):
+        total = self.count + n
+        delta = mean - self.confidence_mean
+        self.confidence_mean += delta * n / total
+        self.confidence_m2 += m2 + delta * delta * self.count * n / total
+        self.confidence_min = min(self.confidence_min, minimum)
+        self.confidence_max = max(self.confidence_max, maximum)
+        self.count = total
+
+    def _add_confusion(self, y_true, predictions):
+        if y_true.dtype.kind == 'f':
+            if not np.all(np.isfinite(y_true)) or np.any(y_true != np.floor(y_true)):
+                raise ValueError("Classification metrics need integer-valued labels")
+            self.label_is_float = True
+        elif y_true.dtype.kind not in 'iub':
+            raise ValueError(f"Classification metrics need numeric labels, got {y_true.dtype}")
+
+        labels = y_true.astype(np.int64)
+        preds = predictions.astype(np.int64)
+        low = min(int(labels.min()), int(preds.min()))
+        span = max(int(labels.max()), int(preds.max())) - low + 1
+        codes = (labels - low) * span + (preds - low)
+
+        if span <= MAX_DENSE_LABEL_SPAN:
+            pair_counts = np.bincount(codes)
+            pair_codes = np.flatnonzero(pair_counts)
+            pair_counts = pair_counts[pair_codes]
+        else:
+            pair_codes, pair_counts = np.unique(codes, return_counts=True)
+
+        for code, count in zip(pair_codes.tolist(), pair_counts.tolist()):
+            key = (code // span + low, code % span + low)
+            self.confusion[key] = self.confusion.get(key, 0) + count
+        self.has_labels = True
+
+def _divide(numerator, denominator):
+    """Elementwise division that yields 0.0 where the denominator is zero"""
+    result = np.zeros_like(numerator)
+    mask = denominator != 0
+    result[mask] = numerator[mask] / denominator[mask]
+    return result
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of prediction result documents
+Results are keyed by the hash of the input file's bytes, the hash of the model
+file and the preprocessing configuration, so a recording re-uploaded under a
+new name is served from disk instead of rerunning the model. Entries expire
+after a maximum age and the least recently used ones are evicted once the
+cache grows past its size limit.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from file_hashing import file_hash, input_hash
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.environ.get('EEG_RESULT_CACHE', os.path.join(script_dir, ".result_cache"))
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 3600
+
+# Bump when the layout of the result document changes
+RESULT_FORMAT_VERSION = 1
+
+ENTRY_SUFFIX = '.json'
+
+class ResultCache:
+    """Disk-backed result cache with age expiry and size-bounded LRU eviction"""
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.expired = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._model_hashes = {}
+
+    def key(self, input_path, model_path, config, input_sha256=None):
+        """
+        Cache key for an input file run through a model with the given preprocessing config
+        input_sha256 is the input's hash if the caller already knows it.
+        """
+        fields = {
+            'input_sha256': input_sha256 or input_hash(input_path),
+            'model_sha256': self._model_hash(model_path),
+            'config': config,
+            'format': RESULT_FORMAT_VERSION
+        }
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key):
+        """Return the stored result document for key, or None"""
+        path = self._entry_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._count('misses')
+            return None
+
+        if time.time() - entry.get('created', 0) > self.max_age_seconds:
+            self._discard(path)
+            self._count('expired')
+            self._count('misses')
+            return None
+
+        # The modification time doubles as the last-access time for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count('hits')
+        return entry['result']
+
+    def put(self, key, result):
+        """Store a result document, then evict expired and least recently used entries"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._entry_path(key)
+        staging_path = path + f".tmp{os.getpid()}.{threading.get_ident()}"
+        with open(staging_path, 'w') as f:
+            json.dump({'created': time.time(), 'result': result}, f)
+        os.replace(staging_path, path)
+        self._count('stores')
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones until the cache fits max_bytes"""
+        now = time.time()
+        entries = []
+        total = 0
+        for path, stat in self._scan():
+            # Unused for max_age means created more than max_age ago; entries that are
+            # still read but were created earlier than that are expired by get()
+            if now - stat.st_mtime > self.max_age_seconds:
+                self._discard(path)
+                self._count('expired')
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._discard(path)
+            self._count('evictions')
+            total -= size
+
+    def stats(self):
+        """Hit/miss counters for this process and the current size of the cache"""
+        entries = self._scan()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'stores': self.stores,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'bytes': sum(stat.st_size for _, stat in entries),
+            'max_bytes': self.max_bytes,
+            'max_age_seconds': self.max_age_seconds
+        }
+
+    # --- Internal helpers ---
+
+    def _model_hash(self, model_path):
+        # Rehash only when the model file changes on disk
+        stat = os.stat(model_path)
+        signature = (model_path, stat.st_size, stat.st_mtime_ns)
+        if signature not in self._model_hashes:
+            self._model_hashes[signature] = file_hash(model_path)
+        return self._model_hashes[signature]
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    def _scan(self):
+        """(path, stat) for every entry; entries removed by a concurrent eviction are skipped"""
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith(ENTRY_SUFFIX):
+                        continue
+                    try:
+                        entries.append((entry.path, entry.stat()))
+                    except FileNotFoundError:
+                        pass
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
@@ -1,20 +1,67 @@
 #!/usr/bin/env python3
 """
 Simple EEG Preprocessing Script
-Processes Kaggle EEG datasets without requiring external libraries
+Processes Kaggle EEG datasets without requiring external libraries; when NumPy
+is installed, features are computed by a vectorized engine that produces the
+same feature vectors as the row-by-row extractor, up to floating-point rounding.
 """
 
 import os
 import csv
 import math
+import time
 import random
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from collections import deque
 from datetime import datetime
 
+from feature_cache import FeatureCache
+from file_hashing import file_hash
+from window_stats import SlidingWindowStats, block_statistics
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+    import eeg_io
+    from dataset_sidecar import describe_table
+    from feature_store import FeatureStoreWriter, store_path_for
+    from spectral_features import STEP_SIZE as SPECTRAL_STEP, SpectralAccumulator
+except ImportError:  # extract_simple_features does not need NumPy
+    np = None
+
+WINDOW_SIZE = 512   # ~2 seconds at 256Hz
+STEP_SIZE = 256     # 50% overlap
+NUM_FEATURES = 54   # 54 features to match EE_PCA_1.csv
+MAX_CHANNELS = 14   # Use up to 14 channels
+
+# Everything that changes the contents of a subject's features
+FEATURE_PARAMS = {
+    'window_size': WINDOW_SIZE,
+    'step_size': STEP_SIZE,
+    'num_features': NUM_FEATURES,
+    'max_channels': MAX_CHANNELS,
+    'statistics': 'direct'
+}
+DEFAULT_FEATURE_CACHE = ".feature_cache"
+
 def print_status(message):
     """Print status message with timestamp"""
     timestamp = datetime.now().strftime("%H:%M:%S")
     print(f"[{timestamp}] {message}")
 
+def parse_row(row):
+    """Convert string values to float where possible"""
+    processed_row = []
+    for val in row:
+        try:
+            processed_row.append(float(val))
+        except (ValueError, TypeError):
+            processed_row.append(val)
+    return processed_row
+
 def read_csv_file(file_path, max_rows=None):
     """Read CSV file and return data as list of lists"""
     data = []
@@ -24,14 +71,7 @@ def read_csv_file(file_path, max_rows=None):
             for i, row in enumerate(csv_reader):
                 if max_rows and i >= max_rows:
                     break
-                # Convert string values to float where possible
-                processed_row = []
-                for val in row:
-                    try:
-                        processed_row.append(float(val))
-                    except (ValueError, TypeError):
-                        processed_row.append(val)
-                data.append(processed_row)
+                data.append(parse_row(row))
         return data
     except Exception as e:
         print(f"Error reading {file_path}: {e}")
@@ -68,58 +108,440 @@ def extract_simple_features(data, subject_id):
     
     # Extract features from windows of data
     features = []
-    window_size = 512  # ~2 seconds at 256Hz
-    step_size = 256    # 50% overlap
     
-    for window_start in range(start_idx, len(data) - window_size, step_size):
-        window_data = data[window_start:window_start + window_size]
-        
-        # Feature vector for this window
-        feature_vector = [0] * 54  # 54 features to match EE_PCA_1.csv
+    for window_start in range(start_idx, len(data) - WINDOW_SIZE, STEP_SIZE):
+        window_data = data[window_start:window_start + WINDOW_SIZE]
+        features.append(simple_window_features(window_data, num_channels, subject_id))
+    
+    return features
+
+def simple_window_features(window_data, num_channels, subject_id):
+    """Feature vector for one window of rows"""
+    feature_vector = [0] * NUM_FEATURES
+    
+    # Fill features with simple statistics from each channel
+    for ch in range(min(MAX_CHANNELS, num_channels)):
+        # Get channel data for this window
+        channel_data = [row[ch] for row in window_data if ch < len(row)]
         
-        # Fill features with simple statistics from each channel
-        for ch in range(min(14, num_channels)):  # Use up to 14 channels
-            # Get channel data for this window
-            channel_data = [row[ch] for row in window_data if ch < len(row)]
+        if not channel_data:
+            continue
             
-            if not channel_data:
-                continue
-                
-            # Calculate simple statistics
+        # Calculate simple statistics
+        try:
+            # Mean
+            mean_val = sum(channel_data) / len(channel_data)
+            # Variance
+            variance = sum((x - mean_val) ** 2 for x in channel_data) / len(channel_data)
+            # Max
+            max_val = max(channel_data)
+            # Min
+            min_val = min(channel_data)
+            
+            # Assign features (distribute across the 54 features)
+            feature_idx = (ch * 4) % NUM_FEATURES
+            feature_vector[feature_idx] = mean_val
+            feature_vector[(feature_idx + 1) % NUM_FEATURES] = variance
+            feature_vector[(feature_idx + 2) % NUM_FEATURES] = max_val
+            feature_vector[(feature_idx + 3) % NUM_FEATURES] = min_val
+        except Exception as e:
+            print(f"Error calculating features: {e}")
+    
+    # Add subject ID as a simple "disorder" class (0-35)
+    # This is just a placeholder - you'll need to map these to actual disorders
+    feature_vector.append(float(subject_id))
+    
+    return feature_vector
+
+def rows_to_samples(data):
+    """
+    Convert rows from read_csv_file into a (samples, channels) float array
+    The header row, if any, is dropped. Returns None when the remaining rows are
+    ragged or contain non-numeric cells.
+    """
+    start_idx = 1 if isinstance(data[0][0], str) else 0
+    try:
+        samples = np.asarray(data[start_idx:], dtype=np.float64)
+    except (ValueError, TypeError):
+        return None
+    if samples.ndim != 2 or samples.shape[1] == 0:
+        return None
+    return samples
+
+def extract_window_features(samples, subject_id):
+    """
+    Vectorized extract_simple_features for a (samples, channels) array
+    Windows are zero-copy strided views of `samples`, and each statistic is
+    computed for every window and channel at once. The feature layout, including
+    the 14th channel's max/min overwriting the first channel's mean/variance, is
+    the same as the row-by-row extractor's.
+    """
+    num_samples, num_channels = samples.shape
+    if num_samples <= WINDOW_SIZE:
+        return []
+    channels = min(MAX_CHANNELS, num_channels)
+    
+    # (windows, WINDOW_SIZE, channels); like the row-wise loop, the window that
+    # ends exactly at the last sample is not included
+    windows = sliding_window_view(samples[:, :channels], WINDOW_SIZE, axis=0)[:num_samples - WINDOW_SIZE:STEP_SIZE]
+    windows = windows.transpose(0, 2, 1)
+    if len(windows) == 0:
+        return []
+    return window_feature_rows(windows, subject_id)
+
+def window_feature_rows(windows, subject_id):
+    """
+    Feature vectors for a (windows, WINDOW_SIZE, channels) array
+    A channel whose window holds a NaN (a missing or non-numeric cell in the
+    file) is left out of that window's vector, as the row-wise extractor skips
+    channels it cannot compute.
+    """
+    # Same formulas as the row-wise extractor; values can differ from it in the
+    # last bit because sum() and NumPy add the samples in a different order
+    mean = windows.sum(axis=1) / WINDOW_SIZE
+    deviation = windows - mean[:, np.newaxis, :]
+    variance = (deviation * deviation).sum(axis=1) / WINDOW_SIZE
+    return statistics_feature_rows((mean, variance, windows.max(axis=1), windows.min(axis=1)), subject_id)
+
+def statistics_feature_rows(statistics, subject_id):
+    """
+    Feature vectors from per-window, per-channel (means, variances, maxima, minima) arrays
+    A NaN mean marks a channel left out of that window's vector.
+    """
+    mean = statistics[0]
+    channels = min(MAX_CHANNELS, mean.shape[1])
+    # NaN anywhere in a window's channel makes its sum NaN
+    valid = ~np.isnan(mean)
+    if valid.all():
+        valid = None
+    
+    features = np.zeros((len(mean), NUM_FEATURES + 1))
+    assigned = np.zeros((len(mean), NUM_FEATURES), dtype=bool)
+    # Assign column by column in the row-wise order so later channels overwrite earlier ones
+    for ch in range(channels):
+        feature_idx = (ch * 4) % NUM_FEATURES
+        for offset, values in enumerate(statistics):
+            column = (feature_idx + offset) % NUM_FEATURES
+            if valid is None:
+                features[:, column] = values[:, ch]
+                assigned[:, column] = True
+            else:
+                features[valid[:, ch], column] = values[valid[:, ch], ch]
+                assigned[valid[:, ch], column] = True
+    features[:, NUM_FEATURES] = float(subject_id)
+    
+    rows = features.tolist()
+    # Unfilled features are the integer 0 in the row-wise extractor's output
+    if valid is None:
+        unassigned = np.flatnonzero(~assigned[0]).tolist() if len(rows) else []
+        if unassigned:
+            for row in rows:
+                for column in unassigned:
+                    row[column] = 0
+    else:
+        for row, row_assigned in zip(rows, assigned.tolist()):
+            for column, is_assigned in enumerate(row_assigned):
+                if not is_assigned:
+                    row[column] = 0
+    return rows
+
+def extract_features(data, subject_id):
+    """
+    Extract feature vectors from one subject's rows
+    Uses the vectorized engine when NumPy is available and the rows form a
+    numeric table, and extract_simple_features otherwise.
+    """
+    if np is not None and data and len(data) >= 100:
+        samples = rows_to_samples(data)
+        if samples is not None:
+            print_status(f"Processing subject {subject_id}: {len(data)} rows, {samples.shape[1]} channels")
+            return extract_window_features(samples, subject_id)
+    return extract_simple_features(data, subject_id)
+
+def stream_window_features(file_path, subject_id, counts=None, step_size=STEP_SIZE, running_stats=False,
+                           spectral=None):
+    """
+    Yield one feature vector per window while reading the file incrementally
+    Only the last WINDOW_SIZE rows are kept, in a ring buffer, so memory does
+    not grow with the length of the recording. With the default step size the
+    vectors are the ones extract_features returns for the whole file. If given,
+    counts['samples'] is kept up to date with the number of data rows read.
+    
+    With running_stats, statistics come from running sums and sliding
+    extremes (see window_stats.py) instead of being recomputed over every
+    window, so the cost per window no longer grows with the overlap; values
+    agree with the direct computation to rounding.
+    
+    A SpectralAccumulator passed as spectral is given the raw windows (see
+    stream_window_blocks); it needs NumPy and is left empty without it.
+    """
+    if np is not None:
+        yield from stream_window_blocks(file_path, subject_id, counts, step_size, running_stats, spectral)
+        return
+    
+    window = deque(maxlen=WINDOW_SIZE)
+    running = None
+    num_channels = None
+    rows_seen = 0
+    
+    for row, usable in numeric_rows(file_path):
+        if num_channels is None:
+            num_channels = len(row)
+            if running_stats:
+                running = SlidingWindowStats(WINDOW_SIZE, min(MAX_CHANNELS, num_channels))
+        
+        # A window is used once a row follows it, so one that ends on the
+        # last row of the file is dropped, as in extract_simple_features
+        if rows_seen >= WINDOW_SIZE and (rows_seen - WINDOW_SIZE) % step_size == 0:
+            if counts is not None:
+                counts['samples'] = rows_seen
+            statistics = running.statistics() if running is not None else None
+            if statistics is not None:
+                yield assemble_feature_vector(statistics, subject_id)
+            else:
+                # Direct computation, also for windows holding rows the running statistics cannot use
+                yield window_features(window, num_channels, subject_id)
+        window.append(row)
+        if running is not None:
+            running.push(row if usable else None)
+        rows_seen += 1
+    
+    if counts is not None:
+        counts['samples'] = rows_seen
+
+def numeric_rows(file_path):
+    """
+    Yield (row, usable) for each data row of a recording, skipping the header
+    With NumPy, rows come from eeg_io's block parser and unusable cells are
+    NaN; otherwise they come from csv.reader, with unusable cells left as
+    strings. usable is False for rows with such cells or too few of them.
+    """
+    if np is not None:
+        for chunk in eeg_io.iter_numeric_csv(file_path, strict=False):
+            unusable = np.isnan(chunk).any(axis=1).tolist()
+            for row, bad in zip(chunk.tolist(), unusable):
+                yield row, not bad
+        return
+    
+    num_channels = None
+    with open(file_path, 'r') as f:
+        for row in csv.reader(f):
+            numeric = True
             try:
-                # Mean
-                mean_val = sum(channel_data) / len(channel_data)
-                # Variance
-                variance = sum((x - mean_val) ** 2 for x in channel_data) / len(channel_data)
-                # Max
-                max_val = max(channel_data)
-                # Min
-                min_val = min(channel_data)
-                
-                # Assign features (distribute across the 54 features)
-                feature_idx = (ch * 4) % 54
-                feature_vector[feature_idx] = mean_val
-                feature_vector[(feature_idx + 1) % 54] = variance
-                feature_vector[(feature_idx + 2) % 54] = max_val
-                feature_vector[(feature_idx + 3) % 54] = min_val
-            except Exception as e:
-                print(f"Error calculating features: {e}")
+                row = [float(val) for val in row]
+            except ValueError:
+                row = parse_row(row)
+                numeric = False
+            if num_channels is None:
+                # Skip header if present
+                if row and isinstance(row[0], str):
+                    continue
+                num_channels = len(row)
+            yield row, numeric and len(row) == num_channels
+
+def stream_window_blocks(file_path, subject_id, counts=None, step_size=STEP_SIZE, running_stats=False,
+                         spectral=None):
+    """
+    stream_window_features with NumPy, a block of rows at a time
+    eeg_io parses the file in chunks; each chunk, with the rows carried over
+    from the previous one, is cut into strided windows and their features are
+    computed together. Memory stays bounded by one chunk plus one window.
+    Missing and non-numeric cells are NaN (see window_feature_rows).
+    With running_stats the statistics of all the block's windows come from
+    window_stats.block_statistics, in time linear in the block's rows.
+    
+    The raw (windows, channels, WINDOW_SIZE) block is also added to spectral,
+    if given: the windows spectral.step_size apart (a multiple of step_size,
+    see spectral_step), so the FFT work does not grow with the overlap of the
+    feature windows.
+    """
+    spectral_stride = spectral.step_size // step_size if spectral is not None else 1
+    carry = None
+    base = 0          # file row index of carry[0]
+    next_start = 0    # file row index where the next window starts
+    rows_read = 0
+    
+    for chunk in eeg_io.iter_numeric_csv(file_path, strict=False):
+        block = chunk if carry is None else np.concatenate((carry, chunk))
+        rows_read += len(chunk)
+        if counts is not None:
+            counts['samples'] = rows_read
         
-        # Add subject ID as a simple "disorder" class (0-35)
-        # This is just a placeholder - you'll need to map these to actual disorders
-        feature_vector.append(float(subject_id))
+        # A window is used once a row follows it, as in extract_simple_features
+        last_start = rows_read - WINDOW_SIZE - 1
+        if last_start >= next_start:
+            count = (last_start - next_start) // step_size + 1
+            offset = next_start - base
+            channels = block[:, :MAX_CHANNELS]
+            windows = sliding_window_view(channels, WINDOW_SIZE, axis=0)[offset:offset + (count - 1) * step_size + 1:step_size]
+            if spectral is not None:
+                # Same windows of the file whatever the chunking: every spectral_stride-th from the first
+                first = -(next_start // step_size) % spectral_stride
+                spectral.add(windows[first::spectral_stride])
+            if running_stats:
+                starts = offset + step_size * np.arange(count)
+                yield from statistics_feature_rows(block_statistics(channels, WINDOW_SIZE, starts), subject_id)
+            else:
+                yield from window_feature_rows(windows.transpose(0, 2, 1), subject_id)
+            next_start += count * step_size
         
-        features.append(feature_vector)
+        carry = block[next_start - base:]
+        base = next_start
     
-    return features
+    if counts is not None:
+        counts['samples'] = rows_read
+
+def window_features(window_data, num_channels, subject_id):
+    """Feature vector for one window, vectorized when its rows form a numeric table"""
+    if np is not None and num_channels:
+        try:
+            samples = np.asarray(window_data, dtype=np.float64)
+        except (ValueError, TypeError):
+            samples = None
+        if samples is not None and samples.ndim == 2:
+            return window_feature_rows(samples[np.newaxis, :, :MAX_CHANNELS], subject_id)[0]
+    return simple_window_features(window_data, num_channels, subject_id)
+
+def assemble_feature_vector(statistics, subject_id):
+    """Feature vector from per-channel (means, variances, maxima, minima), in the row-wise extractor's layout"""
+    feature_vector = [0] * NUM_FEATURES
+    for ch, values in enumerate(zip(*statistics)):
+        feature_idx = (ch * 4) % NUM_FEATURES
+        for offset, value in enumerate(values):
+            feature_vector[(feature_idx + offset) % NUM_FEATURES] = value
+    feature_vector.append(float(subject_id))
+    return feature_vector
+
+def spectral_step(step_size):
+    """Spacing of the windows a spectrum is averaged over: the largest multiple of step_size up to 50% overlap"""
+    return step_size * max(1, SPECTRAL_STEP // step_size)
+
+def subject_id_from_filename(csv_file):
+    """Extract subject ID from filename (s00.csv -> 0, s01.csv -> 1, etc.)"""
+    try:
+        return int(csv_file[1:3])
+    except ValueError:
+        return 0
+
+def process_subject(file_path, subject_id, csv_writer, step_size=STEP_SIZE, running_stats=False):
+    """
+    Stream one subject's feature vectors to csv_writer
+    Returns counts and timings: features written, samples read, seconds and
+    CPU seconds taken, and the error that stopped the subject early, if any;
+    with NumPy also the SpectralAccumulator state of the subject's windows.
+    """
+    counts = {'samples': 0}
+    spectral = SpectralAccumulator(step_size=spectral_step(step_size)) if np is not None else None
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    features = 0
+    error = None
+    try:
+        for feature_vector in stream_window_features(file_path, subject_id, counts, step_size, running_stats,
+                                                     spectral):
+            csv_writer.writerow(feature_vector)
+            features += 1
+    except Exception as e:
+        print(f"Error reading {file_path}: {e}")
+        error = str(e)
+    return {
+        'features': features,
+        'samples': counts['samples'],
+        'seconds': time.perf_counter() - started,
+        'cpu_seconds': time.process_time() - cpu_started,
+        'spectral': spectral.state() if spectral is not None else None,
+        'error': error
+    }
+
+def build_shard(task):
+    """
+    Write one subject's feature vectors to its own shard file
+    When the shard is going to be cached, the input is hashed first so the
+    hash describes the data the shard was built from. The shard is written
+    to a staging file and moved into place once complete, so an interrupted
+    run never leaves a partial shard under the shard's name.
+    """
+    csv_file, file_path, subject_id, shard_path, hash_input, options = task
+    sha256 = file_hash(file_path) if hash_input else None
+    staging_path = shard_path + f".tmp{os.getpid()}"
+    try:
+        with open(staging_path, 'w', newline='') as shard:
+            stats = process_subject(file_path, subject_id, csv.writer(shard), **options)
+        os.replace(staging_path, shard_path)
+    finally:
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+    stats['sha256'] = sha256
+    return csv_file, stats
+
+def process_subjects(tasks, workers=1):
+    """
+    Build the shard of every task, yielding (csv_file, stats) in task order
+    With more than one worker, subjects are processed in a process pool.
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            print_status(f"Processing {task[0]}...")
+            yield build_shard(task)
+        return
+    
+    with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+        yield from pool.imap(build_shard, tasks)
+
+def merge_shards(shard_paths, out):
+    """Append shard files to `out` in the given order"""
+    for shard_path in shard_paths:
+        with open(shard_path, 'r', newline='') as shard:
+            shutil.copyfileobj(shard, out)
+
+def write_feature_store(store_path, subject_shards, header):
+    """
+    Write the merged shards as a binary feature store (see feature_store.py)
+    subject_shards is (csv_file, shard_path) in output order; each subject's
+    row range goes into the store's subject index.
+    """
+    with FeatureStoreWriter(store_path, header[:-1], header[-1]) as writer:
+        for csv_file, shard_path in subject_shards:
+            writer.begin_subject(os.path.splitext(csv_file)[0], subject_id_from_filename(csv_file))
+            for block in eeg_io.iter_numeric_csv(shard_path):
+                writer.append_table(block)
+    return store_path
 
 def main():
     """Main processing function"""
+    parser = argparse.ArgumentParser(description="Extract window features from the Kaggle EEG recordings")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Subjects processed in parallel (0 = one per CPU core; default 1)")
+    parser.add_argument('--step-size', type=int, default=STEP_SIZE,
+                        help=f"Samples between window starts (default {STEP_SIZE}, 50%% overlap; "
+                             f"{WINDOW_SIZE // 10} is ~90%% overlap)")
+    parser.add_argument('--running-stats', action='store_true',
+                        help="Update window statistics incrementally; keeps small step sizes cheap")
+    parser.add_argument('--cache-dir', default=DEFAULT_FEATURE_CACHE,
+                        help=f"Per-subject feature shard cache (default {DEFAULT_FEATURE_CACHE})")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Reprocess every subject and leave the cache untouched")
+    parser.add_argument('--format', choices=('csv', 'store', 'both'), default='both',
+                        help="Write the features as CSV, as a binary feature store (requires NumPy), "
+                             "or both (default)")
+    args = parser.parse_args()
+    if not 0 < args.step_size <= WINDOW_SIZE:
+        parser.error(f"--step-size must be between 1 and {WINDOW_SIZE}")
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    options = {'step_size': args.step_size, 'running_stats': args.running_stats}
+    
     print_status("Starting simple EEG preprocessing")
     
     # Paths
     kaggle_path = "Kaggle_Datasets"
     output_file = "simple_preprocessed_eeg.csv"
+    store_path = None
+    if args.format != 'csv':
+        if np is None:
+            print_status("NumPy is not installed, writing CSV only")
+        else:
+            store_path = store_path_for(output_file)
+    write_csv = args.format != 'store' or store_path is None
     
     # Check if Kaggle datasets directory exists
     if not os.path.exists(kaggle_path):
@@ -131,45 +553,120 @@ def main():
     if not csv_files:
         print_status(f"Error: No CSV files found in '{kaggle_path}'")
         return
+    csv_files.sort()
     
-    print_status(f"Found {len(csv_files)} CSV files")
+    print_status(f"Found {len(csv_files)} CSV files" + (f", using {workers} workers" if workers > 1 else ""))
     
-    # Process each file
-    all_features = []
-    header = [f"feature_{i}" for i in range(54)] + ["main.disorder"]
-    all_features.append(header)
+    started = time.perf_counter()
+    scratch_dir = None
+    cache = None
+    if args.no_cache:
+        scratch_dir = tempfile.mkdtemp(prefix='.feature_shards_', dir=os.path.dirname(os.path.abspath(output_file)))
+    else:
+        params = dict(FEATURE_PARAMS, step_size=args.step_size,
+                      statistics='running' if args.running_stats else 'direct')
+        cache = FeatureCache(args.cache_dir, params)
+        evicted = cache.evict(set(csv_files))
+        if evicted:
+            print_status(f"Evicted cached features of {len(evicted)} removed subject files")
+        os.makedirs(args.cache_dir, exist_ok=True)
     
-    for csv_file in sorted(csv_files):
-        # Extract subject ID from filename (s00.csv -> 0, s01.csv -> 1, etc.)
-        try:
-            subject_id = int(csv_file[1:3])
-        except ValueError:
-            subject_id = 0
+    try:
+        # Unchanged subjects reuse their cached shard; the rest are (re)computed
+        shard_paths = {}
+        subject_stats = {}
+        tasks = []
+        for csv_file in csv_files:
+            file_path = os.path.join(kaggle_path, csv_file)
+            if cache is None:
+                shard_paths[csv_file] = os.path.join(scratch_dir, os.path.splitext(csv_file)[0] + ".csv")
+            else:
+                shard_paths[csv_file] = cache.shard_path(csv_file)
+                entry = cache.lookup(csv_file, file_path)
+                # Entries from before spectra were recorded are rebuilt once
+                if entry is not None and (np is None or entry.get('spectral') is not None):
+                    subject_stats[csv_file] = entry
+                    continue
+                cache.forget(csv_file)
+            tasks.append((csv_file, file_path, subject_id_from_filename(csv_file), shard_paths[csv_file],
+                          cache is not None, options))
         
-        file_path = os.path.join(kaggle_path, csv_file)
-        print_status(f"Processing {csv_file}...")
+        if cache is not None:
+            print_status(f"Reusing cached features for {len(csv_files) - len(tasks)} subjects, "
+                         f"processing {len(tasks)}")
+            if tasks:
+                # Without the entries of the subjects being rebuilt, so a run interrupted
+                # from here on leaves no entry vouching for a shard it replaced
+                cache.save()
         
-        # Read data
-        data = read_csv_file(file_path, max_rows=10000)  # Limit rows for speed
-        if not data:
-            print_status(f"Skipping {csv_file} - no data found")
-            continue
+        cpu_seconds = 0.0
+        processing_started = time.perf_counter()
+        for csv_file, stats in process_subjects(tasks, workers):
+            cpu_seconds += stats['cpu_seconds']
+            subject_stats[csv_file] = stats
+            if cache is not None and stats['error'] is None:
+                cache.record(csv_file, os.path.join(kaggle_path, csv_file), stats['sha256'], stats)
+            
+            samples, elapsed = stats['samples'], stats['seconds']
+            if samples == 0:
+                print_status(f"Skipping {csv_file} - no data found")
+            elif stats['features']:
+                print_status(f"Extracted {stats['features']} feature vectors from {csv_file} "
+                             f"({samples:,} samples in {elapsed:.2f}s, {samples / max(elapsed, 1e-9):,.0f} samples/s)")
+        processing_time = time.perf_counter() - processing_started
+        if cache is not None:
+            cache.save()
         
-        # Extract features
-        features = extract_simple_features(data, subject_id)
-        if features:
-            all_features.extend(features)
-            print_status(f"Extracted {len(features)} feature vectors from {csv_file}")
+        total_features = sum(stats['features'] for stats in subject_stats.values())
+        total_samples = sum(stats['samples'] for stats in subject_stats.values())
         
-    # Write output file
-    if len(all_features) > 1:  # Header + at least one feature vector
-        print_status(f"Writing {len(all_features)-1} feature vectors to {output_file}")
-        if write_csv_file(output_file, all_features):
-            print_status(f"Successfully created {output_file}")
-        else:
-            print_status(f"Failed to write {output_file}")
-    else:
-        print_status("No features extracted, output file not created")
+        # Keep the output file only if something was extracted
+        if total_features == 0:
+            print_status("No features extracted, output file not created")
+            return
+        
+        # Merge shards in subject order, so the output does not depend on caching or workers
+        header = [f"feature_{i}" for i in range(NUM_FEATURES)] + ["main.disorder"]
+        ordered_shards = [shard_paths[csv_file] for csv_file in csv_files]
+        if write_csv:
+            staging_file = output_file + ".tmp"
+            with open(staging_file, 'w', newline='') as out:
+                csv.writer(out).writerow(header)
+                merge_shards(ordered_shards, out)
+            os.replace(staging_file, output_file)
+        if store_path is not None:
+            write_feature_store(store_path, [(csv_file, shard_paths[csv_file]) for csv_file in csv_files], header)
+            print_status(f"Wrote feature store {store_path}")
+        if np is not None:
+            # Schema and statistics sidecars, so the next stages need not rescan the outputs
+            segments = [subject_stats[csv_file]['features'] for csv_file in csv_files]
+            spectral = SpectralAccumulator(step_size=spectral_step(args.step_size))
+            for csv_file in csv_files:
+                if subject_stats[csv_file].get('spectral'):
+                    spectral.merge(subject_stats[csv_file]['spectral'])
+            spectral = spectral.summary()
+            for path in (output_file if write_csv else None, store_path):
+                if path is not None:
+                    describe_table(path, step_size=args.step_size, segments=segments, spectral=spectral)
+    finally:
+        if scratch_dir is not None:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+    
+    elapsed = time.perf_counter() - started
+    outputs = " and ".join(path for path in (output_file if write_csv else None, store_path) if path)
+    print_status(f"Wrote {total_features} feature vectors from {total_samples:,} samples to {outputs} "
+                 f"in {elapsed:.2f}s")
+    if tasks:
+        processed_samples = sum(subject_stats[task[0]]['samples'] for task in tasks)
+        print_status(f"Processed {len(tasks)} subjects, {processed_samples:,} samples in {processing_time:.2f}s "
+                     f"({processed_samples / max(processing_time, 1e-9):,.0f} samples/s)")
+    if workers > 1 and tasks:
+        # An estimate from the workers' CPU time, not a comparison with a sequential run;
+        # `benchmarks.py subject-workers` measures the actual speedup
+        efficiency = cpu_seconds / max(processing_time * workers, 1e-9)
+        print_status(f"Estimated parallel efficiency: {efficiency:.0%} "
+                     f"({cpu_seconds:.2f} CPU seconds in {processing_time:.2f}s across {workers} workers)")
+    print_status(f"Successfully created {outputs}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Spectral band-power features for EEG recordings
+All windows of a recording are transformed together: the (windows, channels,
+512) block goes through one batched rfft, and delta/theta/alpha/beta/gamma
+band powers come out for every window and channel at once. Averaging the
+Hann-windowed periodograms of the 50%-overlap windows gives Welch's estimate
+of the recording's spectrum. Recordings are read a chunk at a time and only
+running sums are kept, so memory does not grow with their length; the
+per-window band-power timeline is capped at MAX_TIMELINE_POINTS points, each
+averaging consecutive windows once a recording has more.
+
+Usage:
+    python spectral_features.py <recording.csv> [--sampling-rate 256]
+
+Writes <recording.csv>.spectral.json, the sidecar the backend reads for the
+spectral section of analysis results of raw recordings. Feature tables hold
+one row per window, not one sample per row, so they are refused; for them
+simple_preprocess.py records the spectrum of the recordings it read, with a
+SpectralAccumulator, in the table's dataset sidecar (see dataset_sidecar.py).
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from eeg_io import DEFAULT_CHUNK_ROWS, iter_numeric_csv
+
+SAMPLING_RATE = 256  # Hz
+WINDOW_SIZE = 512    # ~2 seconds at 256Hz
+STEP_SIZE = 256      # 50% overlap
+
+# Frequency bands in Hz, [low, high)
+BANDS = {
+    'delta': (0.5, 4.0),
+    'theta': (4.0, 8.0),
+    'alpha': (8.0, 13.0),
+    'beta': (13.0, 30.0),
+    'gamma': (30.0, 45.0)
+}
+
+# Windows transformed per rfft call; bounds memory for long recordings
+BLOCK_WINDOWS = 1024
+
+# Most points in a band-power timeline (even); longer recordings average
+# consecutive windows into each point
+MAX_TIMELINE_POINTS = 1024
+
+SIDECAR_SUFFIX = ".spectral.json"
+SIDECAR_FORMAT_VERSION = 2
+
+def power_spectral_density(windows, sampling_rate=SAMPLING_RATE):
+    """
+    One-sided PSD of every window and channel: (frequencies, psd)
+    windows is (windows, channels, samples); psd is (windows, channels, bins)
+    in units²/Hz, from a single rfft over the Hann-tapered block.
+    """
+    window_size = windows.shape[-1]
+    taper = np.hanning(window_size)
+    # Remove each window's mean so the DC offset does not leak into the delta band
+    centred = windows - windows.mean(axis=-1, keepdims=True)
+    spectrum = np.fft.rfft(centred * taper, axis=-1)
+
+    psd = (spectrum.real ** 2 + spectrum.imag ** 2) / (sampling_rate * np.sum(taper ** 2))
+    # Fold negative frequencies in, except at DC and (for even sizes) Nyquist
+    if window_size % 2 == 0:
+        psd[..., 1:-1] *= 2
+    else:
+        psd[..., 1:] *= 2
+    return np.fft.rfftfreq(window_size, 1.0 / sampling_rate), psd
+
+def band_powers(windows, sampling_rate=SAMPLING_RATE):
+    """Absolute power per band: (windows, channels, len(BANDS)) for a (windows, channels, samples) block"""
+    return integrate_bands(*power_spectral_density(windows, sampling_rate))
+
+def integrate_bands(frequencies, psd):
+    """Sum a PSD over each band's bins: (..., bins) -> (..., len(BANDS))"""
+    resolution = frequencies[1] - frequencies[0]
+    masks = np.array([(frequencies >= low) & (frequencies < high) for low, high in BANDS.values()])
+    # (..., bins) x (bins, bands) -> (..., bands)
+    return psd @ masks.T.astype(psd.dtype) * resolution
+
+def one_hz_bins(frequencies):
+    """(1 Hz bins up to the top band edge, bins x PSD bins masks) for spectra in the backend's 1 Hz steps"""
+    top = int(max(high for _, high in BANDS.values()))
+    centres = [frequency for frequency in range(1, top + 1)
+               if ((frequencies >= frequency - 0.5) & (frequencies < frequency + 0.5)).any()]
+    masks = np.array([(frequencies >= frequency - 0.5) & (frequencies < frequency + 0.5) for frequency in centres])
+    return centres, masks
+
+def spectrum_points(centres, power):
+    """[{frequency, power}] points of 1 Hz bin powers"""
+    return [{'frequency': frequency, 'power': _rounded(value)} for frequency, value in zip(centres, power)]
+
+class SpectralAccumulator:
+    """
+    Welch average of the spectra of a stream of (windows, channels, samples) blocks
+    Only per-channel sums are kept: band powers and the PSD in 1 Hz bins,
+    with the number of windows that went into them. A window is left out of
+    a channel's sums when that channel has a missing or non-finite sample in
+    it. state() is plain JSON and accumulators of separate recordings combine
+    with merge(), so the sums can be computed per subject and cached.
+    """
+
+    def __init__(self, sampling_rate=SAMPLING_RATE, window_size=WINDOW_SIZE, step_size=STEP_SIZE):
+        self.sampling_rate = sampling_rate
+        self.window_size = window_size
+        self.step_size = step_size
+        self.frequencies = np.fft.rfftfreq(window_size, 1.0 / sampling_rate)
+        self.centres, masks = one_hz_bins(self.frequencies)
+        self.bin_weights = (masks / masks.sum(axis=1, keepdims=True)).T
+        self.recordings = 0
+        self.windows = np.zeros(0, dtype=np.int64)
+        self.band_sum = np.zeros((0, len(BANDS)))
+        self.spectrum_sum = np.zeros((0, len(self.centres)))
+
+    def _grow(self, channels):
+        """Make room for `channels` channels; recordings with fewer leave the rest untouched"""
+        extra = channels - len(self.windows)
+        if extra > 0:
+            self.windows = np.concatenate((self.windows, np.zeros(extra, dtype=np.int64)))
+            self.band_sum = np.vstack((self.band_sum, np.zeros((extra, len(BANDS)))))
+            self.spectrum_sum = np.vstack((self.spectrum_sum, np.zeros((extra, len(self.centres)))))
+
+    def add(self, windows, timeline=None):
+        """
+        Fold a (windows, channels, window_size) block of one recording into the sums
+        The band powers of each window are also added to timeline, if given.
+        """
+        self._grow(windows.shape[1])
+        channels = windows.shape[1]
+        self.recordings = max(self.recordings, 1)
+        for start in range(0, len(windows), BLOCK_WINDOWS):
+            block = windows[start:start + BLOCK_WINDOWS]
+            usable = np.isfinite(block).all(axis=-1)
+            if not usable.all():
+                # An all-zero window has zero power, so it adds nothing to the sums
+                block = np.where(usable[..., np.newaxis], block, 0.0)
+            _, psd = power_spectral_density(block, self.sampling_rate)
+            self.windows[:channels] += usable.sum(axis=0)
+            if timeline is not None:
+                powers = integrate_bands(self.frequencies, psd)
+                timeline.add(powers.sum(axis=1), usable.sum(axis=1))
+                self.band_sum[:channels] += powers.sum(axis=0)
+            psd = psd.sum(axis=0)
+            if timeline is None:
+                self.band_sum[:channels] += integrate_bands(self.frequencies, psd)
+            self.spectrum_sum[:channels] += psd @ self.bin_weights
+
+    def merge(self, state):
+        """Add the sums of another accumulator's state()"""
+        windows = np.asarray(state['windows'], dtype=np.int64)
+        self._grow(len(windows))
+        channels = len(windows)
+        self.recordings += state['recordings']
+        self.windows[:channels] += windows
+        if channels:
+            self.band_sum[:channels] += np.asarray(state['band_sum'])
+            self.spectrum_sum[:channels] += np.asarray(state['spectrum_sum'])
+
+    def state(self):
+        """The sums as JSON-compatible lists"""
+        return {
+            'recordings': self.recordings,
+            'windows': self.windows.tolist(),
+            'band_sum': self.band_sum.tolist(),
+            'spectrum_sum': self.spectrum_sum.tolist()
+        }
+
+    def summary(self):
+        """
+        Mean band powers per channel and the channel-averaged spectrum
+        None before any usable window was added.
+        """
+        used = self.windows > 0
+        if not used.any():
+            return None
+        counts = self.windows[used, np.newaxis]
+        band_power = self.band_sum[used] / counts
+        return {
+            'sampling_rate': self.sampling_rate,
+            'window_size': self.window_size,
+            'step_size': self.step_size,
+            'recordings': self.recordings,
+            'channels': int(used.sum()),
+            'windows': int(self.windows.max()),
+            'bands': {name: list(limits) for name, limits in BANDS.items()},
+            'band_power': {name: [_rounded(p) for p in band_power[:, i]] for i, name in enumerate(BANDS)},
+            'spectrum': spectrum_points(self.centres, (self.spectrum_sum[used] / counts).mean(axis=0))
+        }
+
+class BandPowerTimeline:
+    """
+    Band powers averaged over channels, window by window, in at most max_points points
+    Once max_points points are full, neighbouring points are merged in pairs
+    and each point covers twice as many windows from then on, so a recording
+    of any length keeps between max_points / 2 and max_points points.
+    """
+
+    def __init__(self, max_points=MAX_TIMELINE_POINTS):
+        self.max_points = max(2, max_points - max_points % 2)
+        self.windows_per_point = 1
+        # (band power sums, usable channel-windows) of every full point
+        self._points = []
+        self._reset_partial()
+
+    def _reset_partial(self):
+        self._power = np.zeros(len(BANDS))
+        self._count = 0
+        self._windows = 0
+
+    def add(self, power_sums, counts):
+        """Add (windows, bands) band powers summed over each window's usable channels, and their counts"""
+        start = 0
+        while start < len(power_sums):
+            take = min(self.windows_per_point - self._windows, len(power_sums) - start)
+            self._power = self._power + power_sums[start:start + take].sum(axis=0)
+            self._count += int(counts[start:start + take].sum())
+            self._windows += take
+            start += take
+            if self._windows < self.windows_per_point:
+                continue
+            self._points.append((self._power, self._count))
+            self._reset_partial()
+            if len(self._points) == self.max_points:
+                self._points = [(first[0] + second[0], first[1] + second[1])
+                                for first, second in zip(self._points[::2], self._points[1::2])]
+                self.windows_per_point *= 2
+
+    def points(self):
+        """[[delta, theta, alpha, beta, gamma], ...] per point; None for a point without a usable window"""
+        points = self._points + ([(self._power, self._count)] if self._windows else [])
+        return [[_rounded(p) for p in power / count] if count else None for power, count in points]
+
+def spectral_summary(blocks, sampling_rate=SAMPLING_RATE, window_size=WINDOW_SIZE, step_size=STEP_SIZE,
+                     max_timeline_points=MAX_TIMELINE_POINTS):
+    """
+    Band powers and average spectrum of a recording read as (rows, channels) blocks
+    The rows after the last window of a block are carried into the next one,
+    so the windows are those of the whole recording and memory stays bounded
+    by a block plus one window. Returns the sidecar document, or None if the
+    recording is shorter than one window (or has no usable window).
+    """
+    accumulator = SpectralAccumulator(sampling_rate, window_size, step_size)
+    timeline = BandPowerTimeline(max_timeline_points)
+    num_samples = 0
+    num_windows = 0
+    carry = None
+
+    for block in blocks:
+        num_samples += len(block)
+        if carry is not None and len(carry):
+            block = np.concatenate((carry, block))
+        count = (len(block) - window_size) // step_size + 1 if len(block) >= window_size else 0
+        if count:
+            # (windows, channels, window_size) views; nothing is copied until a batch is transformed
+            windows = sliding_window_view(block, window_size, axis=0)[:(count - 1) * step_size + 1:step_size]
+            accumulator.add(windows, timeline)
+            num_windows += count
+        carry = block[count * step_size:]
+
+    summary = accumulator.summary()
+    if summary is None:
+        return None
+    return {
+        'format': SIDECAR_FORMAT_VERSION,
+        'sampling_rate': sampling_rate,
+        'window_size': window_size,
+        'step_size': step_size,
+        'channels': summary['channels'],
+        'samples': num_samples,
+        'windows': num_windows,
+        'bands': summary['bands'],
+        # Mean absolute power per band and channel over the whole recording
+        'band_power': summary['band_power'],
+        # Band powers averaged over channels and over timeline_windows consecutive windows per point
+        'band_power_timeline': timeline.points(),
+        'timeline_windows': timeline.windows_per_point,
+        'spectrum': summary['spectrum']
+    }
+
+def sidecar_path(input_path):
+    return input_path + SIDECAR_SUFFIX
+
+def write_sidecar(input_path, summary):
+    """Write the summary next to the recording, atomically"""
+    path = sidecar_path(input_path)
+    staging_path = path + f".tmp{os.getpid()}"
+    with open(staging_path, 'w') as f:
+        json.dump(summary, f, separators=(',', ':'))
+    os.replace(staging_path, path)
+    return path
+
+def recording_blocks(file_path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    (rows, channels) blocks of a CSV recording, a chunk at a time
+    The channels are the columns numeric in every row of the first chunk (so a
+    header row and e.g. a text label column are dropped); later missing or
+    non-numeric cells are NaN, which leaves their windows out of that channel.
+    """
+    numeric = None
+    for chunk in iter_numeric_csv(file_path, chunk_rows, strict=False):
+        if numeric is None:
+            numeric = ~np.isnan(chunk).any(axis=0)
+            if not numeric.any():
+                raise ValueError(f"No numeric channels in {file_path}")
+        yield chunk if numeric.all() else np.ascontiguousarray(chunk[:, numeric])
+    if numeric is None:
+        raise ValueError(f"No data in {file_path}")
+
+def _rounded(value):
+    # Six significant digits keep the sidecar compact
+    return float(f"{value:.6g}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute band-power features and write the spectral sidecar")
+    parser.add_argument('input_file', help="Recording CSV (rows are samples, columns are channels)")
+    parser.add_argument('--sampling-rate', type=float, default=SAMPLING_RATE)
+    args = parser.parse_args()
+
+    try:
+        from dataset_sidecar import FEATURE_COLUMNS
+        blocks = recording_blocks(args.input_file)
+        first = next(blocks)
+        if first.shape[1] in (FEATURE_COLUMNS, FEATURE_COLUMNS + 1):
+            raise ValueError(f"{args.input_file} is a feature table (one row per window), not a recording; "
+                             f"its spectrum is in the dataset sidecar written by simple_preprocess.py")
+        summary = spectral_summary(itertools.chain([first], blocks), args.sampling_rate)
+        if summary is None:
+            raise ValueError(f"Recording is shorter than one {WINDOW_SIZE}-sample window")
+        path = write_sidecar(args.input_file, summary)
+        print(json.dumps({'success': True, 'sidecar': path, 'windows': summary['windows']}))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Cancelling a prediction run part-way through
+A run cancelled mid-inference (SIGTERM in one-shot mode, op=cancel in worker
+mode) must answer with the cancelled result document only, exit or answer
+promptly, and leave nothing in the result cache: neither an entry nor a
+staging file.
+
+Usage:
+    python -m pytest -q test_cancellation.py
+"""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import predict_with_model as pwm
+from prediction_progress import PROGRESS_BATCH_ROWS
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'predict_with_model.py')
+
+# Enough rows for several predict batches (one-shot) or chunks (worker) after the cancellation point
+ROWS = 5 * PROGRESS_BATCH_ROWS
+CHUNK_ROWS = 4096
+
+# Generous bound on the time from cancel to exit or answer; a predict batch takes well under a second
+CANCEL_TIMEOUT_S = 30
+
+pytestmark = pytest.mark.skipif(not os.path.exists(pwm.MODEL_PATH), reason="model file not available")
+
+@pytest.fixture
+def feature_file(tmp_path):
+    path = tmp_path / 'features.csv'
+    rng = np.random.default_rng(0)
+    header = ','.join(f"feature_{i}" for i in range(54)) + ',label'
+    np.savetxt(path, np.column_stack([rng.random((ROWS, 54)), rng.integers(0, 5, ROWS)]),
+               delimiter=',', fmt='%.5f', header=header, comments='')
+    return str(path)
+
+def wait_for_rows(stream):
+    """Read JSON lines until a progress event reports predicted rows"""
+    for line in stream:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        if message.get('event') == 'progress' and message['progress'].get('rows_done', 0) > 0:
+            return
+    pytest.fail("prediction finished before it could be cancelled")
+
+def assert_cancelled(result):
+    assert result['success'] is False
+    assert result['cancelled'] is True
+    assert 'timings' in result
+    for partial in ('predictions', 'statistics', 'sample_count'):
+        assert partial not in result
+
+def assert_cache_empty(cache_dir):
+    assert not os.path.exists(cache_dir) or os.listdir(cache_dir) == []
+
+@pytest.mark.parametrize('chunk_rows', [None, CHUNK_ROWS])
+def test_sigterm_leaves_no_result_or_cache_entry(tmp_path, feature_file, chunk_rows):
+    cache_dir = str(tmp_path / 'cache')
+    command = [sys.executable, SCRIPT, '--progress', '--cache-dir', cache_dir, feature_file]
+    if chunk_rows:
+        command += ['--chunk-rows', str(chunk_rows)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    try:
+        wait_for_rows(process.stderr)
+        threading.Thread(target=process.stderr.read, daemon=True).start()
+        process.send_signal(signal.SIGTERM)
+        output, _ = process.communicate(timeout=CANCEL_TIMEOUT_S)
+    finally:
+        process.kill()
+
+    assert process.returncode == 0
+    assert_cancelled(json.loads(output))
+    assert_cache_empty(cache_dir)
+
+def test_worker_cancel_leaves_no_cache_entry(tmp_path, feature_file):
+    cache_dir = str(tmp_path / 'cache')
+    worker = subprocess.Popen([sys.executable, SCRIPT, '--worker', '--cache-dir', cache_dir],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              text=True, bufsize=1)
+    try:
+        assert json.loads(worker.stdout.readline())['event'] == 'ready'
+        worker.stdin.write(json.dumps({'id': 1, 'input_file': feature_file, 'chunk_rows': CHUNK_ROWS,
+                                       'progress': True}) + "\n")
+        wait_for_rows(worker.stdout)
+
+        worker.stdin.write(json.dumps({'id': 2, 'op': 'cancel', 'target': 1}) + "\n")
+        cancelled_at = time.monotonic()
+        result = None
+        for line in worker.stdout:
+            message = json.loads(line)
+            if message.get('id') == 1 and 'result' in message:
+                result = message['result']
+                break
+        assert result is not None and time.monotonic() - cancelled_at < CANCEL_TIMEOUT_S
+        assert_cancelled(result)
+
+        worker.stdin.write(json.dumps({'id': 3, 'op': 'stats'}) + "\n")
+        for line in worker.stdout:
+            message = json.loads(line)
+            if message.get('id') == 3:
+                assert message['stats']['result_cache']['stores'] == 0
+                assert message['stats']['result_cache']['entries'] == 0
+                break
+        worker.stdin.close()
+        worker.wait(timeout=CANCEL_TIMEOUT_S)
+    finally:
+        worker.kill()
+
+    assert_cache_empty(cache_dir)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Window statistics against a direct per-window loop
+block_statistics (and the streaming extractor built on it) must give the
+mean, variance, maximum and minimum of every window as computing them window
+by window does, including for a final segment shorter than the window, a
+block shorter than the window and windows holding NaN cells.
+
+Usage:
+    python -m pytest -q test_window_stats.py
+"""
+
+import csv
+import functools
+
+import numpy as np
+import pytest
+
+import simple_preprocess
+from window_stats import SlidingWindowStats, block_statistics
+
+def naive_statistics(values, window_size, starts):
+    """(means, variances, maxima, minima) window by window; NaN for windows holding a NaN"""
+    windows = [values[start:start + window_size] for start in starts]
+    channels = values.shape[1]
+    if not windows:
+        empty = np.empty((0, channels))
+        return empty, empty, empty, empty
+    return (np.array([window.mean(axis=0) for window in windows]),
+            np.array([window.var(axis=0) for window in windows]),
+            np.array([window.max(axis=0) for window in windows]),
+            np.array([window.min(axis=0) for window in windows]))
+
+def assert_statistics_equal(actual, expected):
+    for name, a, e in zip(('mean', 'variance', 'maximum', 'minimum'), actual, expected):
+        assert a.shape == e.shape, name
+        np.testing.assert_allclose(a, e, rtol=1e-9, atol=1e-9, err_msg=name)
+
+def recording(rows, channels, seed=0):
+    # Random walk around a large DC offset, like an EEG channel
+    rng = np.random.default_rng(seed)
+    return 4000.0 + np.cumsum(rng.normal(0.0, 5.0, (rows, channels)), axis=0)
+
+@pytest.mark.parametrize('rows, window_size, step', [
+    (1000, 64, 1),
+    (1000, 64, 7),
+    (1000, 64, 64),
+    (1003, 100, 33),   # the last segment of the rows is shorter than the window
+    (64, 64, 1),       # a single window spanning the whole block
+])
+def test_block_statistics_match_direct_computation(rows, window_size, step):
+    values = recording(rows, 3)
+    starts = np.arange(0, rows - window_size + 1, step)
+    assert_statistics_equal(block_statistics(values, window_size, starts),
+                            naive_statistics(values, window_size, starts))
+
+def test_block_shorter_than_window_has_no_windows():
+    values = recording(40, 3)
+    statistics = block_statistics(values, 64, np.arange(0))
+    assert all(s.shape == (0, 3) for s in statistics)
+
+def test_nan_cells_make_only_their_windows_nan():
+    values = recording(500, 2, seed=1)
+    values[123, 1] = np.nan
+    starts = np.arange(0, 500 - 50 + 1, 5)
+    mean, variance, maximum, minimum = block_statistics(values, 50, starts)
+    expected = naive_statistics(values, 50, starts)
+    assert_statistics_equal((mean, variance, maximum, minimum), expected)
+    holding = (starts <= 123) & (123 < starts + 50)
+    assert np.isnan(mean[holding, 1]).all() and not np.isnan(mean[~holding, 1]).any()
+    assert not np.isnan(mean[:, 0]).any()
+
+def test_sliding_window_stats_matches_direct_computation():
+    values = recording(300, 2, seed=2)
+    window_size = 32
+    running = SlidingWindowStats(window_size, 2)
+    for index, row in enumerate(values.tolist()):
+        running.push(row)
+        if index + 1 >= window_size:
+            start = index + 1 - window_size
+            expected = naive_statistics(values, window_size, [start])
+            actual = tuple(np.array([s]) for s in running.statistics())
+            assert_statistics_equal(actual, expected)
+
+@pytest.mark.parametrize('chunk_rows', [100, 511, 4096])
+@pytest.mark.parametrize('step_size', [8, 100, 256])
+def test_streamed_running_statistics_match_direct_features(tmp_path, monkeypatch, chunk_rows, step_size):
+    """The features of running statistics over chunks (some shorter than a window) equal the direct ones"""
+    values = recording(3 * simple_preprocess.WINDOW_SIZE + 77, 14, seed=3)
+    path = tmp_path / "s05.csv"
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([f"ch{i}" for i in range(values.shape[1])])
+        writer.writerows(values.tolist())
+
+    monkeypatch.setattr(simple_preprocess.eeg_io, 'iter_numeric_csv',
+                        functools.partial(simple_preprocess.eeg_io.iter_numeric_csv, chunk_rows=chunk_rows))
+    running = list(simple_preprocess.stream_window_blocks(str(path), 5, step_size=step_size, running_stats=True))
+
+    window_size = simple_preprocess.WINDOW_SIZE
+    # A window is used once a row follows it
+    starts = np.arange(0, len(values) - window_size, step_size)
+    expected = simple_preprocess.statistics_feature_rows(naive_statistics(values, window_size, starts), 5)
+    assert len(running) == len(expected)
+    np.testing.assert_allclose(np.array(running), np.array(expected), rtol=1e-9, atol=1e-9)
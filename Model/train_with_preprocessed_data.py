@@ -53,6 +53,18 @@ y = data.iloc[:, -1].values   # Last column (main.disorder)
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     """)
     
+    print_status("   Or split by subject, using the subject index of the feature store")
+    print("""
+# Hold out whole subjects so no subject's windows are both trained and tested on;
+# each subject's rows are a contiguous range, so nothing is scanned
+from feature_store import load_feature_store, subject_split
+store = load_feature_store('normalized_eeg_data.features')
+train_subjects, test_subjects = subject_split(store.subject_names(), (0.8, 0.2), seed=42)
+train, test = store.select_subjects(train_subjects), store.select_subjects(test_subjects)
+X_train, y_train = train.features, train.labels
+X_test, y_test = test.features, test.labels
+    """)
+    
     print_status("3. Load the existing model")
     print("""
 # Load the existing model
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Training run controller: early stopping, learning-rate schedule, checkpoint/resume and artifacts
+A run trains for at most its epoch budget but stops once the validation loss
+has not improved for `patience` epochs, and keeps the weights of the best
+epoch of the whole run. The learning rate is multiplied by `lr_factor`
+whenever the validation loss has not improved for `lr_patience` epochs.
+Without a validation split the training loss is monitored instead.
+
+The full training state (weights, optimizer, epoch) is backed up to
+<output>/checkpoint after every epoch. Starting the same run again with the
+same output directory after an interruption resumes from the last completed
+epoch; the checkpoint is removed once a run finishes. The early-stopping and
+learning-rate patience counts start again after a resume.
+
+Every run leaves in its output directory, without displaying anything:
+    model.keras               the trained model (weights of the best epoch)
+    model.normalization.json  the training rows' normalization parameters, for the predictor
+    metrics.json              test loss and accuracy, per-class report, confusion matrix, epochs run, best epoch
+    history.csv               per-epoch metrics and learning rate, across resumes
+    confusion_matrix.png      and history.png (requires matplotlib)
+"""
+
+import csv
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+from normalization import params_path_for
+
+DEFAULT_OUTPUT_DIR = "training_output"
+DEFAULT_EPOCHS = 1000
+DEFAULT_PATIENCE = 20
+DEFAULT_LR_PATIENCE = 8
+DEFAULT_LR_FACTOR = 0.5
+DEFAULT_MIN_LR = 1e-6
+
+CHECKPOINT_DIR = "checkpoint"
+MODEL_NAME = "model.keras"
+METRICS_NAME = "metrics.json"
+HISTORY_NAME = "history.csv"
+BEST_WEIGHTS_NAME = "best.weights.h5"
+CONFUSION_MATRIX_NAME = "confusion_matrix.png"
+HISTORY_PLOT_NAME = "history.png"
+
+def print_status(message):
+    """Print status message with timestamp"""
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] {message}")
+
+def training_callbacks(output_dir, monitor='val_loss', patience=DEFAULT_PATIENCE, lr_patience=DEFAULT_LR_PATIENCE,
+                       lr_factor=DEFAULT_LR_FACTOR, min_lr=DEFAULT_MIN_LR, best=None):
+    """
+    Keras callbacks of a run: backup every epoch, best weights, learning-rate schedule, early stopping, history log
+    best is the lowest monitored loss of the run so far (when resuming), so
+    the best weights are only replaced by better ones.
+    """
+    import tensorflow as tf
+
+    return [
+        # The previous epoch's backup is kept too, for a run killed while writing the latest one
+        tf.keras.callbacks.BackupAndRestore(os.path.join(output_dir, CHECKPOINT_DIR), save_freq='epoch',
+                                            double_checkpoint=True),
+        tf.keras.callbacks.ModelCheckpoint(os.path.join(output_dir, BEST_WEIGHTS_NAME), monitor=monitor,
+                                           save_best_only=True, save_weights_only=True, initial_value_threshold=best),
+        # Before the logger, so the learning rate of each epoch is logged
+        tf.keras.callbacks.ReduceLROnPlateau(monitor=monitor, factor=lr_factor, patience=lr_patience,
+                                             min_lr=min_lr, verbose=1),
+        tf.keras.callbacks.EarlyStopping(monitor=monitor, patience=patience, verbose=1),
+        tf.keras.callbacks.CSVLogger(os.path.join(output_dir, HISTORY_NAME), append=True)
+    ]
+
+def read_history(output_dir):
+    """Per-epoch rows of history.csv as {column: float}; an epoch repeated after a resume keeps its last row"""
+    path = os.path.join(output_dir, HISTORY_NAME)
+    if not os.path.exists(path):
+        return []
+    epochs = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            values = {key: float(value) for key, value in row.items() if value not in (None, '')}
+            epochs[int(values['epoch'])] = values
+    return [epochs[epoch] for epoch in sorted(epochs)]
+
+def train(model, train_dataset, validation_dataset=None, class_weights=None, output_dir=DEFAULT_OUTPUT_DIR,
+          epochs=DEFAULT_EPOCHS, patience=DEFAULT_PATIENCE, lr_patience=DEFAULT_LR_PATIENCE,
+          lr_factor=DEFAULT_LR_FACTOR, min_lr=DEFAULT_MIN_LR):
+    """
+    Fit a compiled model under the controller; returns a summary of the run
+    Resumes from output_dir's checkpoint if an earlier run was interrupted.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    monitor = 'val_loss' if validation_dataset is not None else 'loss'
+    checkpoint = os.path.join(output_dir, CHECKPOINT_DIR)
+    best_weights = os.path.join(output_dir, BEST_WEIGHTS_NAME)
+    resumed = os.path.isdir(checkpoint) and bool(os.listdir(checkpoint))
+    if resumed:
+        print_status(f"Resuming from the checkpoint in {checkpoint}")
+    else:
+        # Left by a finished run; this run starts from scratch
+        for path in (os.path.join(output_dir, HISTORY_NAME), best_weights):
+            if os.path.exists(path):
+                os.remove(path)
+    history = read_history(output_dir)
+    best = min((row[monitor] for row in history if monitor in row), default=None)
+
+    callbacks = training_callbacks(output_dir, monitor, patience, lr_patience, lr_factor, min_lr, best)
+    early_stopping = callbacks[3]
+    started = time.perf_counter()
+    model.fit(train_dataset, epochs=epochs, validation_data=validation_dataset, class_weight=class_weights,
+              callbacks=callbacks)
+    seconds = time.perf_counter() - started
+
+    # The weights of the best epoch of the whole run, including epochs before a resume
+    if os.path.exists(best_weights):
+        try:
+            model.load_weights(best_weights)
+            os.remove(best_weights)
+        except (OSError, ValueError) as e:
+            print_status(f"Could not restore the best weights, keeping the last epoch's: {e}")
+
+    history = read_history(output_dir)
+    best = min(history, key=lambda row: row.get(monitor, np.inf)) if history else {}
+    epochs_run = len(history)
+    return {
+        'monitor': monitor,
+        'epochs_budget': epochs,
+        'epochs_run': epochs_run,
+        'stopped_early': epochs_run < epochs,
+        'stopped_epoch': early_stopping.stopped_epoch + 1 if early_stopping.stopped_epoch else None,
+        'best_epoch': int(best['epoch']) + 1 if best else None,
+        f'best_{monitor}': best.get(monitor),
+        'final_learning_rate': float(np.asarray(model.optimizer.learning_rate)),
+        'resumed': resumed,
+        'train_seconds': round(seconds, 3)
+    }
+
+def evaluate(model, test_dataset):
+    """
+    Test loss, accuracy, per-class report and confusion matrix of a model on a labelled dataset
+    Returns (metrics, the per-class report as text).
+    """
+    from sklearn.metrics import classification_report, confusion_matrix
+
+    loss, accuracy = model.evaluate(test_dataset, verbose=0)
+    y_true = np.concatenate([y for _, y in test_dataset], axis=0).astype(int)
+    y_pred = np.argmax(model.predict(test_dataset, verbose=0), axis=1)
+    labels = np.unique(np.concatenate([y_true, y_pred]))
+    metrics = {
+        'test_loss': float(loss),
+        'test_accuracy': float(accuracy),
+        'test_rows': int(len(y_true)),
+        'labels': labels.tolist(),
+        'classification_report': classification_report(y_true, y_pred, labels=labels, output_dict=True,
+                                                        zero_division=0),
+        'confusion_matrix': confusion_matrix(y_true, y_pred, labels=labels).tolist()
+    }
+    return metrics, classification_report(y_true, y_pred, labels=labels, zero_division=0)
+
+def _pyplot():
+    """matplotlib.pyplot on the non-interactive Agg backend, or None if matplotlib is not installed"""
+    try:
+        import matplotlib
+    except ImportError:
+        return None
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def plot_confusion_matrix(path, matrix, labels):
+    """Save a confusion matrix heatmap with the count in every cell"""
+    plt = _pyplot()
+    if plt is None:
+        return None
+    matrix = np.asarray(matrix)
+    fig, ax = plt.subplots(figsize=(10, 8))
+    image = ax.imshow(matrix, cmap='Blues')
+    fig.colorbar(image, ax=ax)
+    ticks = np.arange(len(labels))
+    ax.set_xticks(ticks, [str(label) for label in labels])
+    ax.set_yticks(ticks, [str(label) for label in labels])
+    threshold = matrix.max() / 2 if matrix.size else 0
+    for (row, column), count in np.ndenumerate(matrix):
+        ax.text(column, row, str(count), ha='center', va='center',
+                color='white' if count > threshold else 'black')
+    ax.set_xlabel('Predicted Label')
+    ax.set_ylabel('True Label')
+    ax.set_title('Confusion Matrix')
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+def plot_history(path, history):
+    """Save accuracy and loss curves (train and validation) per epoch"""
+    plt = _pyplot()
+    if plt is None or not history:
+        return None
+    epochs = [int(row['epoch']) + 1 for row in history]
+    fig, axes = plt.subplots(1, 2, figsize=(12, 5))
+    for ax, metric, title in ((axes[0], 'accuracy', 'Model Accuracy'), (axes[1], 'loss', 'Model Loss')):
+        for key, label in ((metric, f'Train {metric.title()}'), (f'val_{metric}', f'Validation {metric.title()}')):
+            if key in history[0]:
+                ax.plot(epochs, [row.get(key, np.nan) for row in history], label=label)
+        ax.set_title(title)
+        ax.set_ylabel(metric.title())
+        ax.set_xlabel('Epoch')
+        ax.legend(loc='upper left')
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+def normalizes_inputs(model):
+    """True if the model's first layer standardizes its inputs (a Keras Normalization layer)"""
+    import tensorflow as tf
+
+    return bool(model.layers) and isinstance(model.layers[0], tf.keras.layers.Normalization)
+
+def write_artifacts(output_dir, model, metrics, normalization=None):
+    """
+    Save the model, metrics.json and the plots to output_dir; returns the paths written
+    normalization, the NormalizationParams of the training rows, is saved
+    next to the model, marked in_model when the model standardizes its
+    inputs itself so the predictor does not scale them a second time.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = [os.path.join(output_dir, MODEL_NAME)]
+    model.save(paths[0])
+    if normalization is not None:
+        normalization.in_model = normalizes_inputs(model)
+        paths.append(normalization.save(params_path_for(paths[0])))
+
+    metrics_path = os.path.join(output_dir, METRICS_NAME)
+    staging = metrics_path + ".tmp"
+    with open(staging, 'w') as f:
+        json.dump(metrics, f, indent=2)
+    os.replace(staging, metrics_path)
+    paths.append(metrics_path)
+
+    plots = [plot_history(os.path.join(output_dir, HISTORY_PLOT_NAME), read_history(output_dir))]
+    if 'confusion_matrix' in metrics:
+        plots.append(plot_confusion_matrix(os.path.join(output_dir, CONFUSION_MATRIX_NAME),
+                                           metrics['confusion_matrix'], metrics['labels']))
+    if any(path is None for path in plots) and _pyplot() is None:
+        print_status("matplotlib is not installed, plots not written")
+    paths.extend(path for path in plots if path)
+    return paths
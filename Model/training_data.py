@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Training input pipeline: a table converted once to binary, split once, fed from memory
+A CSV table is converted to a float32 feature store in a cache directory the
+first time it is trained on, keyed by the hash of its content (taken from its
+sidecar when it has one), so later runs neither parse nor count it. Feature
+stores are used as they are. The train/validation/test row indices are drawn
+with a fixed seed and saved next to the cached store, so every run and every
+epoch sees the same splits.
+
+One pass over the training rows gives their count, class weights and the
+per-feature mean and variance for the model's Normalization layer, kept as
+NormalizationParams to be saved with the model (see normalization.py). Each
+split is copied into memory and fed to tf.data with .cache() and prefetching;
+a split too large for --max-memory-mb is streamed from the memory-mapped store
+instead.
+
+Usage:
+    python training_data.py <table.csv | table.features> [--subject-split] [--seed 0]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+from dataset_sidecar import content_hash
+from feature_store import (STORE_SUFFIX, import_csv, is_feature_store, load_feature_store, subject_split,
+                           table_header)
+from normalization import ColumnStatistics
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.environ.get('EEG_TRAINING_CACHE', os.path.join(script_dir, ".training_cache"))
+
+SPLIT_NAMES = ('train', 'validation', 'test')
+SPLIT_FRACTIONS = (0.7, 0.15, 0.15)
+SPLIT_SUFFIX = ".npz"
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_MEMORY_BYTES = 1 << 30
+
+# Rows read from the store at a time, and the shuffle buffer of a streamed split
+CHUNK_ROWS = 16384
+STREAM_SHUFFLE_BUFFER = 10000
+
+def training_store(path, cache_dir=None):
+    """
+    (feature store path, content hash) of a training table
+    A CSV file is converted to a store in cache_dir on first use; the last
+    column of its header is the label.
+    """
+    sha256 = content_hash(path)
+    if is_feature_store(path):
+        return path, sha256
+
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    store_path = os.path.join(cache_dir, sha256[:16] + STORE_SUFFIX)
+    if not is_feature_store(store_path):
+        header = table_header(path)
+        if not header:
+            raise ValueError(f"{path} has no header row naming its label column")
+        os.makedirs(cache_dir, exist_ok=True)
+        staging = store_path + ".tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        import_csv(path, staging, label_column=header[-1], dtype=np.float32)
+        try:
+            os.replace(staging, store_path)
+        except OSError:
+            # Another run converted the same table first
+            shutil.rmtree(staging, ignore_errors=True)
+    return store_path, sha256
+
+def split_indices(store, seed=0, by_subject=False, fractions=SPLIT_FRACTIONS):
+    """
+    Sorted row indices of the train, validation and test splits, and the subjects of each (or None)
+    Rows are assigned at random with the given seed, or whole subjects are
+    (feature_store.subject_split) when by_subject is set.
+    """
+    if by_subject:
+        if not store.subjects():
+            raise ValueError("splitting by subject needs a feature store with a subject index")
+        groups = subject_split(store.subject_names(), fractions, seed)
+        ranges = {entry['subject']: (entry['start'], entry['stop']) for entry in store.subjects()}
+        indices = [np.sort(np.concatenate([np.arange(*ranges[name]) for name in group] or [np.empty(0, np.int64)]))
+                   for group in groups]
+        return indices, groups
+
+    order = np.random.default_rng(seed).permutation(len(store))
+    bounds = np.cumsum([int(fraction * len(store)) for fraction in fractions[:-1]])
+    return [np.sort(part) for part in np.split(order, bounds)], None
+
+def load_splits(store, key, seed=0, by_subject=False, cache_dir=None):
+    """
+    split_indices, saved under cache_dir the first time and read back afterwards
+    key identifies the table's content, so edited tables get new splits.
+    """
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    mode = 'subject' if by_subject else 'row'
+    path = os.path.join(cache_dir, f"{key[:16]}.split-{mode}-{seed}{SPLIT_SUFFIX}")
+    try:
+        with np.load(path) as saved:
+            if int(saved['rows']) == len(store):
+                groups = json.loads(str(saved['groups'])) if by_subject else None
+                return [saved[name] for name in SPLIT_NAMES], groups
+    except (OSError, KeyError, ValueError):
+        pass
+
+    indices, groups = split_indices(store, seed, by_subject)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        staging = path + ".tmp" + SPLIT_SUFFIX
+        np.savez(staging, rows=len(store), groups=json.dumps(groups), **dict(zip(SPLIT_NAMES, indices)))
+        os.replace(staging, path)
+    except OSError:
+        pass  # the splits are seeded, so an unsaved copy is drawn the same way next time
+    return indices, groups
+
+class TrainingData:
+    """
+    Splits of one training table with the statistics of its training rows
+    Attributes: rows, num_features, num_classes, class_weights ({class: weight},
+    'balanced' as in scikit-learn), mean and variance of every feature over the
+    training rows with their NormalizationParams as normalization, and the row
+    indices and subjects of each split.
+    """
+
+    def __init__(self, store_path, key, seed=0, by_subject=False, cache_dir=None,
+                 max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES):
+        self.store_path = store_path
+        self.store = load_feature_store(store_path)
+        if self.store.labels is None:
+            raise ValueError(f"the feature store at {store_path} has no label column")
+        self.key = key
+        self.seed = seed
+        self.rows = len(self.store)
+        self.num_features = self.store.features.shape[1]
+        self.max_memory_bytes = max_memory_bytes
+
+        indices, self.subjects = load_splits(self.store, key, seed, by_subject, cache_dir)
+        self.indices = dict(zip(SPLIT_NAMES, indices))
+        self._arrays = {}
+        self._summarize_training_rows()
+        labels = np.asarray(self.store.labels)
+        self.num_classes = int(labels.max()) + 1 if len(labels) else 0
+
+        # 'balanced' weights n / (classes * count); classes missing from training keep weight 1
+        present = self.class_counts > 0
+        weights = np.ones(self.num_classes)
+        weights[:len(present)][present] = self.class_counts.sum() / (present.sum() * self.class_counts[present])
+        self.class_weights = dict(enumerate(weights.tolist()))
+
+    def _in_memory(self, name):
+        return len(self.indices[name]) * self.num_features * 4 <= self.max_memory_bytes
+
+    def _chunks(self, name):
+        """(features, labels) of a split's rows in row order, CHUNK_ROWS at a time, as float32"""
+        indices = self.indices[name]
+        for start in range(0, len(indices), CHUNK_ROWS):
+            rows = indices[start:start + CHUNK_ROWS]
+            yield (np.asarray(self.store.features[rows], dtype=np.float32),
+                   np.asarray(self.store.labels[rows], dtype=np.float32))
+
+    def _summarize_training_rows(self):
+        """Row count, class counts and feature statistics of the training split in one pass, keeping it in memory if it fits"""
+        statistics = ColumnStatistics()
+        class_counts = np.zeros(0, dtype=np.int64)
+        keep = self._in_memory('train')
+        features, labels = [], []
+        for X, y in self._chunks('train'):
+            statistics.update(X)
+            counts = np.bincount(y.astype(np.int64))
+            class_counts = np.pad(class_counts, (0, max(0, len(counts) - len(class_counts))))
+            class_counts[:len(counts)] += counts
+            if keep:
+                features.append(X)
+                labels.append(y)
+        if keep:
+            self._arrays['train'] = self._stack(features, labels)
+        if statistics.rows == 0:
+            raise ValueError("the training split is empty")
+        self.train_rows = statistics.rows
+        self.class_counts = class_counts
+        self.mean = statistics.mean
+        self.variance = statistics.m2 / statistics.count
+        header = table_header(self.store_path)
+        self.normalization = statistics.params(header[:-1] if header else None,
+                                               {'file': os.path.basename(self.store_path.rstrip(os.sep)),
+                                                'sha256': self.key, 'split': 'train', 'seed': self.seed})
+
+    def _stack(self, features, labels):
+        X = np.concatenate(features) if features else np.empty((0, self.num_features), np.float32)
+        y = np.concatenate(labels) if labels else np.empty(0, np.float32)
+        # (samples, timesteps, features) for the Conv1D/LSTM layers
+        return X.reshape(len(X), 1, self.num_features), y
+
+    def arrays(self, name):
+        """(X, y) of a split in memory, X shaped (rows, 1, features)"""
+        if name not in self._arrays:
+            self._arrays[name] = self._stack(*zip(*self._chunks(name))) if len(self.indices[name]) else self._stack([], [])
+        return self._arrays[name]
+
+    def dataset(self, name, batch_size=DEFAULT_BATCH_SIZE, shuffle=False):
+        """
+        tf.data.Dataset of (features, label) batches of a split, or None if the split is empty
+        Shuffling is reseeded from the run's seed and differs between epochs.
+        """
+        import tensorflow as tf
+
+        if not len(self.indices[name]):
+            return None
+        if self._in_memory(name):
+            X, y = self.arrays(name)
+            dataset = tf.data.Dataset.from_tensor_slices((X, y)).cache()
+            if shuffle:
+                dataset = dataset.shuffle(len(X), seed=self.seed, reshuffle_each_iteration=True)
+        else:
+            def generate():
+                for X, y in self._chunks(name):
+                    yield X.reshape(len(X), 1, self.num_features), y
+            signature = (tf.TensorSpec((None, 1, self.num_features), tf.float32), tf.TensorSpec((None,), tf.float32))
+            dataset = tf.data.Dataset.from_generator(generate, output_signature=signature).unbatch()
+            if shuffle:
+                dataset = dataset.shuffle(STREAM_SHUFFLE_BUFFER, seed=self.seed, reshuffle_each_iteration=True)
+        return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+    def describe(self):
+        return {
+            'store': self.store_path,
+            'rows': self.rows,
+            'features': self.num_features,
+            'classes': self.num_classes,
+            'splits': {name: len(indices) for name, indices in self.indices.items()},
+            'subjects': dict(zip(SPLIT_NAMES, self.subjects)) if self.subjects else None,
+            'class_weights': self.class_weights,
+            'in_memory': {name: self._in_memory(name) for name in SPLIT_NAMES}
+        }
+
+def load_training_data(path, seed=0, by_subject=False, cache_dir=None, max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES):
+    """TrainingData of a CSV file or feature store, converting and splitting it only the first time"""
+    store_path, key = training_store(path, cache_dir)
+    return TrainingData(store_path, key, seed, by_subject, cache_dir, max_memory_bytes)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert and split a training table, and show its splits")
+    parser.add_argument('table', help="CSV file or feature store")
+    parser.add_argument('--subject-split', action='store_true', help="Split by subject (needs a subject index)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache-dir', default=None, help=f"Converted tables and splits (default {DEFAULT_CACHE_DIR})")
+    args = parser.parse_args()
+
+    try:
+        data = load_training_data(args.table, args.seed, args.subject_split, args.cache_dir)
+        print(json.dumps(dict(success=True, **data.describe()), indent=2))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
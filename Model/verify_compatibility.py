@@ -1,120 +1,497 @@
 #!/usr/bin/env python3
 """
 Verify that the normalized EEG data is compatible with the model that uses EE_PCA_1.csv
+
+Every row of the new file is checked: header and column count against the
+reference, NaN/infinite values, feature values within [0, 1] and label values
+in the label domain. A CSV file is split into byte ranges validated in
+parallel by worker processes, each parsing its range in blocks with NumPy;
+a feature store is split into row ranges. The summary gives, per check, how
+many rows or values failed and where the first one is.
+
+The summary is kept in the file's sidecar (see dataset_sidecar.py) together
+with the column statistics gathered on the way, so validating an unchanged
+file against the same reference again does not read it.
+
+Usage:
+    python verify_compatibility.py [EE_PCA_1.csv] [normalized_eeg_data.csv]
+    python verify_compatibility.py --json [--workers 4] [--labels 0,1,2,3,4] <reference> <upload.csv>
+
+With --json the summary is printed as one JSON document and the exit status
+is 0 only if the file is valid, so it can run as an upload pre-flight.
 """
 
 import os
-import csv
+import sys
+import json
+import time
+import argparse
+import multiprocessing
 from datetime import datetime
 
+import numpy as np
+
+from dataset_sidecar import build_sidecar, file_identity, load_sidecar, same_content, sidecar_path, write_sidecar
+from eeg_io import read_header
+from feature_store import LABEL_COLUMN, is_feature_store, load_feature_store, read_table, table_header
+from file_hashing import input_hash
+from normalization import ColumnStatistics
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+REFERENCE_FILE = os.path.join(script_dir, "EE_PCA_1.csv")
+
+CHECKS = ('header', 'column_count', 'non_finite', 'range', 'labels')
+
+# Normalized values can overshoot [0, 1] by rounding; EE_PCA_1.csv itself reaches 1.0000000000000002
+RANGE_TOLERANCE = 1e-9
+
+# Bytes of CSV (or rows of a store) parsed at a time by each worker
+BLOCK_BYTES = 4 << 20
+BLOCK_ROWS = 16384
+
+# Ranges smaller than this are not worth a worker process of their own
+MIN_BYTES_PER_WORKER = 8 << 20
+MIN_ROWS_PER_WORKER = 100_000
+
 def print_status(message):
     """Print status message with timestamp"""
     timestamp = datetime.now().strftime("%H:%M:%S")
     print(f"[{timestamp}] {message}")
 
-def read_csv_file(file_path, max_rows=None):
-    """Read CSV file and return data as list of lists"""
-    data = []
+def same_column_name(original, new):
+    """Column names match if equal, or if both are the same number (e.g. '0' and '0.0')"""
+    if original == new:
+        return True
+    try:
+        return float(original) == float(new)
+    except ValueError:
+        return False
+
+# --- Full-file validation ---
+
+def _finding():
+    return {'count': 0, 'first_row': None, 'first_line': None, 'first_column': None, 'first_value': None}
+
+def _note(finding, count, row, line=None, column=None, value=None):
+    """Add count failures to a check and remember the first one"""
+    finding['count'] += int(count)
+    if finding['first_row'] is None:
+        finding['first_row'] = int(row)
+        finding['first_line'] = None if line is None else int(line)
+        finding['first_column'] = None if column is None else int(column)
+        if isinstance(value, int):
+            finding['first_value'] = value
+        elif value is not None:
+            value = float(value)
+            finding['first_value'] = value if np.isfinite(value) else str(value)
+
+def _new_partial():
+    """Findings of one range; rows and lines are counted from the start of the range"""
+    partial = {name: _finding() for name in CHECKS if name != 'header'}
+    partial.update(rows=0, lines=0, label_counts={}, statistics=ColumnStatistics())
+    return partial
+
+def _first_cell(mask):
+    """(row, column) of the first True cell of a 2-D mask"""
+    row = int(np.argmax(mask.any(axis=1)))
+    return row, int(np.argmax(mask[row]))
+
+def _check_block(partial, block, rows, lines, has_labels, label_values):
+    """
+    Vectorized value checks of a (rows, columns) block
+    rows and lines give each block row's row index and line number (or None) within the range.
+    """
+    lines = lines if lines is not None else [None] * len(rows)
+    partial['statistics'].update(block)
+
+    non_finite = ~np.isfinite(block)
+    count = np.count_nonzero(non_finite)
+    if count:
+        i, column = _first_cell(non_finite)
+        _note(partial['non_finite'], count, rows[i], lines[i], column, block[i, column])
+
+    features = block[:, :-1] if has_labels else block
+    # Non-finite values are counted above, not again here (NaN compares False already; inf does not)
+    out_of_range = (features < -RANGE_TOLERANCE) | ((features > 1 + RANGE_TOLERANCE) & np.isfinite(features))
+    count = np.count_nonzero(out_of_range)
+    if count:
+        i, column = _first_cell(out_of_range)
+        _note(partial['range'], count, rows[i], lines[i], column, features[i, column])
+
+    if has_labels:
+        labels = block[:, -1]
+        finite = np.isfinite(labels)
+        in_domain = finite & (labels >= 0) & (labels == np.floor(labels))
+        if label_values is not None:
+            in_domain &= np.isin(labels, label_values)
+        bad = finite & ~in_domain
+        count = np.count_nonzero(bad)
+        if count:
+            i = int(np.argmax(bad))
+            _note(partial['labels'], count, rows[i], lines[i], block.shape[1] - 1, labels[i])
+        values, counts = np.unique(labels[in_domain], return_counts=True)
+        for value, n in zip(values.tolist(), counts.tolist()):
+            key = str(int(value))
+            partial['label_counts'][key] = partial['label_counts'].get(key, 0) + n
+
+def _parse_lines(partial, lines, width):
+    """
+    Parse a list of CSV lines into (block, row indexes, line numbers)
+    Rows with the wrong number of cells are recorded under column_count and
+    left out of the block; non-numeric cells become NaN.
+    """
+    first_row, first_line = partial['rows'], partial['lines']
+    try:
+        block = np.loadtxt(lines, delimiter=',', ndmin=2, comments=None)
+        if block.shape[1] == width:
+            if len(block) == len(lines):
+                line_numbers = np.arange(first_line, first_line + len(lines))
+            else:
+                # loadtxt skips empty lines
+                line_numbers = np.array([first_line + i for i, line in enumerate(lines) if line])
+            partial['rows'] += len(block)
+            return block, np.arange(first_row, first_row + len(block)), line_numbers
+    except ValueError:
+        pass
+
+    values, rows, line_numbers = [], [], []
+    for i, line in enumerate(lines):
+        if not line.strip():
+            continue
+        cells = line.split(',')
+        row = partial['rows']
+        partial['rows'] += 1
+        if len(cells) != width:
+            _note(partial['column_count'], 1, row, first_line + i, value=len(cells))
+            continue
+        parsed = []
+        for cell in cells:
+            try:
+                parsed.append(float(cell))
+            except ValueError:
+                parsed.append(np.nan)
+        values.append(parsed)
+        rows.append(row)
+        line_numbers.append(first_line + i)
+    return np.array(values, dtype=np.float64).reshape(-1, width), rows, line_numbers
+
+def _validate_csv_range(task):
+    """Validate the lines in bytes [start, stop) of a CSV file; returns the range's findings"""
+    path, start, stop, width, has_labels, label_values = task
+    partial = _new_partial()
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = stop - start
+        carry = b''
+        while remaining > 0 or carry:
+            data = f.read(min(BLOCK_BYTES, remaining)) if remaining > 0 else b''
+            # A file truncated while it is read ends the range
+            remaining = remaining - len(data) if data else 0
+            data = carry + data
+            if remaining > 0:
+                # Keep the incomplete last line for the next block
+                cut = data.rfind(b'\n') + 1
+                data, carry = data[:cut], data[cut:]
+                if not data:
+                    continue
+            else:
+                carry = b''
+            text = data.decode('utf-8', errors='replace')
+            lines = text.split('\n')
+            if text.endswith('\n'):
+                lines.pop()
+            if not lines:
+                continue
+            block, rows, line_numbers = _parse_lines(partial, [line.rstrip('\r') for line in lines], width)
+            if len(block):
+                _check_block(partial, block, rows, line_numbers, has_labels, label_values)
+            partial['lines'] += len(lines)
+    return partial
+
+def _validate_store_range(task):
+    """Validate rows [start, stop) of a feature store"""
+    path, start, stop, width, has_labels, label_values = task
+    partial = _new_partial()
+    store = load_feature_store(path)[start:stop]
+    for part in store.iter_chunks(BLOCK_ROWS):
+        block = part.table()
+        rows = np.arange(partial['rows'], partial['rows'] + len(block))
+        partial['rows'] += len(block)
+        _check_block(partial, block, rows, None, has_labels, label_values)
+    return partial
+
+def _csv_ranges(path, parts):
+    """(first data line number, byte ranges) splitting the data lines of a CSV file into parts"""
+    size = os.path.getsize(path)
+    has_header = read_header(path) is not None
+    with open(path, 'rb') as f:
+        # Skip blank lines and the header, if any
+        line_number = 1
+        start = 0
+        for line in f:
+            if line.strip():
+                if has_header:
+                    start += len(line)
+                    line_number += 1
+                break
+            start += len(line)
+            line_number += 1
+
+        bounds = [start]
+        for i in range(1, parts):
+            f.seek(max(start + (size - start) * i // parts - 1, bounds[-1]))
+            f.readline()  # to the start of the next line
+            bounds.append(max(f.tell(), bounds[-1]))
+        bounds.append(size)
+    return line_number, [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+def _merge(partials, line_offsets):
+    """Combine the findings of consecutive ranges, making row and line numbers file-relative"""
+    merged = _new_partial()
+    for partial, line_offset in zip(partials, line_offsets):
+        for name in CHECKS[1:]:
+            finding = partial[name]
+            if finding['count']:
+                line = None if finding['first_line'] is None else finding['first_line'] + line_offset
+                target = merged[name]
+                target['count'] += finding['count']
+                if target['first_row'] is None:
+                    target.update(finding, count=target['count'], first_row=finding['first_row'] + merged['rows'],
+                                  first_line=line)
+        for key, n in partial['label_counts'].items():
+            merged['label_counts'][key] = merged['label_counts'].get(key, 0) + n
+        merged['statistics'].merge(partial['statistics'])
+        merged['rows'] += partial['rows']
+    return merged
+
+def _header_check(header, reference_header, width):
+    """Header equality against the reference's columns (without its label column for unlabelled files)"""
+    finding = _finding()
+    if header is None:
+        finding['missing'] = True
+        finding['count'] = 1
+        return finding
+    expected = reference_header[:width] if reference_header else None
+    if expected is None:
+        return finding
+    for column in range(max(len(header), len(expected))):
+        name = header[column] if column < len(header) else None
+        if column >= len(expected) or name is None or not same_column_name(expected[column], name):
+            finding['count'] += 1
+            if finding['first_column'] is None:
+                finding['first_column'] = column
+                finding['first_value'] = name
+                finding['expected'] = expected[column] if column < len(expected) else None
+    return finding
+
+def validate_file(file_path, reference_file=REFERENCE_FILE, workers=None, label_values=None):
+    """
+    Validate every row of a CSV file or feature store against the reference format
+    The file may have the reference's columns, or all but its last (label)
+    column. Returns a summary dict: 'valid', 'rows', 'columns' and, per
+    check, the number of failures ('count': rows for column_count and labels,
+    values otherwise) and the first failure's row, line (CSV) and column.
+
+    The summary is saved in the file's sidecar and returned from there, with
+    'cached': True, while neither the file nor the reference has changed.
+    """
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    store = is_feature_store(file_path)
+    labels_key = None if label_values is None else sorted(float(value) for value in label_values)
+
+    sidecar = load_sidecar(file_path)
+    cached = _cached_summary(sidecar, reference_file, labels_key)
+    if cached is not None:
+        elapsed = time.perf_counter() - started
+        return dict(cached, file=file_path, reference=reference_file, cached=True,
+                    seconds=round(elapsed, 6), mb_per_s=None)
+    identity = file_identity(file_path)
+
+    reference_header = table_header(reference_file)
+    if reference_header:
+        reference_width = len(reference_header)
+    else:
+        reference_width = read_table(reference_file, max_rows=1)[1].shape[1]
+
+    header = table_header(file_path)
+    if store:
+        size = sum(entry.stat().st_size for entry in os.scandir(file_path) if entry.is_file())
+    else:
+        size = os.path.getsize(file_path)
+    if header is not None:
+        width = len(header)
+    else:
+        first = read_table(file_path, max_rows=1, strict=False)[1]
+        width = first.shape[1] if len(first) else 0
+    has_labels = width == reference_width
+    label_values = None if label_values is None else np.asarray(label_values, dtype=np.float64)
+
+    if store:
+        rows_total = len(load_feature_store(file_path))
+        parts = max(1, min(workers, rows_total // MIN_ROWS_PER_WORKER))
+        bounds = np.linspace(0, rows_total, parts + 1).astype(int)
+        tasks = [(file_path, a, b, width, has_labels, label_values) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+        validate_range = _validate_store_range
+        first_line = None
+    else:
+        parts = max(1, min(workers, size // MIN_BYTES_PER_WORKER))
+        first_line, ranges = _csv_ranges(file_path, parts)
+        tasks = [(file_path, a, b, width, has_labels, label_values) for a, b in ranges]
+        validate_range = _validate_csv_range
+
+    if len(tasks) > 1:
+        with multiprocessing.Pool(len(tasks)) as pool:
+            pending = pool.map_async(validate_range, tasks)
+            # Hash the file for its sidecar while the workers read it
+            sha256 = sidecar['sha256'] if sidecar else input_hash(file_path)
+            partials = pending.get()
+    else:
+        partials = [validate_range(task) for task in tasks]
+        sha256 = sidecar['sha256'] if sidecar else input_hash(file_path)
+
+    line_offsets = []
+    offset = first_line
+    for partial in partials:
+        line_offsets.append(offset or 0)
+        if offset is not None:
+            offset += partial['lines']
+    merged = _merge(partials, line_offsets)
+
+    checks = {'header': _header_check(header, reference_header, width)}
+    for name in CHECKS[1:]:
+        checks[name] = merged[name]
+    if width not in (reference_width, reference_width - 1):
+        # The whole file has the wrong shape; every row counts
+        checks['column_count']['count'] = merged['rows']
+        checks['column_count'].update(first_row=0, first_line=first_line, first_value=width)
+    for name, finding in checks.items():
+        finding['ok'] = finding['count'] == 0
+        checks[name] = {key: value for key, value in finding.items() if value is not None}
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        'success': True,
+        'valid': merged['rows'] > 0 and all(check['ok'] for check in checks.values()),
+        'file': file_path,
+        'reference': reference_file,
+        'format': 'store' if store else 'csv',
+        'rows': merged['rows'],
+        'columns': width,
+        'expected_columns': reference_width,
+        'has_labels': has_labels,
+        'checks': checks,
+        'label_counts': dict(sorted(merged['label_counts'].items(), key=lambda item: int(item[0]))),
+        'bytes': size,
+        'workers': len(tasks),
+        'seconds': round(elapsed, 6),
+        'mb_per_s': round(size / 1e6 / elapsed, 1) if elapsed > 0 else None
+    }
+
+    reference_identity = file_identity(reference_file)
+    validation = {
+        'reference': {'file': os.path.basename(reference_file), 'size': reference_identity[0],
+                      'mtime_ns': reference_identity[1], 'sha256': input_hash(reference_file)},
+        'labels': labels_key,
+        'summary': summary
+    }
+    label_column = None
+    if has_labels:
+        label_column = header[-1] if header else LABEL_COLUMN
     try:
-        with open(file_path, 'r') as f:
-            csv_reader = csv.reader(f)
-            for i, row in enumerate(csv_reader):
-                if max_rows and i >= max_rows:
-                    break
-                # Convert string values to float where possible
-                processed_row = []
-                for val in row:
-                    try:
-                        processed_row.append(float(val))
-                    except (ValueError, TypeError):
-                        processed_row.append(val)
-                data.append(processed_row)
-        return data
-    except Exception as e:
-        print(f"Error reading {file_path}: {e}")
-        return []
-
-def verify_compatibility(original_file, new_file):
+        write_sidecar(file_path, build_sidecar(
+            file_path, merged['statistics'], merged['label_counts'], header, width, label_column,
+            rows=merged['rows'], sha256=sha256, identity=identity, validation=validation,
+            spectral=(sidecar or {}).get('spectral')))
+    except OSError:
+        pass  # the sidecar is an optimization; a read-only upload directory must not fail validation
+    return summary
+
+def _cached_summary(sidecar, reference_file, labels_key):
+    """The validation summary stored in a matching sidecar, if it was made against the same reference and labels"""
+    validation = (sidecar or {}).get('validation')
+    if not validation or validation.get('labels') != labels_key:
+        return None
+    try:
+        if not same_content(validation['reference'], reference_file):
+            return None
+    except (OSError, KeyError):
+        return None
+    return validation['summary']
+
+def _where(check):
+    """' (first at line L, column C: V)' for a failed check"""
+    parts = []
+    if 'first_line' in check:
+        parts.append(f"line {check['first_line']}")
+    elif 'first_row' in check:
+        parts.append(f"row {check['first_row']}")
+    if 'first_column' in check:
+        parts.append(f"column {check['first_column']}")
+    place = ', '.join(parts)
+    if 'first_value' in check:
+        place = f"{place}: {check['first_value']}" if place else str(check['first_value'])
+    return f" (first at {place})" if place else ""
+
+def verify_compatibility(original_file, new_file, workers=None, label_values=None):
     """Verify that the new file is compatible with the original file"""
     print_status(f"Reading original file: {original_file}")
-    original_data = read_csv_file(original_file, max_rows=5)
-    
-    print_status(f"Reading new file: {new_file}")
-    new_data = read_csv_file(new_file, max_rows=5)
-    
-    if not original_data or not new_data:
+    print_status(f"Validating every row of new file: {new_file}")
+    try:
+        summary = validate_file(new_file, original_file, workers, label_values)
+    except (OSError, ValueError) as e:
+        print(f"Error reading {new_file}: {e}")
         print_status("Error: Could not read one or both files")
         return False
-    
-    # Check header compatibility
-    original_header = original_data[0]
-    new_header = new_data[0]
-    
+    checks = summary['checks']
+
     print_status("Checking header compatibility...")
-    header_match = True
-    if len(original_header) != len(new_header):
-        print_status(f"Header length mismatch: {len(original_header)} vs {len(new_header)}")
-        header_match = False
-    else:
-        for i, (orig, new) in enumerate(zip(original_header, new_header)):
-            if str(orig) != str(new):
-                print_status(f"Header mismatch at position {i}: '{orig}' vs '{new}'")
-                header_match = False
-    
-    if header_match:
+    header = checks['header']
+    if header.get('missing'):
+        print_status("✗ New file has no header row")
+    elif header['ok']:
         print_status("✓ Headers match!")
     else:
-        print_status("✗ Headers do not match")
-    
-    # Check data format compatibility
+        print_status(f"✗ Headers do not match: {header['count']} columns differ, first at position "
+                     f"{header['first_column']}: '{header.get('expected')}' vs '{header.get('first_value')}'")
+
     print_status("Checking data format compatibility...")
-    
-    # Check number of columns
-    original_cols = len(original_data[1])
-    new_cols = len(new_data[1])
-    if original_cols != new_cols:
-        print_status(f"✗ Column count mismatch: {original_cols} vs {new_cols}")
+    if summary['columns'] not in (summary['expected_columns'], summary['expected_columns'] - 1):
+        print_status(f"✗ Column count mismatch: {summary['expected_columns']} vs {summary['columns']}")
+    elif not checks['column_count']['ok']:
+        print_status(f"✗ {checks['column_count']['count']} rows do not have {summary['columns']} columns"
+                     + _where(checks['column_count']))
     else:
-        print_status(f"✓ Column count matches: {original_cols}")
-    
-    # Check value ranges (should be between 0 and 1 for normalized data)
+        labels = "" if summary['has_labels'] else " (features only, no target column)"
+        print_status(f"✓ Column count matches: {summary['columns']}{labels}")
+
     print_status("Checking value ranges...")
-    
-    # Check original data
-    original_in_range = True
-    for row in original_data[1:]:  # Skip header
-        for i, val in enumerate(row[:-1]):  # Skip target column
-            if isinstance(val, (int, float)) and (val < 0 or val > 1):
-                print_status(f"✗ Original data out of range [0,1]: {val} at column {i}")
-                original_in_range = False
-                break
-    
-    if original_in_range:
-        print_status("✓ Original data values are in range [0,1]")
-    
-    # Check new data
-    new_in_range = True
-    for row in new_data[1:]:  # Skip header
-        for i, val in enumerate(row[:-1]):  # Skip target column
-            if isinstance(val, (int, float)) and (val < 0 or val > 1):
-                print_status(f"✗ New data out of range [0,1]: {val} at column {i}")
-                new_in_range = False
-                break
-    
-    if new_in_range:
+    if checks['non_finite']['ok']:
+        print_status("✓ No missing, non-numeric or infinite values")
+    else:
+        print_status(f"✗ {checks['non_finite']['count']} missing, non-numeric or infinite values"
+                     + _where(checks['non_finite']))
+    if checks['range']['ok']:
         print_status("✓ New data values are in range [0,1]")
-    
-    # Check target column values
-    print_status("Checking target column values...")
-    
-    original_targets = [row[-1] for row in original_data[1:]]
-    new_targets = [row[-1] for row in new_data[1:]]
-    
-    print_status(f"Original target values: {original_targets}")
-    print_status(f"New target values: {new_targets}")
-    
+    else:
+        print_status(f"✗ {checks['range']['count']} values out of range [0,1]" + _where(checks['range']))
+
+    if summary['has_labels']:
+        print_status("Checking target column values...")
+        print_status(f"Target values: {summary['label_counts']}")
+        if not checks['labels']['ok']:
+            print_status(f"✗ {checks['labels']['count']} target values outside the label domain"
+                         + _where(checks['labels']))
+
+    if summary.get('cached'):
+        print_status(f"Validated {summary['rows']} rows earlier; file unchanged, result read from "
+                     f"{os.path.basename(sidecar_path(new_file))}")
+    else:
+        print_status(f"Validated {summary['rows']} rows in {summary['seconds']:.2f}s "
+                     f"({summary['mb_per_s']} MB/s, {summary['workers']} worker{'s' if summary['workers'] > 1 else ''})")
+
     # Overall compatibility
-    if header_match and original_cols == new_cols and original_in_range and new_in_range:
+    if summary['valid']:
         print_status("✓ The files are compatible!")
         return True
     else:
@@ -123,20 +500,44 @@ def verify_compatibility(original_file, new_file):
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Check normalized features against the format of EE_PCA_1.csv")
+    parser.add_argument('original_file', nargs='?', default="EE_PCA_1.csv")
+    parser.add_argument('new_file', nargs='?', default="normalized_eeg_data.csv",
+                        help="CSV file or feature store (default normalized_eeg_data.csv)")
+    parser.add_argument('--json', action='store_true',
+                        help="Print the validation summary as JSON; exit status 1 if the file is not valid")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Processes validating parts of the file (0 = one per CPU core; default)")
+    parser.add_argument('--labels', default=None,
+                        help="Comma-separated allowed target values (default: any non-negative integer)")
+    args = parser.parse_args()
+    label_values = [float(value) for value in args.labels.split(',')] if args.labels else None
+
+    original_file = args.original_file
+    new_file = args.new_file
+
+    if args.json:
+        try:
+            for path in (original_file, new_file):
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"File '{path}' not found")
+            summary = validate_file(new_file, original_file, args.workers or None, label_values)
+        except Exception as e:
+            summary = {'success': False, 'valid': False, 'error': str(e)}
+        print(json.dumps(summary))
+        sys.exit(0 if summary['valid'] else 1)
+
     print_status("Starting compatibility verification")
-    
-    original_file = "EE_PCA_1.csv"
-    new_file = "normalized_eeg_data.csv"
-    
+
     if not os.path.exists(original_file):
         print_status(f"Error: Original file '{original_file}' not found!")
         return
-    
+
     if not os.path.exists(new_file):
         print_status(f"Error: New file '{new_file}' not found!")
         return
-    
-    verify_compatibility(original_file, new_file)
+
+    verify_compatibility(original_file, new_file, args.workers or None, label_values)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
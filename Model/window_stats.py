@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Sliding-window running statistics for streaming feature extraction
+With NumPy, block_statistics gives the mean, variance, maximum and minimum of
+every window of a block of rows at once in O(rows) per channel, however much
+the windows overlap: mean and variance from cumulative sums of x and x^2,
+maximum and minimum from a vectorized van Herk/Gil-Werman sliding extreme.
+That keeps heavily overlapping windows (small step sizes) cheap.
+
+SlidingWindowStats is the standard-library fallback: Welford-style add/remove
+updates for mean and variance and monotonic deques for maximum and minimum,
+so each new sample costs O(1) per channel.
+"""
+
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:  # SlidingWindowStats does not need NumPy
+    np = None
+
+# Recompute the running sums from the buffered window after this many windows'
+# worth of samples, so rounding error from the add/remove updates cannot build up
+RESYNC_WINDOWS = 8
+
+def sliding_moments(values, window_size, starts):
+    """
+    Mean and population variance of values[start:start + window_size] for every start, per column
+    values is (rows, channels); NaN cells make their windows' statistics NaN.
+    The cumulative sums are of the values minus their column mean, which keeps
+    them small and the variance free of cancellation from a large DC offset.
+    """
+    finite = ~np.isnan(values)
+    count = finite.sum(axis=0)
+    shift = np.where(finite, values, 0.0).sum(axis=0) / np.maximum(count, 1)
+    shifted = np.where(finite, values - shift, 0.0)
+
+    zero = np.zeros((1, values.shape[1]))
+    sums = np.concatenate((zero, np.cumsum(shifted, axis=0)))
+    squares = np.concatenate((zero, np.cumsum(shifted * shifted, axis=0)))
+    missing = np.concatenate((zero, np.cumsum(~finite, axis=0)))
+
+    ends = starts + window_size
+    mean = (sums[ends] - sums[starts]) / window_size
+    variance = np.maximum((squares[ends] - squares[starts]) / window_size - mean * mean, 0.0)
+    invalid = (missing[ends] - missing[starts]) > 0
+    mean = np.where(invalid, np.nan, mean + shift)
+    variance = np.where(invalid, np.nan, variance)
+    return mean, variance
+
+def sliding_extreme(values, window_size, starts, ufunc):
+    """
+    ufunc (np.maximum or np.minimum) over values[start:start + window_size] for every start, per column
+    The rows are cut into segments of window_size; a window spans the tail of
+    one segment and the head of the next, so its extreme is that of a suffix
+    and a prefix accumulation, two passes over the rows in all.
+    """
+    rows, channels = values.shape
+    segments = -(-rows // window_size)
+    padded = np.empty((segments * window_size, channels))
+    padded[:rows] = values
+    padded[rows:] = values[-1] if rows else 0.0
+    blocks = padded.reshape(segments, window_size, channels)
+    prefix = ufunc.accumulate(blocks, axis=1).reshape(-1, channels)
+    suffix = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(-1, channels)
+    return ufunc(suffix[starts], prefix[starts + window_size - 1])
+
+def block_statistics(values, window_size, starts):
+    """(means, variances, maxima, minima), each (len(starts), channels), of the windows of a block of rows"""
+    starts = np.asarray(starts, dtype=np.intp)
+    mean, variance = sliding_moments(values, window_size, starts)
+    return (mean, variance,
+            sliding_extreme(values, window_size, starts, np.maximum),
+            sliding_extreme(values, window_size, starts, np.minimum))
+
+class SlidingWindowStats:
+    """Mean, population variance, max and min of the last `window_size` rows, per channel, without NumPy"""
+
+    def __init__(self, window_size, channels):
+        self.window_size = window_size
+        self.channels = channels
+        self.rows = deque()
+        self.pushed = 0
+
+        # Rows that could not be used (non-numeric or too short) in the window;
+        # statistics are unavailable while there are any
+        self.invalid = 0
+        self._dirty = False
+        self._since_resync = 0
+
+        self._mean = [0.0] * channels
+        self._m2 = [0.0] * channels
+        # Per channel: (index, value) with values decreasing (max) or increasing (min)
+        self._max = [deque() for _ in range(channels)]
+        self._min = [deque() for _ in range(channels)]
+
+    def push(self, row):
+        """Add a row (a sequence of at least `channels` numbers, or None if unusable) and drop the oldest once full"""
+        index = self.pushed
+        self.pushed += 1
+        values = row[:self.channels] if row is not None else None
+
+        dropped = None
+        if len(self.rows) == self.window_size:
+            dropped = self.rows.popleft()
+            if dropped is None:
+                self.invalid -= 1
+        self.rows.append(values)
+
+        if values is None:
+            self.invalid += 1
+            self._dirty = True
+            return
+        if self._dirty:
+            return
+
+        self._update_extremes(index, values)
+
+        self._since_resync += 1
+        if self._since_resync >= RESYNC_WINDOWS * self.window_size:
+            self._resync()
+            return
+
+        if dropped is None:
+            # Growing window: Welford add
+            n = len(self.rows)
+            for ch in range(self.channels):
+                x = values[ch]
+                delta = x - self._mean[ch]
+                self._mean[ch] += delta / n
+                self._m2[ch] += delta * (x - self._mean[ch])
+        else:
+            # Full window: add the new sample and remove the oldest in one step
+            n = self.window_size
+            for ch in range(self.channels):
+                x, y = values[ch], dropped[ch]
+                old_mean = self._mean[ch]
+                self._mean[ch] = old_mean + (x - y) / n
+                self._m2[ch] += (x - y) * (x - self._mean[ch] + y - old_mean)
+
+    def statistics(self):
+        """(means, variances, maxima, minima) of the current window, or None while it holds unusable rows"""
+        if self.invalid:
+            return None
+        if self._dirty:
+            self._resync()
+
+        n = len(self.rows)
+        first = self.pushed - n
+        for ch in range(self.channels):
+            while self._max[ch][0][0] < first:
+                self._max[ch].popleft()
+            while self._min[ch][0][0] < first:
+                self._min[ch].popleft()
+        return (
+            list(self._mean),
+            [max(m2 / n, 0.0) for m2 in self._m2],
+            [queue[0][1] for queue in self._max],
+            [queue[0][1] for queue in self._min]
+        )
+
+    # --- Internal helpers ---
+
+    def _update_extremes(self, index, values):
+        first = index - self.window_size + 1
+        for ch in range(self.channels):
+            x = values[ch]
+            queue = self._max[ch]
+            while queue and queue[-1][1] <= x:
+                queue.pop()
+            queue.append((index, x))
+            if queue[0][0] < first:
+                queue.popleft()
+
+            queue = self._min[ch]
+            while queue and queue[-1][1] >= x:
+                queue.pop()
+            queue.append((index, x))
+            if queue[0][0] < first:
+                queue.popleft()
+
+    def _resync(self):
+        """Recompute everything directly from the buffered rows"""
+        n = len(self.rows)
+        first = self.pushed - n
+        for ch in range(self.channels):
+            column = [values[ch] for values in self.rows]
+            mean = sum(column) / n
+            self._mean[ch] = mean
+            self._m2[ch] = sum((x - mean) ** 2 for x in column)
+
+            self._max[ch].clear()
+            self._min[ch].clear()
+        for offset, values in enumerate(self.rows):
+            self._update_extremes(first + offset, values)
+        self._dirty = False
+        self._since_resync = 0
@@ -0,0 +1,113 @@
+package main
+
+import (
+	"context"
+	"encoding/json"
+	"fmt"
+	"math"
+	"os"
+	"os/exec"
+	"strings"
+)
+
+// --- Dataset Sidecar ---
+
+const (
+	datasetScriptPath = "../Model/dataset_sidecar.py"
+	datasetSuffix     = ".meta.json"
+)
+
+// datasetRecording is the shape of the recording a table describes
+type datasetRecording struct {
+	Kind         string  `json:"kind"`
+	Channels     int     `json:"channels"`
+	SamplingRate int     `json:"sampling_rate"`
+	DurationS    float64 `json:"duration_s"`
+}
+
+// datasetSpectral is the spectrum of the recordings a feature table was
+// extracted from, recorded by simple_preprocess.py
+type datasetSpectral struct {
+	Spectrum json.RawMessage `json:"spectrum"`
+}
+
+// datasetSidecar is the part of dataset_sidecar.py's sidecar used for file metadata
+type datasetSidecar struct {
+	Size      int64            `json:"size"`
+	Rows      int64            `json:"rows"`
+	Columns   int              `json:"column_count"`
+	Recording datasetRecording `json:"recording"`
+	Spectral  *datasetSpectral `json:"spectral"`
+}
+
+// readDatasetSidecar returns the schema and statistics sidecar of an upload.
+// verify_compatibility.py writes it while validating; when it is missing or
+// was written for a file of another size, dataset_sidecar.py (re)computes it.
+// The sidecar is nil for formats it does not describe.
+func readDatasetSidecar(ctx context.Context, filePath string) (*datasetSidecar, error) {
+	if !validatable(filePath) {
+		return nil, nil
+	}
+	sidecarPath := strings.TrimRight(filePath, string(os.PathSeparator)) + datasetSuffix
+	sidecar, err := loadDatasetSidecar(sidecarPath)
+	if err == nil && sidecarMatches(sidecar, filePath) {
+		return sidecar, nil
+	}
+
+	cmd := exec.CommandContext(ctx, pythonPath(), datasetScriptPath, filePath)
+	if out, err := cmd.CombinedOutput(); err != nil {
+		return nil, fmt.Errorf("dataset_sidecar.py failed: %v: %s", err, strings.TrimSpace(string(out)))
+	}
+	return loadDatasetSidecar(sidecarPath)
+}
+
+func loadDatasetSidecar(sidecarPath string) (*datasetSidecar, error) {
+	raw, err := os.ReadFile(sidecarPath)
+	if err != nil {
+		return nil, err
+	}
+	var sidecar datasetSidecar
+	if err := json.Unmarshal(raw, &sidecar); err != nil {
+		return nil, fmt.Errorf("invalid dataset sidecar %s: %v", sidecarPath, err)
+	}
+	return &sidecar, nil
+}
+
+// sidecarMatches is a cheap staleness check: the sidecar recorded the file's
+// current size. Feature store directories are left to dataset_sidecar.py.
+func sidecarMatches(sidecar *datasetSidecar, filePath string) bool {
+	info, err := os.Stat(filePath)
+	return err == nil && (info.IsDir() || info.Size() == sidecar.Size)
+}
+
+// recordingDuration is the upload's recording length for AnalysisResult, or
+// fallback when it is not known
+func recordingDuration(ctx context.Context, filePath string, fallback string) string {
+	sidecar, err := readDatasetSidecar(ctx, filePath)
+	if err != nil || sidecar == nil || sidecar.Rows == 0 {
+		return fallback
+	}
+	return formatDuration(sidecar.Recording.DurationS)
+}
+
+// formatDuration renders seconds as e.g. "1 hour 2 minutes 5 seconds"
+func formatDuration(seconds float64) string {
+	total := int64(math.Round(seconds))
+	var parts []string
+	for _, unit := range []struct {
+		name    string
+		seconds int64
+	}{{"hour", 3600}, {"minute", 60}, {"second", 1}} {
+		n := total / unit.seconds
+		total %= unit.seconds
+		if n == 0 && !(unit.seconds == 1 && len(parts) == 0) {
+			continue
+		}
+		name := unit.name
+		if n != 1 {
+			name += "s"
+		}
+		parts = append(parts, fmt.Sprintf("%d %s", n, name))
+	}
+	return strings.Join(parts, " ")
+}
@@ -1,7 +1,7 @@
 package main
 
 import (
-	"bytes"
+	"context"
 	"database/sql"
 	"encoding/csv"
 	"encoding/json"
@@ -9,7 +9,6 @@ import (
 	"log"
 	"net/http"
 	"os"
-	"os/exec"
 	"path/filepath"
 	"strconv"
 	"strings"
@@ -113,6 +112,24 @@ type AnalysisResult struct {
 	TemporalData      string  `json:"temporal_data" gorm:"type:text"`
 }
 
+// PredictionTiming records where a prediction run spent its time, from the
+// timings block of the script's output
+type PredictionTiming struct {
+	gorm.Model
+	JobID              uint    `json:"job_id" gorm:"index"`
+	ResultID           uint    `json:"result_id" gorm:"index"`
+	ImportSeconds      float64 `json:"import_seconds"`
+	CacheLookupSeconds float64 `json:"cache_lookup_seconds"`
+	ModelLoadSeconds   float64 `json:"model_load_seconds"`
+	CSVParseSeconds    float64 `json:"csv_parse_seconds"`
+	ScalingSeconds     float64 `json:"scaling_seconds"`
+	PredictSeconds     float64 `json:"predict_seconds"`
+	StatisticsSeconds  float64 `json:"statistics_seconds"`
+	JSONEncodeSeconds  float64 `json:"json_encode_seconds"`
+	TotalSeconds       float64 `json:"total_seconds"`
+	PeakRSSBytes       int64   `json:"peak_rss_bytes"`
+}
+
 // Report represents a generated report
 type Report struct {
 	gorm.Model
@@ -135,6 +152,7 @@ type FileMetadata struct {
 	Channels        int    `json:"channels"`
 	SamplingRate    int    `json:"sampling_rate"`
 	Duration        string `json:"duration"`
+	Rows            int64  `json:"rows"`
 	FileType        string `json:"file_type"`
 	Validated       bool   `json:"validated" gorm:"default:false"`
 	ValidationError string `json:"validation_error"`
@@ -202,6 +220,9 @@ func main() {
 	// Initialize Database
 	initDB()
 
+	// Start warm prediction workers
+	startPredictionPool()
+
 	// Setup Router
 	r := gin.Default()
 
@@ -243,6 +264,8 @@ func main() {
 		protected.PUT("/queue/:id/priority", updatePriorityHandler)
 		protected.PUT("/queue/:id/status", updateStatusHandler)
 		protected.DELETE("/queue/:id", cancelJobHandler)
+		protected.GET("/predictor/stats", predictorStatsHandler)
+		protected.GET("/predictor/timings", predictorTimingsHandler)
 
 		// Results
 		protected.GET("/results", getResultsHandler)
@@ -297,7 +320,7 @@ func initDB() {
 	}
 
 	// Auto-migrate the schema
-	err = DB.AutoMigrate(&User{}, &AnalysisJob{}, &AnalysisResult{}, &Report{}, &FileMetadata{}, &EEGSubject{}, &EEGDataPoint{})
+	err = DB.AutoMigrate(&User{}, &AnalysisJob{}, &AnalysisResult{}, &Report{}, &FileMetadata{}, &EEGSubject{}, &EEGDataPoint{}, &PredictionTiming{})
 	if err != nil {
 		log.Fatal("Failed to migrate database:", err)
 	}
@@ -809,6 +832,7 @@ func deleteFileHandler(c *gin.Context) {
 
 	// Delete physical file
 	os.Remove(job.FilePath)
+	forgetValidation(job.FilePath)
 
 	// Delete from database
 	DB.Delete(&job)
@@ -853,14 +877,62 @@ func cancelJobHandler(c *gin.Context) {
 		return
 	}
 
-	job.Status = "cancelled"
+	// Only the cancellation columns: a concurrent completion is not undone, nor progress overwritten
 	now := time.Now()
-	job.CompletedAt = &now
-	DB.Save(&job)
+	if result := DB.Model(&job).Where("status <> ?", "completed").
+		Updates(map[string]interface{}{"status": "cancelled", "completed_at": now}); result.Error != nil {
+		c.JSON(http.StatusInternalServerError, gin.H{"error": "Failed to cancel job"})
+		return
+	} else if result.RowsAffected == 0 {
+		c.JSON(http.StatusBadRequest, gin.H{"error": "Cannot cancel completed job"})
+		return
+	}
+
+	// Stop the job's prediction so it stops using CPU that queued jobs need
+	cancelRunningJob(job.ID)
 
 	c.JSON(http.StatusOK, gin.H{"message": "Job cancelled successfully"})
 }
 
+func predictorStatsHandler(c *gin.Context) {
+	if predictor == nil {
+		c.JSON(http.StatusOK, gin.H{"enabled": false, "workers": []interface{}{}})
+		return
+	}
+
+	c.JSON(http.StatusOK, gin.H{"enabled": true, "workers": predictor.BatchStats()})
+}
+
+func predictorTimingsHandler(c *gin.Context) {
+	var summary struct {
+		Runs              int64   `json:"runs"`
+		ImportSeconds     float64 `json:"import_seconds"`
+		ModelLoadSeconds  float64 `json:"model_load_seconds"`
+		CSVParseSeconds   float64 `json:"csv_parse_seconds"`
+		ScalingSeconds    float64 `json:"scaling_seconds"`
+		PredictSeconds    float64 `json:"predict_seconds"`
+		StatisticsSeconds float64 `json:"statistics_seconds"`
+		JSONEncodeSeconds float64 `json:"json_encode_seconds"`
+		TotalSeconds      float64 `json:"total_seconds"`
+		PeakRSSBytes      float64 `json:"peak_rss_bytes"`
+	}
+
+	// Averages per stage over the last 7 days
+	since := time.Now().AddDate(0, 0, -7)
+	DB.Model(&PredictionTiming{}).Select(`COUNT(*) AS runs,
+		COALESCE(AVG(import_seconds), 0) AS import_seconds,
+		COALESCE(AVG(model_load_seconds), 0) AS model_load_seconds,
+		COALESCE(AVG(csv_parse_seconds), 0) AS csv_parse_seconds,
+		COALESCE(AVG(scaling_seconds), 0) AS scaling_seconds,
+		COALESCE(AVG(predict_seconds), 0) AS predict_seconds,
+		COALESCE(AVG(statistics_seconds), 0) AS statistics_seconds,
+		COALESCE(AVG(json_encode_seconds), 0) AS json_encode_seconds,
+		COALESCE(AVG(total_seconds), 0) AS total_seconds,
+		COALESCE(AVG(peak_rss_bytes), 0) AS peak_rss_bytes`).Where("created_at >= ?", since).Scan(&summary)
+
+	c.JSON(http.StatusOK, summary)
+}
+
 func deleteResultHandler(c *gin.Context) {
 	jobID := c.Param("id")
 	userID := getUserIDFromContext(c)
@@ -1077,49 +1149,74 @@ func getUserIDFromContext(c *gin.Context) uint {
 	return uint(userID)
 }
 
+// saveJobOutcome writes the given columns of a job whose run has ended, unless
+// the job was cancelled meanwhile. Only the columns the run owns are written,
+// so progress updates and a cancellation made during the run are kept.
+func saveJobOutcome(job *AnalysisJob, columns ...string) {
+	result := DB.Model(job).Where("status <> ?", "cancelled").Select(columns).Updates(job)
+	if result.Error != nil {
+		log.Printf("Failed to update job %d: %v", job.ID, result.Error)
+	} else if result.RowsAffected == 0 {
+		log.Printf("Job %d was cancelled; its outcome is not recorded", job.ID)
+	}
+}
+
+// failJob records that a job's run failed
+func failJob(job *AnalysisJob, message string) {
+	now := time.Now()
+	job.Status = "failed"
+	job.ErrorMessage = message
+	job.CompletedAt = &now
+	saveJobOutcome(job, "status", "error_message", "completed_at")
+}
+
 func processClassification(jobID uint) {
+	ctx, done := startJobContext(jobID)
+	defer done()
+
+	// Loaded once the context is registered: a cancel before this point is
+	// seen in the status, one after it cancels ctx
 	var job AnalysisJob
 	if result := DB.First(&job, jobID); result.Error != nil {
 		log.Printf("Failed to find job %d: %v", jobID, result.Error)
 		return
 	}
 
-	// Update progress
-	for i := 0; i <= 100; i += 10 {
-		job.Progress = i
-		DB.Save(&job)
-		time.Sleep(300 * time.Millisecond) // Simulate processing time
+	if job.Status == "cancelled" {
+		return
 	}
 
-	// Run the Python classification script
-	pythonPath := getEnv("PYTHON_PATH", "C:/Users/rachi/AppData/Local/Programs/Python/Python310/python.exe")
-	cmd := exec.Command(pythonPath, "../Model/predict_with_model.py", job.FilePath)
-
-	var out, stderr bytes.Buffer
-	cmd.Stdout = &out
-	cmd.Stderr = &stderr
+	// Check every row of the upload before the model is invoked
+	if problems := preflightProblems(ctx, jobID, job.FilePath); problems != "" {
+		failJob(&job, fmt.Sprintf("Validation failed: %s", problems))
+		log.Printf("Validation failed for job %d: %s", jobID, problems)
+		return
+	}
 
+	// Run the Python classification script, recording its progress as it goes
 	startTime := time.Now()
-	err := cmd.Run()
+	out, err := runPrediction(ctx, job.FilePath, newJobProgress(jobID).update)
 	processingTime := time.Since(startTime).Seconds()
 
+	if ctx.Err() != nil {
+		// cancelJobHandler has already marked the job as cancelled
+		logCancelledPrediction(jobID, out)
+		return
+	}
+
 	if err != nil {
 		// Mark job as failed
-		job.Status = "failed"
-		job.ErrorMessage = fmt.Sprintf("Classification failed: %v\nStderr: %s", err, stderr.String())
-		now := time.Now()
-		job.CompletedAt = &now
-		DB.Save(&job)
+		failJob(&job, fmt.Sprintf("Classification failed: %v", err))
 		log.Printf("Classification failed for job %d: %v", jobID, err)
 		return
 	}
 
 	// Parse the results (assuming JSON output)
 	var classificationOutput map[string]interface{}
-	if err := json.Unmarshal(out.Bytes(), &classificationOutput); err != nil {
+	if err := json.Unmarshal(out, &classificationOutput); err != nil {
 		// If parsing fails, store raw output
 		classificationOutput = map[string]interface{}{
-			"raw_output": out.String(),
+			"raw_output": string(out),
 			"diagnosis":  "Unknown",
 			"confidence": 0.0,
 		}
@@ -1133,11 +1230,11 @@ func processClassification(jobID uint) {
 		RiskLevel:         getRiskLevel(getFloatValue(classificationOutput, "confidence", 0.0)),
 		ProcessingTime:    processingTime,
 		ModelVersion:      "CNN-LSTM v1.0",
-		RecordingDuration: "Unknown",
+		RecordingDuration: recordingDuration(ctx, job.FilePath, "Unknown"),
 		AbnormalSegments:  getIntValue(classificationOutput, "abnormal_segments", 0),
-		DetailedResults:   out.String(),
-		RawOutput:         out.String(),
-		SpectralData:      generateMockSpectralData(),
+		DetailedResults:   string(out),
+		RawOutput:         string(out),
+		SpectralData:      spectralData(ctx, job.FilePath),
 		TemporalData:      generateMockTemporalData(),
 	}
 
@@ -1148,74 +1245,74 @@ func processClassification(jobID uint) {
 	} else {
 		job.Status = "completed"
 		job.ResultID = &result.ID
+		recordPredictionTiming(jobID, result.ID, out)
 	}
 
 	now := time.Now()
 	job.CompletedAt = &now
 	job.Progress = 100
-	DB.Save(&job)
+	saveJobOutcome(&job, "status", "error_message", "result_id", "completed_at", "progress")
 
 	log.Printf("Classification completed for job %d", jobID)
 }
 
 func processPrediction(jobID uint) {
+	ctx, done := startJobContext(jobID)
+	defer done()
+
+	// Loaded once the context is registered: a cancel before this point is
+	// seen in the status, one after it cancels ctx
 	var job AnalysisJob
 	if result := DB.First(&job, jobID); result.Error != nil {
 		log.Printf("Failed to find prediction job %d: %v", jobID, result.Error)
 		return
 	}
 
-	// Update progress
-	job.Progress = 50
-	DB.Save(&job)
-
-	// Run the Python prediction script with the pre-trained model
-	pythonPath := getEnv("PYTHON_PATH", "C:/Users/rachi/AppData/Local/Programs/Python/Python310/python.exe")
-	cmd := exec.Command(pythonPath, "../Model/predict_with_model.py", job.FilePath)
+	if job.Status == "cancelled" {
+		return
+	}
 
-	var out, stderr bytes.Buffer
-	cmd.Stdout = &out
-	cmd.Stderr = &stderr
+	// Check every row of the upload before the model is invoked
+	if problems := preflightProblems(ctx, jobID, job.FilePath); problems != "" {
+		failJob(&job, fmt.Sprintf("Validation failed: %s", problems))
+		log.Printf("Validation failed for job %d: %s", jobID, problems)
+		return
+	}
 
+	// Run the Python prediction script with the pre-trained model, recording its progress as it goes
 	startTime := time.Now()
-	err := cmd.Run()
+	out, err := runPrediction(ctx, job.FilePath, newJobProgress(jobID).update)
 	processingTime := time.Since(startTime).Seconds()
 
+	if ctx.Err() != nil {
+		// cancelJobHandler has already marked the job as cancelled
+		logCancelledPrediction(jobID, out)
+		return
+	}
+
 	if err != nil {
 		// Mark job as failed
-		job.Status = "failed"
-		job.ErrorMessage = fmt.Sprintf("Prediction failed: %v\nStderr: %s", err, stderr.String())
-		now := time.Now()
-		job.CompletedAt = &now
-		DB.Save(&job)
+		failJob(&job, fmt.Sprintf("Prediction failed: %v", err))
 		log.Printf("Prediction failed for job %d: %v", jobID, err)
 		return
 	}
 
 	// Parse the JSON results from the Python script
 	var predictionOutput map[string]interface{}
-	if err := json.Unmarshal(out.Bytes(), &predictionOutput); err != nil {
+	if err := json.Unmarshal(out, &predictionOutput); err != nil {
 		// If parsing fails, mark as failed
-		job.Status = "failed"
-		job.ErrorMessage = fmt.Sprintf("Failed to parse prediction results: %v", err)
-		now := time.Now()
-		job.CompletedAt = &now
-		DB.Save(&job)
+		failJob(&job, fmt.Sprintf("Failed to parse prediction results: %v", err))
 		log.Printf("Failed to parse prediction results for job %d: %v", jobID, err)
 		return
 	}
 
 	// Check if prediction was successful
 	if success, ok := predictionOutput["success"].(bool); !ok || !success {
-		job.Status = "failed"
 		errorMsg := "Unknown error"
 		if errStr, ok := predictionOutput["error"].(string); ok {
 			errorMsg = errStr
 		}
-		job.ErrorMessage = fmt.Sprintf("Prediction error: %s", errorMsg)
-		now := time.Now()
-		job.CompletedAt = &now
-		DB.Save(&job)
+		failJob(&job, fmt.Sprintf("Prediction error: %s", errorMsg))
 		log.Printf("Prediction error for job %d: %s", jobID, errorMsg)
 		return
 	}
@@ -1234,11 +1331,11 @@ func processPrediction(jobID uint) {
 		RiskLevel:         riskLevel,
 		ProcessingTime:    processingTime,
 		ModelVersion:      "CNN-LSTM v1.0 (Pre-trained)",
-		RecordingDuration: "Auto-detected",
+		RecordingDuration: recordingDuration(ctx, job.FilePath, "Unknown"),
 		AbnormalSegments:  abnormalSegments,
-		DetailedResults:   out.String(),
-		RawOutput:         out.String(),
-		SpectralData:      generateMockSpectralData(),
+		DetailedResults:   string(out),
+		RawOutput:         string(out),
+		SpectralData:      spectralData(ctx, job.FilePath),
 		TemporalData:      generateMockTemporalData(),
 	}
 
@@ -1249,12 +1346,13 @@ func processPrediction(jobID uint) {
 	} else {
 		job.Status = "completed"
 		job.ResultID = &result.ID
+		recordPredictionTiming(jobID, result.ID, out)
 	}
 
 	now := time.Now()
 	job.CompletedAt = &now
 	job.Progress = 100
-	DB.Save(&job)
+	saveJobOutcome(&job, "status", "error_message", "result_id", "completed_at", "progress")
 
 	log.Printf("Prediction completed for job %d with diagnosis: %s (%.1f%% confidence)",
 		jobID, primaryDiagnosis, confidence)
@@ -1266,20 +1364,35 @@ func validateAndExtractMetadata(jobID uint, filePath string) {
 		return
 	}
 
-	// Simple file validation (in real system, this would be more sophisticated)
 	metadata := FileMetadata{
-		JobID:        jobID,
-		Channels:     14, // Mock data
-		SamplingRate: 256,
-		Duration:     "10 minutes",
-		FileType:     filepath.Ext(filePath),
-		Validated:    true,
+		JobID:     jobID,
+		Duration:  "Unknown",
+		FileType:  filepath.Ext(filePath),
+		Validated: true,
 	}
 
-	// Check if file exists and is readable
+	// Check if file exists and is readable, then check every row of it
 	if !fileExists(filePath) {
 		metadata.Validated = false
 		metadata.ValidationError = "File not found"
+	} else if summary, err := validateOnce(context.Background(), filePath); err != nil {
+		metadata.Validated = false
+		metadata.ValidationError = fmt.Sprintf("Validation unavailable: %v", err)
+	} else if summary != nil && !summary.Valid {
+		metadata.Validated = false
+		metadata.ValidationError = summary.problems()
+	}
+
+	// Channels, rows and duration come from the file's sidecar, written during validation
+	if metadata.ValidationError != "File not found" {
+		if sidecar, err := readDatasetSidecar(context.Background(), filePath); err != nil {
+			log.Printf("Dataset metadata unavailable for job %d: %v", jobID, err)
+		} else if sidecar != nil {
+			metadata.Channels = sidecar.Recording.Channels
+			metadata.SamplingRate = sidecar.Recording.SamplingRate
+			metadata.Rows = sidecar.Rows
+			metadata.Duration = formatDuration(sidecar.Recording.DurationS)
+		}
 	}
 
 	DB.Create(&metadata)
@@ -1340,18 +1453,6 @@ Raw Output:
 	}
 }
 
-func generateMockSpectralData() string {
-	data := make([]map[string]interface{}, 20)
-	for i := 0; i < 20; i++ {
-		data[i] = map[string]interface{}{
-			"frequency": i + 1,
-			"power":     float64(i*10 + 50),
-		}
-	}
-	jsonData, _ := json.Marshal(data)
-	return string(jsonData)
-}
-
 func generateMockTemporalData() string {
 	data := make([]map[string]interface{}, 100)
 	for i := 0; i < 100; i++ {
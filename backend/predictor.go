@@ -0,0 +1,582 @@
+package main
+
+import (
+	"bufio"
+	"bytes"
+	"context"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"io"
+	"log"
+	"math"
+	"os/exec"
+	"strconv"
+	"sync"
+	"syscall"
+	"time"
+)
+
+// --- Prediction Workers ---
+
+const (
+	predictScriptPath = "../Model/predict_with_model.py"
+	defaultPythonPath = "C:/Users/rachi/AppData/Local/Programs/Python/Python310/python.exe"
+
+	// cancelGracePeriod is how long a cancelled prediction may take to stop at
+	// its next checkpoint before its process is killed or its result abandoned
+	cancelGracePeriod = 5 * time.Second
+
+	// jobBuffer is the capacity of a job's message channel. Progress events
+	// may fill all but the last slot, which is kept for the final result so
+	// that readLoop never blocks on a job whose caller has stopped reading.
+	jobBuffer = 4
+)
+
+// workerRequest is a single job sent to a warm prediction worker
+type workerRequest struct {
+	ID        uint64 `json:"id"`
+	Op        string `json:"op,omitempty"`
+	InputFile string `json:"input_file,omitempty"`
+	Progress  bool   `json:"progress,omitempty"`
+	Target    uint64 `json:"target,omitempty"`
+}
+
+// predictionProgress is one progress event from predict_with_model.py
+type predictionProgress struct {
+	Stage      string   `json:"stage"`
+	Percent    float64  `json:"percent"`
+	RowsDone   int64    `json:"rows_done"`
+	RowsTotal  int64    `json:"rows_total"`
+	ETASeconds *float64 `json:"eta_s"`
+}
+
+// workerMessage is a single JSON line written by a prediction worker
+type workerMessage struct {
+	ID       uint64              `json:"id"`
+	Event    string              `json:"event"`
+	Error    string              `json:"error"`
+	Result   json.RawMessage     `json:"result"`
+	Stats    json.RawMessage     `json:"stats"`
+	Progress *predictionProgress `json:"progress"`
+}
+
+// predictWorker is a long-lived `predict_with_model.py --worker` process that
+// keeps the CNN-LSTM model loaded between jobs
+type predictWorker struct {
+	cmd   *exec.Cmd
+	stdin io.WriteCloser
+
+	mu      sync.Mutex
+	pending map[uint64]chan workerMessage
+	dead    bool
+}
+
+// predictionPool hands jobs to a fixed number of warm workers, restarting
+// any worker whose process has exited
+type predictionPool struct {
+	mu      sync.Mutex
+	workers []*predictWorker
+	nextID  uint64
+}
+
+var predictor *predictionPool
+
+func pythonPath() string {
+	return getEnv("PYTHON_PATH", defaultPythonPath)
+}
+
+// predictBackend is the model inference form passed to predict_with_model.py
+// (keras, function, savedmodel or tflite)
+func predictBackend() string {
+	return getEnv("PREDICT_BACKEND", "keras")
+}
+
+// startPredictionPool starts PREDICT_WORKERS warm workers (default 2).
+// Setting PREDICT_WORKERS=0 falls back to one Python process per job.
+func startPredictionPool() {
+	size, err := strconv.Atoi(getEnv("PREDICT_WORKERS", "2"))
+	if err != nil || size <= 0 {
+		log.Println("Prediction worker pool disabled, running one process per job")
+		return
+	}
+
+	predictor = &predictionPool{workers: make([]*predictWorker, size)}
+	for i := range predictor.workers {
+		worker, err := startPredictWorker()
+		if err != nil {
+			log.Printf("Warning: Could not start prediction worker %d: %v", i, err)
+			continue
+		}
+		predictor.workers[i] = worker
+	}
+	log.Printf("Started %d prediction workers", size)
+}
+
+func startPredictWorker() (*predictWorker, error) {
+	cmd := exec.Command(pythonPath(), predictScriptPath, "--worker",
+		"--backend", predictBackend(),
+		"--batch-window-ms", getEnv("PREDICT_BATCH_WINDOW_MS", "20"),
+		"--batch-max-rows", getEnv("PREDICT_BATCH_MAX_ROWS", "8192"),
+		"--batch-fill-wait-ms", getEnv("PREDICT_BATCH_FILL_WAIT_MS", "250"),
+		"--preprocess-threads", getEnv("PREDICT_PREPROCESS_THREADS", "4"))
+
+	stdin, err := cmd.StdinPipe()
+	if err != nil {
+		return nil, err
+	}
+	stdout, err := cmd.StdoutPipe()
+	if err != nil {
+		return nil, err
+	}
+
+	var stderr bytes.Buffer
+	cmd.Stderr = &limitedWriter{buf: &stderr, limit: 64 * 1024}
+
+	if err := cmd.Start(); err != nil {
+		return nil, err
+	}
+
+	worker := &predictWorker{
+		cmd:     cmd,
+		stdin:   stdin,
+		pending: make(map[uint64]chan workerMessage),
+	}
+	go worker.readLoop(stdout, &stderr)
+	return worker, nil
+}
+
+// readLoop dispatches each result line to the job waiting for it and fails
+// every outstanding job once the worker process goes away
+func (w *predictWorker) readLoop(stdout io.Reader, stderr *bytes.Buffer) {
+	scanner := bufio.NewScanner(stdout)
+	scanner.Buffer(make([]byte, 64*1024), 64*1024*1024)
+
+	for scanner.Scan() {
+		var msg workerMessage
+		if err := json.Unmarshal(scanner.Bytes(), &msg); err != nil {
+			log.Printf("Prediction worker %d wrote invalid output: %s", w.cmd.Process.Pid, scanner.Text())
+			continue
+		}
+
+		switch msg.Event {
+		case "ready":
+			log.Printf("Prediction worker %d ready", w.cmd.Process.Pid)
+			continue
+		case "error":
+			log.Printf("Prediction worker %d failed to start: %s", w.cmd.Process.Pid, msg.Error)
+			continue
+		}
+
+		if msg.Event == "progress" {
+			// Progress is advisory; drop it rather than stall other jobs' results
+			w.mu.Lock()
+			ch, ok := w.pending[msg.ID]
+			w.mu.Unlock()
+			if ok && len(ch) < cap(ch)-1 {
+				ch <- msg
+			}
+			continue
+		}
+
+		w.mu.Lock()
+		ch, ok := w.pending[msg.ID]
+		delete(w.pending, msg.ID)
+		w.mu.Unlock()
+		if ok {
+			// Never blocks: readLoop is the only sender and left a slot free
+			ch <- msg
+		}
+	}
+
+	err := w.cmd.Wait()
+
+	w.mu.Lock()
+	w.dead = true
+	pending := w.pending
+	w.pending = nil
+	w.mu.Unlock()
+
+	log.Printf("Prediction worker %d exited: %v\nStderr: %s", w.cmd.Process.Pid, err, stderr.String())
+	for _, ch := range pending {
+		close(ch)
+	}
+}
+
+func (w *predictWorker) submit(id uint64, req workerRequest) (chan workerMessage, error) {
+	req.ID = id
+	line, err := json.Marshal(req)
+	if err != nil {
+		return nil, err
+	}
+
+	w.mu.Lock()
+	defer w.mu.Unlock()
+	if w.dead {
+		return nil, errors.New("prediction worker is not running")
+	}
+
+	ch := make(chan workerMessage, jobBuffer)
+	w.pending[id] = ch
+	if _, err := w.stdin.Write(append(line, '\n')); err != nil {
+		delete(w.pending, id)
+		return nil, err
+	}
+	return ch, nil
+}
+
+// cancel asks the worker to stop job id at its next checkpoint; the job then
+// answers with a cancelled result. The reply to the cancel request itself is
+// not waited for.
+func (w *predictWorker) cancel(id, target uint64) error {
+	line, err := json.Marshal(workerRequest{ID: id, Op: "cancel", Target: target})
+	if err != nil {
+		return err
+	}
+
+	w.mu.Lock()
+	defer w.mu.Unlock()
+	if w.dead {
+		return errors.New("prediction worker is not running")
+	}
+	_, err = w.stdin.Write(append(line, '\n'))
+	return err
+}
+
+// forget stops routing messages for job id, e.g. after its caller gave up waiting
+func (w *predictWorker) forget(id uint64) {
+	w.mu.Lock()
+	defer w.mu.Unlock()
+	delete(w.pending, id)
+}
+
+func (w *predictWorker) load() int {
+	w.mu.Lock()
+	defer w.mu.Unlock()
+	if w.dead {
+		return -1
+	}
+	return len(w.pending)
+}
+
+// acquire picks the least busy live worker, replacing dead ones
+func (p *predictionPool) acquire() (*predictWorker, uint64, error) {
+	p.mu.Lock()
+	defer p.mu.Unlock()
+
+	p.nextID++
+	var best *predictWorker
+	bestLoad := -1
+	for i, worker := range p.workers {
+		if worker == nil || worker.load() < 0 {
+			replacement, err := startPredictWorker()
+			if err != nil {
+				log.Printf("Warning: Could not restart prediction worker %d: %v", i, err)
+				continue
+			}
+			p.workers[i] = replacement
+			worker = replacement
+		}
+		if load := worker.load(); best == nil || load < bestLoad {
+			best, bestLoad = worker, load
+		}
+	}
+
+	if best == nil {
+		return nil, 0, errors.New("no prediction workers available")
+	}
+	return best, p.nextID, nil
+}
+
+// Predict runs one file through a warm worker and returns the result document,
+// passing progress events to onProgress when it is not nil. When ctx is
+// cancelled the worker is told to stop the job, and its cancelled result (with
+// partial timings) is returned along with ctx.Err().
+func (p *predictionPool) Predict(ctx context.Context, filePath string, onProgress func(predictionProgress)) ([]byte, error) {
+	worker, id, err := p.acquire()
+	if err != nil {
+		return nil, err
+	}
+
+	ch, err := worker.submit(id, workerRequest{InputFile: filePath, Progress: onProgress != nil})
+	if err != nil {
+		return nil, err
+	}
+
+	done := ctx.Done()
+	var giveUp <-chan time.Time
+	for {
+		select {
+		case msg, ok := <-ch:
+			if !ok {
+				return nil, errors.New("prediction worker exited before returning a result")
+			}
+			if msg.Event == "progress" {
+				if onProgress != nil && msg.Progress != nil {
+					onProgress(*msg.Progress)
+				}
+				continue
+			}
+			return msg.Result, ctx.Err()
+		case <-done:
+			done = nil
+			if err := worker.cancel(p.newID(), id); err != nil {
+				log.Printf("Could not cancel prediction %d: %v", id, err)
+			}
+			giveUp = time.After(cancelGracePeriod)
+		case <-giveUp:
+			worker.forget(id)
+			return nil, ctx.Err()
+		}
+	}
+}
+
+func (p *predictionPool) newID() uint64 {
+	p.mu.Lock()
+	defer p.mu.Unlock()
+	p.nextID++
+	return p.nextID
+}
+
+// BatchStats collects the micro-batching counters from every live worker
+func (p *predictionPool) BatchStats() []json.RawMessage {
+	p.mu.Lock()
+	workers := append([]*predictWorker(nil), p.workers...)
+	p.nextID++
+	id := p.nextID
+	p.mu.Unlock()
+
+	stats := []json.RawMessage{}
+	for _, worker := range workers {
+		if worker == nil {
+			continue
+		}
+		ch, err := worker.submit(id, workerRequest{Op: "stats"})
+		if err != nil {
+			continue
+		}
+		if msg, ok := <-ch; ok {
+			stats = append(stats, msg.Stats)
+		}
+	}
+	return stats
+}
+
+// runPrediction returns the JSON result document for filePath, using the warm
+// worker pool when it is enabled and a one-off Python process otherwise.
+// Progress events are passed to onProgress when it is not nil. Cancelling ctx
+// stops the prediction; the error is then ctx.Err() and the document, if any,
+// is the cancelled result with partial timings.
+func runPrediction(ctx context.Context, filePath string, onProgress func(predictionProgress)) ([]byte, error) {
+	if predictor != nil {
+		return predictor.Predict(ctx, filePath, onProgress)
+	}
+
+	args := []string{predictScriptPath, "--backend", predictBackend()}
+	if onProgress != nil {
+		args = append(args, "--progress")
+	}
+	cmd := exec.CommandContext(ctx, pythonPath(), append(args, filePath)...)
+	// Ask the script to stop at its next checkpoint; kill it if it has not
+	// exited within the grace period (or if signals are unsupported, as on Windows)
+	cmd.Cancel = func() error {
+		if err := cmd.Process.Signal(syscall.SIGTERM); err != nil {
+			return cmd.Process.Kill()
+		}
+		return nil
+	}
+	cmd.WaitDelay = cancelGracePeriod
+
+	var out, stderr bytes.Buffer
+	cmd.Stdout = &out
+	stderrPipe, err := cmd.StderrPipe()
+	if err != nil {
+		return nil, err
+	}
+
+	if err := cmd.Start(); err != nil {
+		return nil, err
+	}
+
+	// Progress events arrive on stderr between ordinary log lines
+	scanner := bufio.NewScanner(stderrPipe)
+	scanner.Buffer(make([]byte, 64*1024), 1024*1024)
+	diagnostics := &limitedWriter{buf: &stderr, limit: 64 * 1024}
+	for scanner.Scan() {
+		var msg workerMessage
+		if onProgress != nil && json.Unmarshal(scanner.Bytes(), &msg) == nil &&
+			msg.Event == "progress" && msg.Progress != nil {
+			onProgress(*msg.Progress)
+			continue
+		}
+		diagnostics.Write(append(scanner.Bytes(), '\n'))
+	}
+	if err := scanner.Err(); err != nil {
+		// e.g. a line over the token limit: keep draining the pipe so the
+		// script never blocks writing to it, without parsing progress further
+		fmt.Fprintf(diagnostics, "[stderr scan stopped: %v]\n", err)
+		io.Copy(diagnostics, stderrPipe)
+	}
+
+	err = cmd.Wait()
+	if ctx.Err() != nil {
+		return out.Bytes(), ctx.Err()
+	}
+	if err != nil {
+		return nil, fmt.Errorf("%v\nStderr: %s", err, stderr.String())
+	}
+	return out.Bytes(), nil
+}
+
+// --- Job Cancellation ---
+
+// runningJobs holds the cancel function of every job whose prediction is in flight
+var runningJobs = struct {
+	sync.Mutex
+	cancels map[uint]context.CancelFunc
+}{cancels: make(map[uint]context.CancelFunc)}
+
+// startJobContext returns the context a job's prediction runs under and a
+// function to call once the job has finished
+func startJobContext(jobID uint) (context.Context, func()) {
+	ctx, cancel := context.WithCancel(context.Background())
+
+	runningJobs.Lock()
+	runningJobs.cancels[jobID] = cancel
+	runningJobs.Unlock()
+
+	return ctx, func() {
+		runningJobs.Lock()
+		delete(runningJobs.cancels, jobID)
+		runningJobs.Unlock()
+		cancel()
+	}
+}
+
+// cancelRunningJob stops the prediction for jobID if one is in flight
+func cancelRunningJob(jobID uint) bool {
+	runningJobs.Lock()
+	cancel, ok := runningJobs.cancels[jobID]
+	runningJobs.Unlock()
+
+	if ok {
+		cancel()
+	}
+	return ok
+}
+
+// logCancelledPrediction records how far a cancelled job got, from the
+// partial timings in its cancelled result
+func logCancelledPrediction(jobID uint, out []byte) {
+	var cancelled struct {
+		Timings map[string]float64 `json:"timings"`
+	}
+	if len(out) == 0 || json.Unmarshal(out, &cancelled) != nil {
+		log.Printf("Prediction for job %d cancelled", jobID)
+		return
+	}
+	log.Printf("Prediction for job %d cancelled; stage timings: %v", jobID, cancelled.Timings)
+}
+
+// --- Job Progress ---
+
+// progressWriteInterval bounds how often a running job's progress is written
+// to the database
+const progressWriteInterval = time.Second
+
+// jobProgress records prediction progress on an AnalysisJob, writing at most
+// once per progressWriteInterval and only when the percentage moves forward
+type jobProgress struct {
+	jobID       uint
+	lastWrite   time.Time
+	lastPercent int
+}
+
+func newJobProgress(jobID uint) *jobProgress {
+	return &jobProgress{jobID: jobID}
+}
+
+func (p *jobProgress) update(event predictionProgress) {
+	// 100 is reserved for the completed job
+	percent := int(math.Min(event.Percent, 99))
+	if percent <= p.lastPercent || time.Since(p.lastWrite) < progressWriteInterval {
+		return
+	}
+
+	updates := map[string]interface{}{"progress": percent}
+	if event.ETASeconds != nil {
+		updates["estimated_time"] = int(math.Ceil(*event.ETASeconds / 60))
+	}
+	if err := DB.Model(&AnalysisJob{}).Where("id = ?", p.jobID).Updates(updates).Error; err != nil {
+		log.Printf("Failed to record progress for job %d: %v", p.jobID, err)
+		return
+	}
+	p.lastWrite = time.Now()
+	p.lastPercent = percent
+}
+
+// predictionTimings is the timings block of a prediction result document
+type predictionTimings struct {
+	Import       float64 `json:"import"`
+	CacheLookup  float64 `json:"cache_lookup"`
+	ModelLoad    float64 `json:"model_load"`
+	CSVParse     float64 `json:"csv_parse"`
+	Scaling      float64 `json:"scaling"`
+	Predict      float64 `json:"predict"`
+	Statistics   float64 `json:"statistics"`
+	JSONEncode   float64 `json:"json_encode"`
+	Total        float64 `json:"total"`
+	PeakRSSBytes *int64  `json:"peak_rss_bytes"`
+}
+
+// recordPredictionTiming stores the per-stage breakdown of a successful run
+// alongside its result. Output without a timings block is ignored.
+func recordPredictionTiming(jobID, resultID uint, out []byte) {
+	var doc struct {
+		Timings *predictionTimings `json:"timings"`
+	}
+	if err := json.Unmarshal(out, &doc); err != nil || doc.Timings == nil {
+		return
+	}
+
+	t := doc.Timings
+	timing := PredictionTiming{
+		JobID:              jobID,
+		ResultID:           resultID,
+		ImportSeconds:      t.Import,
+		CacheLookupSeconds: t.CacheLookup,
+		ModelLoadSeconds:   t.ModelLoad,
+		CSVParseSeconds:    t.CSVParse,
+		ScalingSeconds:     t.Scaling,
+		PredictSeconds:     t.Predict,
+		StatisticsSeconds:  t.Statistics,
+		JSONEncodeSeconds:  t.JSONEncode,
+		TotalSeconds:       t.Total,
+	}
+	if t.PeakRSSBytes != nil {
+		timing.PeakRSSBytes = *t.PeakRSSBytes
+	}
+	if err := DB.Create(&timing).Error; err != nil {
+		log.Printf("Failed to record prediction timings for job %d: %v", jobID, err)
+	}
+}
+
+// limitedWriter keeps at most limit bytes of a worker's stderr for diagnostics
+type limitedWriter struct {
+	mu    sync.Mutex
+	buf   *bytes.Buffer
+	limit int
+}
+
+func (l *limitedWriter) Write(p []byte) (int, error) {
+	l.mu.Lock()
+	defer l.mu.Unlock()
+	if room := l.limit - l.buf.Len(); room > 0 {
+		if len(p) > room {
+			l.buf.Write(p[:room])
+		} else {
+			l.buf.Write(p)
+		}
+	}
+	return len(p), nil
+}
@@ -0,0 +1,67 @@
+package main
+
+import (
+	"context"
+	"encoding/json"
+	"log"
+	"os"
+	"os/exec"
+)
+
+// --- Spectral Features ---
+
+const (
+	spectralScriptPath = "../Model/spectral_features.py"
+	spectralSuffix     = ".spectral.json"
+)
+
+// spectralSidecar is the part of spectral_features.py's sidecar stored with results
+type spectralSidecar struct {
+	Spectrum json.RawMessage `json:"spectrum"`
+}
+
+// spectralData returns the recording's average spectrum as a JSON array of
+// {frequency, power} points for AnalysisResult.SpectralData. It comes from
+// the upload's dataset sidecar when simple_preprocess.py recorded one there.
+// Otherwise only raw recordings (one sample per row) have a spectrum: it is
+// computed by spectral_features.py on first use and reused afterwards. Rows
+// of feature tables are windows, not samples, so they get none. An empty
+// string means no spectrum is available (e.g. the recording is shorter than
+// one window).
+func spectralData(ctx context.Context, filePath string) string {
+	dataset, err := readDatasetSidecar(ctx, filePath)
+	if err != nil {
+		log.Printf("Spectral features unavailable for %s: %v", filePath, err)
+		return ""
+	}
+	if dataset == nil {
+		return ""
+	}
+	if dataset.Spectral != nil && len(dataset.Spectral.Spectrum) > 0 {
+		return string(dataset.Spectral.Spectrum)
+	}
+	if dataset.Recording.Kind != "samples" {
+		return ""
+	}
+
+	sidecarPath := filePath + spectralSuffix
+	if !fileExists(sidecarPath) {
+		cmd := exec.CommandContext(ctx, pythonPath(), spectralScriptPath, filePath)
+		if out, err := cmd.CombinedOutput(); err != nil {
+			log.Printf("Spectral features unavailable for %s: %v\n%s", filePath, err, out)
+			return ""
+		}
+	}
+
+	raw, err := os.ReadFile(sidecarPath)
+	if err != nil {
+		log.Printf("Failed to read spectral sidecar %s: %v", sidecarPath, err)
+		return ""
+	}
+	var sidecar spectralSidecar
+	if err := json.Unmarshal(raw, &sidecar); err != nil || len(sidecar.Spectrum) == 0 {
+		log.Printf("Invalid spectral sidecar %s: %v", sidecarPath, err)
+		return ""
+	}
+	return string(sidecar.Spectrum)
+}
@@ -0,0 +1,219 @@
+package main
+
+import (
+	"context"
+	"encoding/json"
+	"fmt"
+	"log"
+	"os"
+	"os/exec"
+	"path/filepath"
+	"strings"
+	"sync"
+	"time"
+)
+
+// --- Upload Validation ---
+
+const (
+	validateScriptPath = "../Model/verify_compatibility.py"
+	referenceDataPath  = "../Model/EE_PCA_1.csv"
+)
+
+// validationCheck is one check of a verify_compatibility.py --json summary.
+// Count is in rows for column_count and labels, in values for the others;
+// the First* fields locate the first failure.
+type validationCheck struct {
+	OK          bool            `json:"ok"`
+	Count       int64           `json:"count"`
+	Missing     bool            `json:"missing"`
+	FirstRow    *int64          `json:"first_row"`
+	FirstLine   *int64          `json:"first_line"`
+	FirstColumn *int64          `json:"first_column"`
+	FirstValue  json.RawMessage `json:"first_value"`
+}
+
+// validationSummary is the output of verify_compatibility.py --json
+type validationSummary struct {
+	Success bool                       `json:"success"`
+	Error   string                     `json:"error"`
+	Valid   bool                       `json:"valid"`
+	Rows    int64                      `json:"rows"`
+	Columns int                        `json:"columns"`
+	Checks  map[string]validationCheck `json:"checks"`
+}
+
+// validationChecks lists the checks in report order with a description of their failures
+var validationChecks = []struct{ name, failure string }{
+	{"header", "columns differ from EE_PCA_1.csv"},
+	{"column_count", "rows with the wrong number of columns"},
+	{"non_finite", "missing, non-numeric or infinite values"},
+	{"range", "feature values outside [0,1]"},
+	{"labels", "target values outside the label domain"},
+}
+
+// uploadValidationEnabled is false when VALIDATE_UPLOADS=false
+func uploadValidationEnabled() bool {
+	return getEnv("VALIDATE_UPLOADS", "true") != "false"
+}
+
+// validatable reports whether verify_compatibility.py can check filePath:
+// CSV files and feature store directories. Other formats are not checked.
+func validatable(filePath string) bool {
+	if strings.EqualFold(filepath.Ext(filePath), ".csv") {
+		return true
+	}
+	info, err := os.Stat(filePath)
+	return err == nil && info.IsDir() && filepath.Ext(filePath) == ".features"
+}
+
+// validateUpload checks every row of filePath against the format of
+// EE_PCA_1.csv. The summary is nil when validation is disabled or the
+// file's format is not checked.
+func validateUpload(ctx context.Context, filePath string) (*validationSummary, error) {
+	if !uploadValidationEnabled() || !validatable(filePath) {
+		return nil, nil
+	}
+
+	cmd := exec.CommandContext(ctx, pythonPath(), validateScriptPath, "--json", referenceDataPath, filePath)
+	// An invalid file exits with status 1; its summary is still on stdout
+	out, runErr := cmd.Output()
+	var summary validationSummary
+	if err := json.Unmarshal(out, &summary); err != nil {
+		if runErr != nil {
+			return nil, fmt.Errorf("validator failed: %v", runErr)
+		}
+		return nil, fmt.Errorf("invalid validator output: %v", err)
+	}
+	if !summary.Success {
+		return nil, fmt.Errorf("validator error: %s", summary.Error)
+	}
+	return &summary, nil
+}
+
+// uploadValidation is one validator run over a version of an upload
+type uploadValidation struct {
+	size    int64
+	modTime time.Time
+	done    chan struct{}
+	summary *validationSummary
+	err     error
+}
+
+// failed reports whether the run has finished without a summary
+func (v *uploadValidation) failed() bool {
+	select {
+	case <-v.done:
+		return v.err != nil
+	default:
+		return false
+	}
+}
+
+// validations holds the latest validator run of every upload, so the check
+// made when a file is uploaded is the one its jobs read before prediction
+var validations = struct {
+	sync.Mutex
+	runs map[string]*uploadValidation
+}{runs: make(map[string]*uploadValidation)}
+
+// validateOnce returns the validation summary of filePath as it is now. The
+// validator runs once per version of the file (its size and modification
+// time); later callers wait for that run, or until ctx is done. A run that
+// failed is retried by the next caller.
+func validateOnce(ctx context.Context, filePath string) (*validationSummary, error) {
+	if !uploadValidationEnabled() || !validatable(filePath) {
+		return nil, nil
+	}
+	info, err := os.Stat(filePath)
+	if err != nil {
+		return nil, err
+	}
+
+	validations.Lock()
+	run, ok := validations.runs[filePath]
+	if !ok || run.size != info.Size() || !run.modTime.Equal(info.ModTime()) || run.failed() {
+		run = &uploadValidation{size: info.Size(), modTime: info.ModTime(), done: make(chan struct{})}
+		validations.runs[filePath] = run
+		// Not tied to ctx: the run's result is kept for every other caller
+		go func() {
+			run.summary, run.err = validateUpload(context.Background(), filePath)
+			close(run.done)
+		}()
+	}
+	validations.Unlock()
+
+	select {
+	case <-run.done:
+		return run.summary, run.err
+	case <-ctx.Done():
+		return nil, ctx.Err()
+	}
+}
+
+// forgetValidation drops the stored validation of a deleted upload
+func forgetValidation(filePath string) {
+	validations.Lock()
+	delete(validations.runs, filePath)
+	validations.Unlock()
+}
+
+// problems describes the failed checks, e.g.
+// "3 feature values outside [0,1] (first at line 12, column 4: 1.5)"
+func (s *validationSummary) problems() string {
+	var parts []string
+	for _, check := range validationChecks {
+		result, ok := s.Checks[check.name]
+		if !ok || result.OK {
+			continue
+		}
+		if result.Missing {
+			parts = append(parts, "no header row")
+			continue
+		}
+		parts = append(parts, fmt.Sprintf("%d %s%s", result.Count, check.failure, result.location()))
+	}
+	if len(parts) == 0 && s.Rows == 0 {
+		parts = append(parts, "no data rows")
+	}
+	return strings.Join(parts, "; ")
+}
+
+// location is " (first at line L, column C: V)", or "" when the check has no position
+func (c validationCheck) location() string {
+	var where []string
+	if c.FirstLine != nil {
+		where = append(where, fmt.Sprintf("line %d", *c.FirstLine))
+	} else if c.FirstRow != nil {
+		where = append(where, fmt.Sprintf("row %d", *c.FirstRow))
+	}
+	if c.FirstColumn != nil {
+		where = append(where, fmt.Sprintf("column %d", *c.FirstColumn))
+	}
+	if len(where) == 0 {
+		return ""
+	}
+	place := strings.Join(where, ", ")
+	if len(c.FirstValue) > 0 && string(c.FirstValue) != "null" {
+		place += ": " + strings.Trim(string(c.FirstValue), `"`)
+	}
+	return " (first at " + place + ")"
+}
+
+// preflightProblems validates an upload before the model is invoked and
+// returns why it must not be predicted on, or "" if it may. The validation
+// made at upload is reused when the file has not changed since. A validator
+// that cannot run does not hold the job up.
+func preflightProblems(ctx context.Context, jobID uint, filePath string) string {
+	summary, err := validateOnce(ctx, filePath)
+	if err != nil {
+		if ctx.Err() == nil {
+			log.Printf("Upload validation unavailable for job %d: %v", jobID, err)
+		}
+		return ""
+	}
+	if summary == nil || summary.Valid {
+		return ""
+	}
+	return summary.problems()
+}